@@ -0,0 +1,377 @@
+# ruff: noqa: T201, S603
+# Drives the Flask app with a weighted mix of user endpoint traffic and reports requests/s, p50/p95/p99 and a latency
+# histogram per endpoint as JSON, to compare runs across commits and gunicorn worker/thread settings.
+# Usage: python -m benchmarks.load --target wsgi --storage memory --mix login=1,register=1,me=4,retrieve=2,detail=2
+#        python -m benchmarks.load --target gunicorn --workers 1 --threads 8 --concurrency 16 --output run.json
+# --storage firestore requires the Firestore emulator (FIRESTORE_EMULATOR_HOST), its data is reset.
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from demo.data import ID_GIGATEL, ID_GLOBALCOM, ID_UNIVERSO
+from demo.generate import DEFAULT_PASSWORD
+
+CLIENT_IDS = [ID_UNIVERSO, ID_GLOBALCOM, ID_GIGATEL]
+DEFAULT_MIX = 'login=1,register=1,me=4,retrieve=2,detail=2'
+# Upper bounds of the histogram buckets in milliseconds, the last bucket counts everything slower
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# Sends (method, path, json body, headers) and returns the status and the response body
+Send = Callable[[str, str, dict[str, Any] | None, dict[str, str] | None], tuple[int, bytes]]
+
+
+@dataclass
+class SeedUser:
+    id: str
+    client_id: str
+    email: str
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def record(self, operation: str, latency: float, ok: bool) -> None:  # noqa: FBT001
+        self.latencies.setdefault(operation, []).append(latency)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def merge(self, other: 'Results') -> None:
+        for operation, latencies in other.latencies.items():
+            self.latencies.setdefault(operation, []).extend(latencies)
+        for operation, errors in other.errors.items():
+            self.errors[operation] = self.errors.get(operation, 0) + errors
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {k.strip(): float(v) for k, v in (item.split('=', 1) for item in value.split(','))}
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f'Unknown operations: {", ".join(sorted(unknown))}')
+
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return int(sock.getsockname()[1])
+
+
+class FakeClientService(BaseHTTPRequestHandler):
+    # Answers the client lookups of the register endpoint, every client exists
+    def do_GET(self) -> None:  # noqa: N802
+        body = json.dumps({'id': self.path.rsplit('/', 1)[-1], 'name': 'Load test'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401, ARG002
+        return
+
+
+@contextmanager
+def client_service() -> Iterator[str]:
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), FakeClientService)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+
+
+def app_env(storage: str, client_url: str) -> dict[str, str]:
+    pem = (
+        Ed25519PrivateKey.generate()
+        .private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        .decode()
+    )
+
+    return {
+        'USER_STORAGE': storage,
+        'URL_CLIENT_SVC': client_url,
+        'JWT_ISSUER': 'https://load.test',
+        # The app adds the PEM header and footer back
+        'JWT_PRIVATE_KEY': ''.join(pem.strip().splitlines()[1:-1]),
+        # All the load comes from one address and reuses the seeded users
+        'LOGIN_RATE_LIMIT_IP': str(10**9),
+        'LOGIN_RATE_LIMIT_USERNAME': str(10**9),
+    }
+
+
+@contextmanager
+def wsgi_target() -> Iterator[Callable[[], Send]]:
+    from app import create_app
+
+    app = create_app()
+
+    def new_sender() -> Send:
+        # One test client per load thread
+        client = app.test_client()
+
+        def send(method: str, path: str, body: dict[str, Any] | None, headers: dict[str, str] | None) -> tuple[int, bytes]:
+            resp = client.open(path, method=method, json=body, headers=headers)
+            return resp.status_code, resp.get_data()
+
+        return send
+
+    try:
+        yield new_sender
+    finally:
+        app.container.shutdown_resources()
+
+
+@contextmanager
+def gunicorn_target(workers: int, threads: int, env: dict[str, str]) -> Iterator[Callable[[], Send]]:
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [
+            *(sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}'),
+            *('--workers', str(workers), '--threads', str(threads), 'app:create_app()'),
+        ],
+        env={**os.environ, **env},
+    )
+
+    def new_sender() -> Send:
+        session = requests.Session()
+
+        def send(method: str, path: str, body: dict[str, Any] | None, headers: dict[str, str] | None) -> tuple[int, bytes]:
+            resp = session.request(method, f'{base_url}{path}', json=body, headers=headers, timeout=30)
+            return resp.status_code, resp.content
+
+        return send
+
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if requests.get(f'{base_url}/api/v1/health/user', timeout=1).status_code == 200:  # noqa: PLR2004
+                    break
+            except requests.ConnectionError:
+                pass
+
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError('gunicorn did not become ready')
+            time.sleep(0.2)
+
+        yield new_sender
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def seed(send: Send, count: int) -> list[SeedUser]:
+    # Seeds through the reset endpoint and reads the users back through the listing, so it works with any target
+    status, _ = send('POST', f'/api/v1/reset/user?size={count}', None, None)
+    if status != 200:  # noqa: PLR2004
+        raise RuntimeError(f'Seeding failed with status {status}')
+
+    users: list[SeedUser] = []
+    for client_id in CLIENT_IDS:
+        cursor = None
+        while True:
+            path = f'/api/v1/users/{client_id}?limit=100&fields=id,email' + (f'&cursor={cursor}' if cursor else '')
+            status, body = send('GET', path, None, None)
+            if status != 200:  # noqa: PLR2004
+                raise RuntimeError(f'Listing the seeded users failed with status {status}')
+
+            page = json.loads(body)
+            users.extend(SeedUser(id=u['id'], client_id=client_id, email=u['email']) for u in page['users'])
+            cursor = page['nextCursor']
+            if cursor is None:
+                break
+
+    return users
+
+
+def user_token_header(user: SeedUser) -> dict[str, str]:
+    claims = {'sub': user.id, 'cid': user.client_id, 'aud': 'user', 'email': user.email}
+    return {'X-Apigateway-Api-Userinfo': base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')}
+
+
+def op_login(send: Send, user: SeedUser) -> bool:
+    return send('POST', '/api/v1/auth/user', {'username': user.email, 'password': DEFAULT_PASSWORD}, None)[0] == 200  # noqa: PLR2004
+
+
+def op_register(send: Send, user: SeedUser) -> bool:
+    body = {
+        'clientId': user.client_id,
+        'name': 'Load Test',
+        'email': f'load.{uuid.uuid4().hex[:16]}@example.org',
+        'password': DEFAULT_PASSWORD,
+    }
+    return send('POST', '/api/v1/users', body, None)[0] == 201  # noqa: PLR2004
+
+
+def op_me(send: Send, user: SeedUser) -> bool:
+    return send('GET', '/api/v1/users/me', None, user_token_header(user))[0] == 200  # noqa: PLR2004
+
+
+def op_retrieve(send: Send, user: SeedUser) -> bool:
+    return send('GET', f'/api/v1/users/{user.client_id}/{user.id}', None, None)[0] == 200  # noqa: PLR2004
+
+
+def op_detail(send: Send, user: SeedUser) -> bool:
+    return send('POST', '/api/v1/users/detail', {'email': user.email}, None)[0] == 200  # noqa: PLR2004
+
+
+OPERATIONS: dict[str, Callable[[Send, SeedUser], bool]] = {
+    'login': op_login,
+    'register': op_register,
+    'me': op_me,
+    'retrieve': op_retrieve,
+    'detail': op_detail,
+}
+
+
+def run_load(
+    new_sender: Callable[[], Send], users: list[SeedUser], mix: dict[str, float], concurrency: int, duration: float
+) -> tuple[Results, float]:
+    operations = list(mix)
+    weights = [mix[operation] for operation in operations]
+    per_thread = [Results() for _ in range(concurrency)]
+    start_barrier = threading.Barrier(concurrency + 1)
+    deadline = 0.0
+
+    def worker(results: Results) -> None:
+        send = new_sender()
+        rnd = random.Random()  # noqa: S311
+        start_barrier.wait()
+
+        while time.monotonic() < deadline:
+            operation = rnd.choices(operations, weights)[0]
+            user = rnd.choice(users)
+
+            start = time.perf_counter()
+            try:
+                ok = OPERATIONS[operation](send, user)
+            except requests.RequestException:
+                ok = False
+            results.record(operation, time.perf_counter() - start, ok)
+
+    threads = [threading.Thread(target=worker, args=(results,)) for results in per_thread]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    results = Results()
+    for thread_results in per_thread:
+        results.merge(thread_results)
+
+    return results, elapsed
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        ms = latency * 1000
+        counts[next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if ms <= bound), len(HISTOGRAM_BOUNDS_MS))] += 1
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        'histogram': {'le_ms': [*HISTOGRAM_BOUNDS_MS, None], 'counts': counts},
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()  # noqa: S607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test the user endpoints.')
+    parser.add_argument('--target', choices=['wsgi', 'gunicorn'], default='wsgi')
+    parser.add_argument('--storage', choices=['memory', 'firestore'], default='memory')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.storage == 'firestore' and 'FIRESTORE_EMULATOR_HOST' not in os.environ:
+        sys.exit('FIRESTORE_EMULATOR_HOST must point to a running Firestore emulator')
+
+    if args.storage == 'memory' and args.target == 'gunicorn' and args.workers > 1:
+        sys.exit('The in-memory storage is not shared between gunicorn workers, use --workers 1')
+
+    with client_service() as client_url:
+        env = app_env(args.storage, client_url)
+
+        if args.target == 'wsgi':
+            os.environ.update(env)
+            target = wsgi_target()
+        else:
+            target = gunicorn_target(args.workers, args.threads, env)
+
+        with target as new_sender:
+            users = seed(new_sender(), args.users)
+            if args.warmup > 0:
+                run_load(new_sender, users, args.mix, args.concurrency, args.warmup)
+            results, elapsed = run_load(new_sender, users, args.mix, args.concurrency, args.duration)
+
+    all_latencies = [latency for latencies in results.latencies.values() for latency in latencies]
+    report = {
+        'commit': git_commit(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'total': summarize(all_latencies, sum(results.errors.values()), elapsed),
+        'endpoints': {
+            operation: summarize(latencies, results.errors.get(operation, 0), elapsed)
+            for operation, latencies in sorted(results.latencies.items())
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# ruff: noqa: T201
+# Reports single-core hashing throughput for each configured scheme, to size the cost settings against the login latency SLO.
+# Usage: python -m benchmarks.password_hashing [iterations]
+# Reads PASSWORD_HASH_SETTINGS like the app, e.g. PASSWORD_HASH_SETTINGS=argon2__rounds=3, and PASSWORD_SCHEMES
+# (by default the app's pbkdf2_sha256 and argon2). The last column is the verify time relative to the first scheme.
+import os
+import sys
+import time
+
+from passlib.context import CryptContext
+
+from services import create_crypt_context, parse_hash_settings
+
+
+def measure(context: CryptContext, iterations: int) -> tuple[float, float]:
+    password_hash = context.hash('password123')
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        context.hash('password123')
+    hash_time = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        context.verify('password123', password_hash)
+    verify_time = (time.perf_counter() - start) / iterations
+
+    return hash_time, verify_time
+
+
+def main(iterations: int) -> None:
+    schemes = os.getenv('PASSWORD_SCHEMES', 'pbkdf2_sha256,argon2').split(',')
+    settings = parse_hash_settings(os.getenv('PASSWORD_HASH_SETTINGS'))
+
+    print(f'{"scheme":<16}{"hash (ms)":>12}{"verify (ms)":>14}{"hashes/s/core":>16}{"verify cost":>14}  settings')
+
+    baseline: float | None = None
+    for scheme in schemes:
+        context = create_crypt_context([scheme], settings)
+        hash_time, verify_time = measure(context, iterations)
+        baseline = verify_time if baseline is None else baseline
+        scheme_settings = ' '.join(f'{k}={v}' for k, v in sorted(context.to_dict().items()) if k.startswith(f'{scheme}__'))
+
+        print(
+            f'{scheme:<16}{hash_time * 1e3:>12.1f}{verify_time * 1e3:>14.1f}{1 / verify_time:>16.1f}'
+            f'{verify_time / baseline:>13.1f}x  {scheme_settings}'
+        )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
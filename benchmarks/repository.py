@@ -0,0 +1,257 @@
+# ruff: noqa: T201
+# Times the FirestoreUserRepository operations against the Firestore emulator for growing collection sizes,
+# including create under concurrent contention with its transaction retries, and writes the results as JSON.
+# Usage: FIRESTORE_EMULATOR_HOST=127.0.0.1:5005 python -m benchmarks.repository --sizes 1000 10000 --output run.json
+#        python -m benchmarks.repository --compare baseline.json run.json [--threshold 0.2]
+# The emulator data is reset before each size. The compare mode exits with status 1 if an operation regressed.
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import requests
+from google.cloud.firestore_v1.transaction import Transaction
+
+from demo.generate import generate_users
+from models import User
+from repositories.errors import DuplicateEmailError
+from repositories.firestore import FirestoreUserRepository
+from services import create_crypt_context
+
+# Metrics compared between runs, a regression is a change by more than the threshold in the wrong direction
+LATENCY_METRICS = ('p50_ms', 'p95_ms')
+THROUGHPUT_METRICS = ('users_per_second', 'documents_per_second')
+
+
+class RetryCounter:
+    # Counts the transaction attempts that retry an aborted transaction, they begin with the ID of the failed one
+    def __init__(self) -> None:
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def counting(self) -> Iterator[None]:
+        begin = Transaction._begin  # noqa: SLF001
+        counter = self
+
+        def counting_begin(transaction: Transaction, retry_id: bytes | None = None) -> None:
+            if retry_id is not None:
+                with counter._lock:  # noqa: SLF001
+                    counter.retries += 1
+            begin(transaction, retry_id=retry_id)  # type: ignore[arg-type]
+
+        with mock.patch.object(Transaction, '_begin', counting_begin):
+            yield
+
+    def take(self) -> int:
+        with self._lock:
+            retries, self.retries = self.retries, 0
+            return retries
+
+
+def reset_emulator(database: str) -> None:
+    requests.delete(
+        f'http://{os.environ["FIRESTORE_EMULATOR_HOST"]}/emulator/v1/projects/google-cloud-firestore-emulator/databases/{database}/documents',
+        timeout=60,
+    ).raise_for_status()
+
+
+def new_user(client_ids: list[str], email: str | None = None) -> User:
+    user_id = str(uuid.uuid4())
+    return User(
+        id=user_id,
+        client_id=random.choice(client_ids),  # noqa: S311
+        name='Benchmark User',
+        email=email or f'bench.{user_id}@example.org',
+        password='not-a-real-hash',  # noqa: S106
+    )
+
+
+def summarize(latencies: list[float], **extra: int) -> dict[str, Any]:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'count': len(latencies),
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        **extra,
+    }
+
+
+def time_calls(fn: Callable[[int], object], samples: int) -> list[float]:
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def time_concurrent(fn: Callable[[int], object], samples: int, concurrency: int) -> tuple[list[float], int]:
+    # Returns the latencies of the calls that succeeded and the number of calls that raised DuplicateEmailError
+    latencies: list[float] = []
+    duplicates = 0
+    lock = threading.Lock()
+
+    def call(i: int) -> None:
+        nonlocal duplicates
+        start = time.perf_counter()
+        try:
+            fn(i)
+        except DuplicateEmailError:
+            with lock:
+                duplicates += 1
+            return
+
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(samples)))
+
+    return latencies, duplicates
+
+
+def bench_size(repo: FirestoreUserRepository, size: int, clients: int, samples: int, concurrency: int) -> dict[str, Any]:
+    client_ids = [str(uuid.uuid4()) for _ in range(clients)]
+    users = generate_users(size, create_crypt_context().hash, client_ids=client_ids, seed=size)
+    results: dict[str, Any] = {}
+    counter = RetryCounter()
+
+    start = time.perf_counter()
+    repo.create_many(users)
+    seed_time = time.perf_counter() - start
+    results['seed'] = {'users': size, 'seconds': seed_time, 'users_per_second': size / seed_time}
+
+    sample = random.sample(users, min(samples, len(users)))
+    results['get'] = summarize(time_calls(lambda i: repo.get(sample[i].id, sample[i].client_id), len(sample)))
+    results['get_missing'] = summarize(time_calls(lambda _: repo.get(str(uuid.uuid4()), client_ids[0]), samples))
+    results['find_by_email'] = summarize(time_calls(lambda i: repo.find_by_email(sample[i].email), len(sample)))
+    results['find_by_email_missing'] = summarize(
+        time_calls(lambda _: repo.find_by_email(f'missing.{uuid.uuid4()}@example.org'), samples)
+    )
+    results['get_many_50'] = summarize(
+        time_calls(lambda _: repo.get_many([(u.client_id, u.id) for u in random.sample(users, min(50, size))]), samples)
+    )
+    results['list_by_client_50'] = summarize(
+        time_calls(lambda i: repo.list_by_client(client_ids[i % clients], limit=50), samples)
+    )
+
+    with counter.counting():
+        results['create'] = summarize(time_calls(lambda _: repo.create(new_user(client_ids)), samples), retries=counter.take())
+
+        # Distinct emails, the transactions only compete for the emulator
+        latencies, _ = time_concurrent(lambda _: repo.create(new_user(client_ids)), samples, concurrency)
+        results['create_concurrent'] = summarize(latencies, retries=counter.take())
+
+        # Every group of `concurrency` calls races for the same email, one of them wins
+        emails = [f'contended.{uuid.uuid4()}@example.org' for _ in range(max(samples // concurrency, 1))]
+        latencies, duplicates = time_concurrent(
+            lambda i: repo.create(new_user(client_ids, emails[i % len(emails)])), len(emails) * concurrency, concurrency
+        )
+        results['create_contended'] = summarize(latencies, retries=counter.take(), duplicates=duplicates)
+
+    start = time.perf_counter()
+    deleted = repo.delete_all()
+    delete_time = time.perf_counter() - start
+    results['delete_all'] = {
+        'documents': sum(deleted.values()),
+        'seconds': delete_time,
+        'documents_per_second': sum(deleted.values()) / delete_time,
+    }
+
+    return results
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[str]:
+    regressions = []
+    for size, operations in current['results'].items():
+        for operation, metrics in operations.items():
+            base_metrics = baseline['results'].get(size, {}).get(operation)
+            if base_metrics is None:
+                continue
+
+            for metric in (*LATENCY_METRICS, *THROUGHPUT_METRICS):
+                if metric not in metrics or not base_metrics.get(metric):
+                    continue
+
+                change = metrics[metric] / base_metrics[metric] - 1
+                worse = change > threshold if metric in LATENCY_METRICS else change < -threshold
+                flag = 'REGRESSION' if worse else ''
+                print(
+                    f'{size:>8} {operation:<22} {metric:<20} '
+                    f'{base_metrics[metric]:9.2f} -> {metrics[metric]:9.2f} ({change:+7.1%}) {flag}'
+                )
+                if flag:
+                    regressions.append(f'{size}/{operation}/{metric}')
+
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()  # noqa: S603, S607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark FirestoreUserRepository against the Firestore emulator.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative increase flagged as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (json.loads(Path(path).read_text()) for path in args.compare)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+            sys.exit(1)
+        return
+
+    if 'FIRESTORE_EMULATOR_HOST' not in os.environ:
+        sys.exit('FIRESTORE_EMULATOR_HOST must point to a running Firestore emulator')
+
+    database = os.getenv('FIRESTORE_DATABASE', '(default)')
+    repo = FirestoreUserRepository(database)
+
+    results: dict[str, Any] = {}
+    for size in args.sizes:
+        reset_emulator(database)
+        results[str(size)] = bench_size(repo, size, args.clients, args.samples, args.concurrency)
+        print(f'Benchmarked {size} users', file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'threshold')},
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# ruff: noqa: T201
+# Usage: python -m benchmarks.schema_validation [iterations]
+import functools
+import sys
+import timeit
+from typing import Any
+
+import marshmallow_dataclass
+
+from blueprints.auth import AuthBody
+from blueprints.user import FindByEmailBody, RegisterBody
+from blueprints.util import schema_for
+
+BODIES: list[tuple[type[Any], dict[str, Any]]] = [
+    (AuthBody, {'username': 'r.almeida@example.org', 'password': 'password123'}),
+    (
+        RegisterBody,
+        {
+            'clientId': 'acfa53b4-58f3-46e8-809b-19ef52b437ed',
+            'name': 'Rafael Almeida',
+            'email': 'r.almeida@example.org',
+            'password': 'password123',
+        },
+    ),
+    (FindByEmailBody, {'email': 'r.almeida@example.org'}),
+]
+
+
+def load_uncached(cls: type[Any], body: dict[str, Any]) -> None:
+    marshmallow_dataclass.class_schema(cls)().load(body)
+
+
+def load_cached(cls: type[Any], body: dict[str, Any]) -> None:
+    schema_for(cls).load(body)
+
+
+def main(iterations: int) -> None:
+    print(f'{"schema":<20}{"per request (us)":>20}{"cached (us)":>16}{"speedup":>10}')
+
+    for cls, body in BODIES:
+        uncached = timeit.timeit(functools.partial(load_uncached, cls, body), number=iterations) / iterations
+        cached = timeit.timeit(functools.partial(load_cached, cls, body), number=iterations) / iterations
+
+        print(f'{cls.__name__:<20}{uncached * 1e6:>20.1f}{cached * 1e6:>16.1f}{uncached / cached:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
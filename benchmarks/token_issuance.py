@@ -0,0 +1,63 @@
+# ruff: noqa: T201
+# Usage: python -m benchmarks.token_issuance [iterations]
+import datetime
+import sys
+import timeit
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from models import User
+from services import SigningKeyProvider, TokenIssuer
+
+USER = User(
+    id='46f94cd1-8494-4e96-b308-80d7705868be',
+    client_id='acfa53b4-58f3-46e8-809b-19ef52b437ed',
+    name='Rafael Almeida',
+    email='r.almeida@example.org',
+    password='',
+)
+
+
+def issue_from_pem(pem: str, issuer: str) -> str:
+    # What the auth handler did before the signing key was cached
+    now = datetime.datetime.now(datetime.UTC)
+    payload = {
+        'iss': issuer,
+        'sub': USER.id,
+        'cid': USER.client_id,
+        'email': USER.email,
+        'role': 'user',
+        'aud': 'user',
+        'iat': int(now.timestamp()),
+        'exp': int((now + datetime.timedelta(minutes=60)).timestamp()),
+    }
+
+    return jwt.encode(payload, pem, algorithm='EdDSA')
+
+
+def main(iterations: int) -> None:
+    pem = (
+        Ed25519PrivateKey.generate()
+        .private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        .decode()
+    )
+    issuer = 'https://example.org'
+    token_issuer = TokenIssuer(SigningKeyProvider(private_key=pem), issuer=issuer)
+
+    pem_time = timeit.timeit(lambda: issue_from_pem(pem, issuer), number=iterations) / iterations
+    cached_time = timeit.timeit(lambda: token_issuer.issue(USER), number=iterations) / iterations
+
+    print(f'{"":<16}{"per token (us)":>16}{"tokens/s":>12}')
+    print(f'{"PEM per token":<16}{pem_time * 1e6:>16.1f}{1 / pem_time:>12.0f}')
+    print(f'{"cached key":<16}{cached_time * 1e6:>16.1f}{1 / cached_time:>12.0f}')
+    print(f'speedup: {pem_time / cached_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -3,7 +3,8 @@
 from .auth import blp as BlueprintAuth
 from .backup import blp as BlueprintBackup
 from .health import blp as BlueprintHealth
+from .metrics import blp as BlueprintMetrics
 from .reset import blp as BlueprintReset
 from .user import blp as BlueprintUser
 
-__all__ = ['BlueprintAuth', 'BlueprintBackup', 'BlueprintHealth', 'BlueprintReset', 'BlueprintUser']
+__all__ = ['BlueprintAuth', 'BlueprintBackup', 'BlueprintHealth', 'BlueprintMetrics', 'BlueprintReset', 'BlueprintUser']
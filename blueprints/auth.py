@@ -1,82 +1,61 @@
-import datetime
-import typing
 from dataclasses import dataclass
 
-import jwt
-import marshmallow_dataclass
 from dependency_injector.wiring import Provide, inject
 from flask import Blueprint, Response, request
 from flask.views import MethodView
-from marshmallow import ValidationError
-from passlib.hash import pbkdf2_sha256
 
 from containers import Container
-from repositories import UserRepository
+from services import AuthService, UserServiceError
 
-from .util import class_route, error_response, json_response, validation_error_response
+from .util import class_route, error_response, json_response, load_json_body
 
 blp = Blueprint('Authentication', __name__)
 
 
-class JWTPayload(typing.TypedDict):
-    iss: str
-    sub: str
-    cid: str
-    email: str
-    role: str
-    aud: str
-    iat: int
-    exp: int
-
-
 @dataclass
 class AuthBody:
     username: str
     password: str
 
 
+@dataclass
+class RefreshBody:
+    refreshToken: str  # noqa: N815
+
+
 @class_route(blp, '/api/v1/auth/user')
 class AuthEmployee(MethodView):
     init_every_request = False
 
     @inject
-    def post(
-        self,
-        user_repo: UserRepository = Provide[Container.user_repo],
-        jwt_issuer: str = Provide[Container.config.jwt.issuer.required()],
-        jwt_private_key: str = Provide[Container.config.jwt.private_key.required()],
-    ) -> Response:
-        auth_schema = marshmallow_dataclass.class_schema(AuthBody)()
-        req_json = request.get_json(silent=True)
-        if req_json is None:
-            return error_response('The request body could not be parsed as valid JSON.', 400)
+    def post(self, auth: AuthService = Provide[Container.auth_service]) -> Response:
+        data = load_json_body(AuthBody)
+        if isinstance(data, Response):
+            return data
+
+        try:
+            token, refresh_token = auth.login(
+                data.username, data.password, request.headers.get('X-Forwarded-For'), request.remote_addr
+            )
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
+
+        return json_response({'token': token, 'refreshToken': refresh_token}, 200)
+
+
+@class_route(blp, '/api/v1/auth/user/refresh')
+class AuthRefresh(MethodView):
+    init_every_request = False
+
+    @inject
+    def post(self, auth: AuthService = Provide[Container.auth_service]) -> Response:
+        data = load_json_body(RefreshBody)
+        if isinstance(data, Response):
+            return data
 
         try:
-            data: AuthBody = auth_schema.load(req_json)
-        except ValidationError as err:
-            return validation_error_response(err)
-
-        user = user_repo.find_by_email(data.username)
-
-        if user is None or not pbkdf2_sha256.verify(data.password, user.password):
-            return error_response('Invalid username or password.', 401)
-
-        time_issued = datetime.datetime.now(datetime.UTC)
-        time_expiry = time_issued + datetime.timedelta(minutes=60)
-
-        payload: JWTPayload = {
-            'iss': jwt_issuer,
-            'sub': user.id,
-            'cid': user.client_id,
-            'email': user.email,
-            'role': 'user',
-            'aud': 'user',
-            'iat': int(time_issued.timestamp()),
-            'exp': int(time_expiry.timestamp()),
-        }
-
-        resp = {
-            'token': jwt.encode(typing.cast(dict[str, typing.Any], payload), jwt_private_key, algorithm='EdDSA'),
-        }
-
-        return json_response(resp, 200)
+            token, refresh_token = auth.refresh(data.refreshToken)
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
+
+        return json_response({'token': token, 'refreshToken': refresh_token}, 200)
@@ -21,10 +21,11 @@ class Backup(MethodView):
         project_id: str = Provide[Container.config.project_id],
         database: str = Provide[Container.config.firestore.database],
         access_token: str = Provide[Container.access_token],
+        session: requests.Session = Provide[Container.http_session],
     ) -> Response:
         timestamp = datetime.now(UTC).replace(hour=7, minute=0, second=0, microsecond=0).isoformat().replace('+00:00', 'Z')
 
-        res = requests.post(
+        res = session.post(
             f'https://firestore.googleapis.com/v1/projects/{project_id}/databases/{database}:exportDocuments',
             json={
                 'outputUriPrefix': f'gs://{project_id}-backup/firestore/{database}/{timestamp}',
@@ -0,0 +1,53 @@
+import time
+
+from dependency_injector.wiring import Provide, inject
+from flask import Blueprint, Response, g, request
+from flask.views import MethodView
+
+from containers import Container
+from services import MetricsRegistry
+
+from .util import class_route
+
+blp = Blueprint('Metrics', __name__)
+
+
+def _route() -> str:
+    # The URL rule rather than the path, so user and client IDs do not create a series each
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+@blp.before_app_request
+@inject
+def start_request(metrics: MetricsRegistry = Provide[Container.metrics]) -> None:
+    g.metrics_start = time.perf_counter()
+    metrics.http_requests_in_flight.inc(request.method, _route())
+
+
+@blp.after_app_request
+def record_status(response: Response) -> Response:
+    g.metrics_status = str(response.status_code)
+    return response
+
+
+@blp.teardown_app_request
+@inject
+def end_request(_exc: BaseException | None, metrics: MetricsRegistry = Provide[Container.metrics]) -> None:
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+
+    # Unhandled exceptions skip the after request hooks when they are propagated
+    route = _route()
+    metrics.http_requests.inc(request.method, route, g.pop('metrics_status', '500'))
+    metrics.http_requests_in_flight.dec(request.method, route)
+    metrics.http_request_duration.observe(time.perf_counter() - start, request.method, route)
+
+
+@class_route(blp, '/api/v1/metrics/user')
+class Metrics(MethodView):
+    init_every_request = False
+
+    @inject
+    def get(self, metrics: MetricsRegistry = Provide[Container.metrics]) -> Response:
+        return Response(metrics.render(), status=200, mimetype='text/plain; version=0.0.4')
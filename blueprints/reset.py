@@ -4,12 +4,15 @@ from flask.views import MethodView
 
 import demo
 from containers import Container
-from repositories import UserRepository
+from repositories import RefreshTokenRepository, UserRepository
+from services import HashingExecutor
 
-from .util import class_route, json_response
+from .util import class_route, error_response, json_response
 
 blp = Blueprint('Reset database', __name__)
 
+MAX_RESET_SIZE = 100000
+
 
 @class_route(blp, '/api/v1/reset/user')
 class ResetDB(MethodView):
@@ -19,11 +22,24 @@ class ResetDB(MethodView):
     def post(
         self,
         user_repo: UserRepository = Provide[Container.user_repo],
+        refresh_token_repo: RefreshTokenRepository = Provide[Container.refresh_token_repo],
+        hashing: HashingExecutor = Provide[Container.hashing],
     ) -> Response:
-        user_repo.delete_all()
+        try:
+            size = int(request.args.get('size', '0'))
+        except ValueError:
+            size = -1
+
+        if not 0 <= size <= MAX_RESET_SIZE:
+            return error_response(f'Invalid value for size: Must be an integer between 0 and {MAX_RESET_SIZE}.', 400)
+
+        deleted = user_repo.delete_all() | refresh_token_repo.delete_all()
+
+        users = demo.users if request.args.get('demo', 'false') == 'true' else []
+        users = users + demo.generate_users(size, hashing.hash)
 
-        if request.args.get('demo', 'false') == 'true':
-            for user in demo.users:
-                user_repo.create(user)
+        created = 0
+        if len(users) > 0:
+            created = len(users) - len(user_repo.create_many(users))
 
-        return json_response({'status': 'Ok'}, 200)
+        return json_response({'status': 'Ok', 'deleted': deleted, 'created': created}, 200)
@@ -1,19 +1,22 @@
+import itertools
+import json
 import uuid
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass, field
-from typing import Any
+from typing import IO, Any, cast
 
 import marshmallow.validate
-import marshmallow_dataclass
 from dependency_injector.wiring import Provide
-from flask import Blueprint, Response, request
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from flask.views import MethodView
 from marshmallow import ValidationError
-from passlib.hash import pbkdf2_sha256
 
 from containers import Container
 from models import User
 from repositories import ClientRepository, UserRepository
-from repositories.errors import DuplicateEmailError
+from repositories.errors import InvalidCursorError
+from services import HashingExecutor, HashingQueueFullError, UserService, UserServiceError
+from services.errors import EmailTakenError, ServerBusyError, UnknownClientError
 
 from .util import (
     UUID4Validator,
@@ -21,13 +24,20 @@ from .util import (
     error_response,
     is_valid_uuid4,
     json_response,
+    load_json_body,
     requires_token,
-    validation_error_response,
+    schema_for,
+    validation_error_message,
 )
 
 blp = Blueprint('Users', __name__)
 
-USER_NOT_FOUND = 'User not found'
+MAX_BATCH_SIZE = 100
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+LIST_FIELDS = {'id': 'id', 'clientId': 'client_id', 'name': 'name', 'email': 'email'}
+IMPORT_CHUNK_SIZE = 500
+IMPORT_FAILED = 'The user could not be imported, please try again later.'
 
 
 def user_to_dict(user: User) -> dict[str, Any]:
@@ -50,11 +60,11 @@ class UserInfo(MethodView):
     init_every_request = False
 
     @requires_token
-    def get(self, token: dict[str, Any], user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
-        user = user_repo.get(user_id=token['sub'], client_id=token['cid'])
-
-        if user is None:
-            return error_response(USER_NOT_FOUND, 404)
+    def get(self, token: dict[str, Any], users: UserService = Provide[Container.user_service]) -> Response:
+        try:
+            user = users.get(user_id=token['sub'], client_id=token['cid'])
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
 
         return json_response(user_to_dict(user), 200)
 
@@ -64,21 +74,109 @@ class UserInfo(MethodView):
 class RetrieveUser(MethodView):
     init_every_request = False
 
-    def get(self, client_id: str, user_id: str, user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
+    def get(self, client_id: str, user_id: str, users: UserService = Provide[Container.user_service]) -> Response:
         if not is_valid_uuid4(client_id):
             return error_response('Invalid client ID.', 400)
 
         if not is_valid_uuid4(user_id):
             return error_response('Invalid user ID.', 400)
 
-        user = user_repo.get(user_id=user_id, client_id=client_id)
-
-        if user is None:
-            return error_response(USER_NOT_FOUND, 404)
+        try:
+            user = users.get(user_id=user_id, client_id=client_id)
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
 
         return json_response(user_to_dict(user), 200)
 
 
+# Internal only
+@class_route(blp, '/api/v1/users/<client_id>/export')
+class ExportUsers(MethodView):
+    init_every_request = False
+
+    def get(self, client_id: str, user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
+        if not is_valid_uuid4(client_id):
+            return error_response('Invalid client ID.', 400)
+
+        def generate() -> Iterator[str]:
+            for user in user_repo.iter_by_client(client_id):
+                yield json.dumps(user_to_dict(user)) + '\n'
+
+        return Response(generate(), status=200, mimetype='application/x-ndjson')
+
+
+# Internal only
+@class_route(blp, '/api/v1/users/<client_id>')
+class ListUsers(MethodView):
+    init_every_request = False
+
+    def get(self, client_id: str, user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
+        if not is_valid_uuid4(client_id):
+            return error_response('Invalid client ID.', 400)
+
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return error_response(f'Invalid value for limit: Must be an integer between 1 and {MAX_PAGE_SIZE}.', 400)
+
+        fields = list(LIST_FIELDS)
+        if 'fields' in request.args:
+            fields = list(dict.fromkeys(request.args['fields'].split(',')))
+            if not set(fields) <= LIST_FIELDS.keys():
+                return error_response(f'Invalid value for fields: Must be a subset of {", ".join(LIST_FIELDS)}.', 400)
+
+        try:
+            users, next_cursor = user_repo.list_by_client(
+                client_id,
+                cursor=request.args.get('cursor') or None,
+                limit=limit,
+                fields=[LIST_FIELDS[f] for f in fields],
+            )
+        except InvalidCursorError:
+            return error_response('Invalid value for cursor: Not a valid cursor.', 400)
+
+        return json_response(
+            {
+                'users': [{f: user[LIST_FIELDS[f]] for f in fields} for user in users],
+                'nextCursor': next_cursor,
+            },
+            200,
+        )
+
+
+@dataclass
+class UserKey:
+    clientId: str = field(metadata={'validate': UUID4Validator()})  # noqa: N815
+    userId: str = field(metadata={'validate': UUID4Validator()})  # noqa: N815
+
+
+@dataclass
+class BatchBody:
+    users: list[UserKey] = field(metadata={'validate': marshmallow.validate.Length(min=1, max=MAX_BATCH_SIZE)})
+
+
+# Internal only
+@class_route(blp, '/api/v1/users/batch')
+class RetrieveUserBatch(MethodView):
+    init_every_request = False
+
+    def post(self, user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
+        data = load_json_body(BatchBody)
+        if isinstance(data, Response):
+            return data
+
+        keys = list(dict.fromkeys((key.clientId, key.userId) for key in data.users))
+        users = user_repo.get_many(keys)
+
+        found = {(user.client_id, user.id) for user in users}
+        missing = [{'clientId': key[0], 'userId': key[1]} for key in keys if key not in found]
+
+        return json_response({'users': [user_to_dict(user) for user in users], 'missing': missing}, 200)
+
+
 @dataclass
 class RegisterBody:
     clientId: str = field(metadata={'validate': UUID4Validator()})  # noqa: N815
@@ -91,36 +189,15 @@ class RegisterBody:
 class UserRegister(MethodView):
     init_every_request = False
 
-    def post(
-        self,
-        user_repo: UserRepository = Provide[Container.user_repo],
-        client_repo: ClientRepository = Provide[Container.client_repo],
-    ) -> Response:
-        auth_schema = marshmallow_dataclass.class_schema(RegisterBody)()
-        req_json = request.get_json(silent=True)
-        if req_json is None:
-            return error_response('The request body could not be parsed as valid JSON.', 400)
+    def post(self, users: UserService = Provide[Container.user_service]) -> Response:
+        data = load_json_body(RegisterBody)
+        if isinstance(data, Response):
+            return data
 
         try:
-            data: RegisterBody = auth_schema.load(req_json)
-        except ValidationError as err:
-            return validation_error_response(err)
-
-        if client_repo.get(data.clientId) is None:
-            return error_response('Invalid value for clientId: Client does not exist.', 400)
-
-        user = User(
-            id=str(uuid.uuid4()),
-            client_id=data.clientId,
-            name=data.name,
-            email=data.email,
-            password=pbkdf2_sha256.hash(data.password),
-        )
-
-        try:
-            user_repo.create(user)
-        except DuplicateEmailError:
-            return error_response('A user with the email already exists.', 409)
+            user = users.register(client_id=data.clientId, name=data.name, email=data.email, password=data.password)
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
 
         return json_response(user_to_dict(user), 201)
 
@@ -130,22 +207,133 @@ class UserRegister(MethodView):
 class FindUser(MethodView):
     init_every_request = False
 
-    def post(self, user_repo: UserRepository = Provide[Container.user_repo]) -> Response:
+    def post(self, users: UserService = Provide[Container.user_service]) -> Response:
         # Parse request body
-        find_schema = marshmallow_dataclass.class_schema(FindByEmailBody)()
-        req_json = request.get_json(silent=True)
-        if req_json is None:
-            return error_response('The request body could not be parsed as valid JSON.', 400)
+        data = load_json_body(FindByEmailBody)
+        if isinstance(data, Response):
+            return data
 
+        # Find user by email
         try:
-            data: FindByEmailBody = find_schema.load(req_json)
+            user = users.find_by_email(data.email)
+        except UserServiceError as err:
+            return error_response(err.message, err.status)
+
+        return json_response(user_to_dict(user), 200)
+
+
+def read_import_lines(stream: IO[bytes]) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    # Yields each non-empty line number with its parsed JSON object, or with an error message
+    for lineno, raw_line in enumerate(stream, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield lineno, 'The line could not be parsed as valid JSON.'
+            continue
+
+        if not isinstance(obj, dict):
+            yield lineno, 'The line could not be parsed as valid JSON.'
+            continue
+
+        yield lineno, obj
+
+
+def import_chunk(
+    chunk: list[tuple[int, dict[str, Any] | str]],
+    clients: dict[str, bool],
+    user_repo: UserRepository,
+    client_repo: ClientRepository,
+    hashing: HashingExecutor,
+) -> Iterator[dict[str, Any]]:
+    # Yields the result of each line as soon as it is known, so the lines answered before a failure keep their result
+    schema = schema_for(RegisterBody)
+    valid: list[tuple[int, RegisterBody]] = []
+
+    for lineno, obj in chunk:
+        if isinstance(obj, str):
+            yield {'line': lineno, 'code': 400, 'message': obj}
+            continue
+
+        try:
+            data = cast(RegisterBody, schema.load(obj))
         except ValidationError as err:
-            return validation_error_response(err)
+            yield {'line': lineno, 'code': 400, 'message': validation_error_message(err)}
+            continue
+
+        if data.clientId not in clients:
+            clients[data.clientId] = client_repo.get(data.clientId) is not None
+
+        if not clients[data.clientId]:
+            yield {
+                'line': lineno,
+                'code': 400,
+                'message': UnknownClientError.message,
+            }
+            continue
+
+        valid.append((lineno, data))
+
+    password_hashes = hashing.hash_many([data.password for _, data in valid])
+    users = [
+        User(id=str(uuid.uuid4()), client_id=data.clientId, name=data.name, email=data.email, password=password_hash)
+        for (_, data), password_hash in zip(valid, password_hashes, strict=True)
+    ]
+
+    rejected = {user.id for user in user_repo.create_many(users)} if users else set()
+
+    for (lineno, _), user in zip(valid, users, strict=True):
+        if user.id in rejected:
+            yield {'line': lineno, 'code': 409, 'message': EmailTakenError.message}
+        else:
+            yield {'line': lineno, 'code': 201, 'user': user_to_dict(user)}
+
+
+def import_users(
+    lines: Iterable[tuple[int, dict[str, Any] | str]],
+    user_repo: UserRepository,
+    client_repo: ClientRepository,
+    hashing: HashingExecutor,
+) -> Iterator[dict[str, Any]]:
+    clients: dict[str, bool] = {}
+    line_iter = iter(lines)
+
+    while chunk := list(itertools.islice(line_iter, IMPORT_CHUNK_SIZE)):
+        results: dict[int, dict[str, Any]] = {}
+        message = ''
+        try:
+            for result in import_chunk(chunk, clients, user_repo, client_repo, hashing):
+                results[result['line']] = result
+        except HashingQueueFullError:
+            message = ServerBusyError.message
+        except Exception:
+            # The status line is already sent, so a failure is reported on the lines instead of cutting the stream
+            current_app.logger.exception('Failed to import a chunk of users')
+            message = IMPORT_FAILED
 
-        # Find user by email
-        user = user_repo.find_by_email(data.email)
+        for lineno, _ in chunk:
+            yield results.get(lineno) or {'line': lineno, 'code': 503, 'message': message}
 
-        if user is None:
-            return error_response(USER_NOT_FOUND, 404)
 
-        return json_response(user_to_dict(user), 200)
+# Internal only
+@class_route(blp, '/api/v1/users/import')
+class ImportUsers(MethodView):
+    init_every_request = False
+
+    def post(
+        self,
+        user_repo: UserRepository = Provide[Container.user_repo],
+        client_repo: ClientRepository = Provide[Container.client_repo],
+        hashing: HashingExecutor = Provide[Container.hashing],
+    ) -> Response:
+        # The body is NDJSON with one RegisterBody per line. It is read and written in chunks,
+        # and the response streams one result per line in the same order.
+        def generate() -> Iterator[str]:
+            lines = read_import_lines(request.stream)
+            for result in import_users(lines, user_repo, client_repo, hashing):
+                yield json.dumps(result) + '\n'
+
+        return Response(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
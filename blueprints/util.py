@@ -1,13 +1,20 @@
 import json
+import threading
 from collections.abc import Callable
-from typing import Any, cast
+from typing import Any, TypeVar, cast
 from uuid import UUID
 
+import marshmallow_dataclass
 from flask import Blueprint, Request, Response, request
 from flask.views import MethodView
-from marshmallow import ValidationError
+from marshmallow import Schema, ValidationError
 from tightwrap import wraps
 
+T = TypeVar('T')
+
+_schemas: dict[type[Any], Schema] = {}
+_schemas_lock = threading.Lock()
+
 
 class APIGatewayRequest(Request):
     user_token: dict[str, Any]
@@ -44,14 +51,52 @@ def error_response(msg: str, code: int) -> Response:
     return json_response({'message': msg, 'code': code}, code)
 
 
-def validation_error_response(err: ValidationError) -> Response:
+def _flatten_messages(messages: dict[Any, Any], prefix: str = '') -> list[tuple[str, list[str]]]:
+    flat: list[tuple[str, list[str]]] = []
+    for k, v in messages.items():
+        if isinstance(v, dict):
+            flat.extend(_flatten_messages(v, f'{prefix}{k}.'))
+        else:
+            flat.append((f'{prefix}{k}', v))
+
+    return flat
+
+
+def validation_error_message(err: ValidationError) -> str:
     if isinstance(err.messages, dict):
-        msg = ' '.join([f'Invalid value for {k}: {" ".join(v)}' for k, v in err.messages.items()])
-        return error_response(msg, 400)
+        return ' '.join([f'Invalid value for {k}: {" ".join(v)}' for k, v in _flatten_messages(err.messages)])
 
     raise NotImplementedError('Validation error response for non-dict messages not implemented.')  # pragma: no cover
 
 
+def validation_error_response(err: ValidationError) -> Response:
+    return error_response(validation_error_message(err), 400)
+
+
+def schema_for(cls: type[Any]) -> Schema:
+    schema = _schemas.get(cls)
+
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(cls)
+            if schema is None:
+                schema = marshmallow_dataclass.class_schema(cls)()
+                _schemas[cls] = schema
+
+    return schema
+
+
+def load_json_body(cls: type[T]) -> T | Response:
+    req_json = request.get_json(silent=True)
+    if req_json is None:
+        return error_response('The request body could not be parsed as valid JSON.', 400)
+
+    try:
+        return cast(T, schema_for(cls).load(req_json))
+    except ValidationError as err:
+        return validation_error_response(err)
+
+
 def requires_token(f: Callable[..., Response]) -> Callable[..., Response]:
     @wraps(f)
     def decorated_function(*args, **kwargs) -> Response:  # type: ignore[no-untyped-def] # noqa: ANN002, ANN003
@@ -2,8 +2,32 @@ from dependency_injector import providers
 from dependency_injector.containers import DeclarativeContainer, WiringConfiguration
 from gcp_microservice_utils import access_token_provider
 
-from repositories.firestore import FirestoreUserRepository
-from repositories.rest import RestClientRepository
+from repositories.cache import CachedClientRepository, CachedUserRepository
+from repositories.firestore import (
+    FirestoreRefreshTokenRepository,
+    FirestoreUserIndex,
+    FirestoreUserRepository,
+    IndexedUserRepository,
+)
+from repositories.memory import InMemoryRefreshTokenRepository, InMemoryUserRepository
+from repositories.rest import RestClientRepository, init_http_session
+from services import (
+    AuthService,
+    InMemoryRateLimitStore,
+    InstrumentedClientRepository,
+    InstrumentedUserRepository,
+    LoginRateLimiter,
+    MetricsRegistry,
+    RefreshTokenIssuer,
+    SigningKeyProvider,
+    TokenIssuer,
+    UserService,
+    collect_client_cache,
+    collect_user_cache,
+    collect_user_index,
+    create_crypt_context,
+    init_hashing,
+)
 
 
 class Container(DeclarativeContainer):
@@ -12,12 +36,133 @@ class Container(DeclarativeContainer):
 
     access_token = providers.Callable(access_token_provider)
 
+    metrics = providers.ThreadSafeSingleton(MetricsRegistry)
+
+    signing_key = providers.ThreadSafeSingleton(
+        SigningKeyProvider,
+        private_key=config.jwt.private_key,
+        private_key_file=config.jwt.private_key_file,
+    )
+    token_issuer = providers.ThreadSafeSingleton(
+        TokenIssuer,
+        key_provider=signing_key,
+        issuer=config.jwt.issuer.required(),
+    )
+    refresh_token_repo = providers.Selector(
+        config.user.storage,
+        firestore=providers.ThreadSafeSingleton(FirestoreRefreshTokenRepository, database=config.firestore.database),
+        memory=providers.ThreadSafeSingleton(InMemoryRefreshTokenRepository),
+    )
+    refresh_token_issuer = providers.ThreadSafeSingleton(
+        RefreshTokenIssuer,
+        repository=refresh_token_repo,
+        lifetime=config.jwt.refresh_token_lifetime,
+    )
+
+    http_session = providers.Resource(
+        init_http_session,
+        pool_size=config.http.pool_size,
+        retries=config.http.retries,
+        backoff_factor=config.http.backoff_factor,
+    )
+
     client_repo = providers.ThreadSafeSingleton(
-        RestClientRepository,
-        base_url=config.svc.client.url,
-        token_provider=config.svc.client.token_provider,
+        collect_client_cache,
+        repository=providers.ThreadSafeSingleton(
+            CachedClientRepository,
+            repository=providers.ThreadSafeSingleton(
+                InstrumentedClientRepository,
+                repository=providers.ThreadSafeSingleton(
+                    RestClientRepository,
+                    base_url=config.svc.client.url,
+                    token_provider=config.svc.client.token_provider,
+                    session=http_session,
+                ),
+                metrics=metrics,
+            ),
+            maxsize=config.svc.client.cache.maxsize,
+            ttl=config.svc.client.cache.ttl,
+            negative_ttl=config.svc.client.cache.negative_ttl,
+        ),
+        metrics=metrics,
     )
-    user_repo = providers.ThreadSafeSingleton(
+    firestore_user_repo = providers.ThreadSafeSingleton(
         FirestoreUserRepository,
         database=config.firestore.database,
+        email_fallback=config.user.email_fallback,
+    )
+    # The in-memory storage is meant for local load testing and benchmarks, it is lost on restart
+    user_store = providers.ThreadSafeSingleton(
+        InstrumentedUserRepository,
+        repository=providers.Selector(
+            config.user.storage,
+            firestore=firestore_user_repo,
+            memory=providers.ThreadSafeSingleton(InMemoryUserRepository),
+        ),
+        metrics=metrics,
+        name=config.user.storage,
+    )
+    cached_user_repo = providers.ThreadSafeSingleton(
+        collect_user_cache,
+        repository=providers.ThreadSafeSingleton(
+            CachedUserRepository,
+            repository=user_store,
+            maxsize=config.user.cache.maxsize,
+            ttl=config.user.cache.ttl,
+            negative_ttl=config.user.cache.negative_ttl,
+        ),
+        metrics=metrics,
+    )
+    user_repo = providers.Selector(
+        config.user.cache.mode,
+        none=user_store,
+        ttl=cached_user_repo,
+        # Falls back to the TTL cache while the snapshot listener is not synced
+        snapshot=providers.ThreadSafeSingleton(
+            IndexedUserRepository,
+            index=providers.ThreadSafeSingleton(
+                collect_user_index,
+                index=providers.ThreadSafeSingleton(FirestoreUserIndex, database=config.firestore.database),
+                metrics=metrics,
+            ),
+            fallback=cached_user_repo,
+        ),
+    )
+
+    # A resource, so shutdown_resources stops the process pool and the rehash thread
+    hashing = providers.Resource(
+        init_hashing,
+        workers=config.hashing.workers,
+        max_pending=config.hashing.max_pending,
+        context=providers.Callable(create_crypt_context, schemes=config.hashing.schemes, settings=config.hashing.settings),
+        metrics=metrics,
+    )
+
+    login_rate_limiter = providers.ThreadSafeSingleton(
+        LoginRateLimiter,
+        # Only kept in memory for now, a shared store (e.g. Redis) can be added as another selection
+        store=providers.Selector(
+            config.rate_limit.store,
+            memory=providers.ThreadSafeSingleton(InMemoryRateLimitStore),
+        ),
+        username_limit=config.rate_limit.username_limit,
+        ip_limit=config.rate_limit.ip_limit,
+        window=config.rate_limit.window,
+        trusted_proxies=config.rate_limit.trusted_proxies,
+    )
+
+    # Created per call, so the dependencies are resolved again when a provider is overridden
+    auth_service = providers.Factory(
+        AuthService,
+        user_repo=user_repo,
+        hashing=hashing,
+        token_issuer=token_issuer,
+        refresh_token_issuer=refresh_token_issuer,
+        rate_limiter=login_rate_limiter,
+    )
+    user_service = providers.Factory(
+        UserService,
+        user_repo=user_repo,
+        client_repo=client_repo,
+        hashing=hashing,
     )
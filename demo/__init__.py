@@ -1,3 +1,4 @@
 from .data import users
+from .generate import generate_users
 
-__all__ = ['users']
+__all__ = ['generate_users', 'users']
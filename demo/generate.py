@@ -0,0 +1,40 @@
+from collections.abc import Callable
+from typing import cast
+
+from faker import Faker
+
+from models import User
+
+from .data import ID_GIGATEL, ID_GLOBALCOM, ID_UNIVERSO
+
+DEFAULT_PASSWORD = 'password123'  # noqa: S105
+
+
+def generate_users(
+    count: int, hash_password: Callable[[str], str], client_ids: list[str] | None = None, seed: int | None = None
+) -> list[User]:
+    # Synthetic users spread over the demo clients. All of them share one password hash, made with the configured
+    # hashing so logins do not rehash it, hashing once per user would dominate the time to seed large datasets.
+    if count == 0:
+        return []
+
+    if client_ids is None:
+        client_ids = [ID_UNIVERSO, ID_GLOBALCOM, ID_GIGATEL]
+
+    fake = Faker()
+    if seed is not None:
+        fake.seed_instance(seed)
+
+    password = hash_password(DEFAULT_PASSWORD)
+
+    return [
+        User(
+            id=cast(str, fake.uuid4()),
+            client_id=client_ids[i % len(client_ids)],
+            name=fake.name(),
+            # The index keeps the emails unique without Faker's unique proxy, which slows down as it fills up
+            email=f'{fake.user_name()}.{i}@{fake.domain_name()}',
+            password=password,
+        )
+        for i in range(count)
+    ]
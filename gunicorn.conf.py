@@ -0,0 +1,8 @@
+from gunicorn.arbiter import Arbiter  # type: ignore[import-untyped]
+from gunicorn.workers.base import Worker  # type: ignore[import-untyped]
+
+
+def worker_exit(server: Arbiter, worker: Worker) -> None:  # noqa: ARG001
+    container = getattr(worker.wsgi, 'container', None)
+    if container is not None:
+        container.shutdown_resources()
@@ -0,0 +1,19 @@
+# Runs in the password hashing worker processes. They are spawned, so they import this module to unpickle the
+# functions; it only depends on passlib to keep Flask, Firestore and gRPC out of the workers' memory.
+import functools
+
+from passlib.context import CryptContext
+
+
+@functools.cache
+def context_for(config: str) -> CryptContext:
+    return CryptContext.from_string(config)
+
+
+# The context travels to the worker processes as its string form, they parse it once
+def hash_password(config: str, password: str) -> str:
+    return context_for(config).hash(password)
+
+
+def verify_password(config: str, password: str, password_hash: str) -> bool:
+    return context_for(config).verify(password, password_hash)
@@ -1,4 +1,5 @@
 from .client import Client
+from .refresh_token import RefreshToken
 from .user import User
 
-__all__ = ['Client', 'User']
+__all__ = ['Client', 'RefreshToken', 'User']
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass
+class RefreshToken:
+    id: str
+    client_id: str
+    user_id: str
+    family_id: str
+    email: str
+    expires_at: datetime
+    used: bool = False
@@ -1,4 +1,13 @@
 from .client import ClientRepository
-from .user import UserRepository
+from .refresh_token import RefreshTokenRepository
+from .user import USER_FIELDS, UserRepository, decode_cursor, encode_cursor, normalize_email
 
-__all__ = ['ClientRepository', 'UserRepository']
+__all__ = [
+    'USER_FIELDS',
+    'ClientRepository',
+    'RefreshTokenRepository',
+    'UserRepository',
+    'decode_cursor',
+    'encode_cursor',
+    'normalize_email',
+]
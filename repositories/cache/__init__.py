@@ -0,0 +1,11 @@
+from .client import CachedClientRepository
+from .user import CachedUserRepository
+from .util import CacheStats, SingleFlight, TTLCache
+
+__all__ = [
+    'CacheStats',
+    'CachedClientRepository',
+    'CachedUserRepository',
+    'SingleFlight',
+    'TTLCache',
+]
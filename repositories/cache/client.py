@@ -0,0 +1,24 @@
+from models import Client
+from repositories import ClientRepository
+
+from .util import CacheStats, TTLCache
+
+
+class CachedClientRepository(ClientRepository):
+    def __init__(self, repository: ClientRepository, maxsize: int, ttl: float, negative_ttl: float) -> None:
+        self.repository = repository
+        self.negative_ttl = negative_ttl
+        self.cache: TTLCache[str, Client | None] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, client_id: str) -> Client | None:
+        entry = self.cache.lookup(client_id)
+        if entry is not None:
+            return entry.value
+
+        client = self.repository.get(client_id)
+        self.cache.set(client_id, client, ttl=None if client is not None else self.negative_ttl)
+
+        return client
+
+    def stats(self) -> CacheStats:
+        return self.cache.stats()
@@ -0,0 +1,138 @@
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from models import User
+from repositories import UserRepository, normalize_email
+
+from .util import CacheStats, SingleFlight, TTLCache
+
+
+class CachedUserRepository(UserRepository):
+    # Caches users by (client_id, user_id) and by normalized email. Unknown emails are remembered for negative_ttl
+    # seconds in a separate cache, so lookups of emails that do not exist (e.g. login floods) skip Firestore without
+    # evicting known users. A user created by another instance can stay unknown for that long. Writes through this
+    # repository invalidate the affected entries, and reads that started before an invalidation do not fill the cache.
+    def __init__(self, repository: UserRepository, maxsize: int, ttl: float, negative_ttl: float = 0) -> None:
+        self.repository = repository
+        self.negative_ttl = negative_ttl
+        self.by_key: TTLCache[tuple[str, str], User] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.by_email: TTLCache[str, User] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.missing_emails: TTLCache[str, None] = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self._key_flight: SingleFlight[tuple[str, str], User | None] = SingleFlight()
+        self._email_flight: SingleFlight[str, User | None] = SingleFlight()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _fill(self, generation: int, user: User) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self.by_key.set((user.client_id, user.id), user)
+            self.by_email.set(normalize_email(user.email), user)
+
+    def _load(self, fn: Callable[[], User | None]) -> User | None:
+        generation = self._generation
+        user = fn()
+        if user is not None:
+            self._fill(generation, user)
+
+        return user
+
+    def _load_by_email(self, key: str, email: str) -> User | None:
+        generation = self._generation
+        user = self._load(lambda: self.repository.find_by_email(email))
+
+        if user is None and self.negative_ttl > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self.missing_emails.set(key, None)
+
+        return user
+
+    def _invalidate(self, users: list[User]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user in users:
+                self.by_key.delete((user.client_id, user.id))
+                self.by_email.delete(normalize_email(user.email))
+                self.missing_emails.delete(normalize_email(user.email))
+
+    def get(self, user_id: str, client_id: str) -> User | None:
+        entry = self.by_key.lookup((client_id, user_id))
+        if entry is not None:
+            return entry.value
+
+        return self._key_flight.do(
+            (client_id, user_id), lambda: self._load(lambda: self.repository.get(user_id=user_id, client_id=client_id))
+        )
+
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        users: list[User] = []
+        missing: list[tuple[str, str]] = []
+        for key in dict.fromkeys(keys):
+            entry = self.by_key.lookup(key)
+            if entry is not None:
+                users.append(entry.value)
+            else:
+                missing.append(key)
+
+        if len(missing) > 0:
+            generation = self._generation
+            for user in self.repository.get_many(missing):
+                self._fill(generation, user)
+                users.append(user)
+
+        return users
+
+    def find_by_email(self, email: str) -> User | None:
+        key = normalize_email(email)
+        entry = self.by_email.lookup(key)
+        if entry is not None:
+            return entry.value
+
+        if self.missing_emails.lookup(key) is not None:
+            return None
+
+        return self._email_flight.do(key, lambda: self._load_by_email(key, email))
+
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        return self.repository.iter_by_client(client_id)
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        return self.repository.list_by_client(client_id, cursor=cursor, limit=limit, fields=fields)
+
+    def create(self, user: User) -> None:
+        try:
+            self.repository.create(user)
+        finally:
+            self._invalidate([user])
+
+    def update_password(self, user: User, password_hash: str) -> None:
+        try:
+            self.repository.update_password(user, password_hash)
+        finally:
+            self._invalidate([user])
+
+    def create_many(self, users: list[User]) -> list[User]:
+        try:
+            return self.repository.create_many(users)
+        finally:
+            self._invalidate(users)
+
+    def delete_all(self) -> dict[str, int]:
+        try:
+            return self.repository.delete_all()
+        finally:
+            with self._lock:
+                self._generation += 1
+                self.by_key.clear()
+                self.by_email.clear()
+                self.missing_emails.clear()
+
+    def stats(self) -> tuple[CacheStats, CacheStats, CacheStats]:
+        # Stats of the by key, by email and unknown email caches
+        return self.by_key.stats(), self.by_email.stats(), self.missing_emails.stats()
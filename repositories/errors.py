@@ -2,3 +2,15 @@ class DuplicateEmailError(Exception):
     def __init__(self, email: str) -> None:
         self.email = email
         super().__init__(f"A user with the email '{email}' already exists.")
+
+
+class InvalidCursorError(Exception):
+    def __init__(self, cursor: str) -> None:
+        self.cursor = cursor
+        super().__init__(f"Invalid cursor '{cursor}'.")
+
+
+class RefreshTokenReusedError(Exception):
+    def __init__(self, family_id: str) -> None:
+        self.family_id = family_id
+        super().__init__(f"Refresh token of family '{family_id}' was already used.")
@@ -1,3 +1,11 @@
+from .index import FirestoreUserIndex, IndexedUserRepository, IndexStats
+from .refresh_token import FirestoreRefreshTokenRepository
 from .user import FirestoreUserRepository
 
-__all__ = ['FirestoreUserRepository']
+__all__ = [
+    'FirestoreRefreshTokenRepository',
+    'FirestoreUserIndex',
+    'FirestoreUserRepository',
+    'IndexStats',
+    'IndexedUserRepository',
+]
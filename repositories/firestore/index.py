@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, cast
+
+from google.cloud.firestore import Client as FirestoreClient  # type: ignore[import-untyped]
+from google.cloud.firestore_v1 import CollectionReference, DocumentReference, DocumentSnapshot
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange, Watch
+
+from models import User
+from repositories import UserRepository, normalize_email
+
+from .user import doc_to_user
+
+RESTART_INTERVAL = 30
+
+
+@dataclass(frozen=True)
+class IndexStats:
+    size: int
+    active: bool
+    synced: bool
+    lag: float | None
+    max_lag: float
+    restarts: int
+
+
+def doc_key(doc: DocumentSnapshot) -> tuple[str, str]:
+    client_ref = cast(DocumentReference, cast(CollectionReference, cast(DocumentReference, doc.reference).parent).parent)
+    return client_ref.id, doc.id
+
+
+class FirestoreUserIndex:
+    # Keeps every user in memory, kept up to date by a collection_group('users') snapshot listener.
+    # The index is only usable once the listener has delivered its first snapshot and while it is active.
+    def __init__(self, database: str, clock: Callable[[], float] = time.time) -> None:
+        self.db = FirestoreClient(database=database)
+        self.clock = clock
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._by_key: dict[tuple[str, str], User] = {}
+        self._by_email: dict[str, User] = {}
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._watch: Watch | None = None
+        self._synced = False
+        self._lag: float | None = None
+        self._max_lag = 0.0
+        self._restarts = 0
+        self._started_at = 0.0
+        self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            self._by_key.clear()
+            self._by_email.clear()
+            self._synced = False
+            self._started_at = self.clock()
+
+        self._watch = self.db.collection_group('users').on_snapshot(self._on_snapshot)
+
+    def close(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()  # type: ignore[no-untyped-call]
+            self._watch = None
+
+    def _on_snapshot(self, _docs: list[DocumentSnapshot], changes: list[DocumentChange], read_time: datetime) -> None:
+        with self._lock:
+            for change in changes:
+                key = doc_key(change.document)
+                old = self._by_key.pop(key, None)
+                if old is not None:
+                    self._by_email.pop(normalize_email(old.email), None)
+
+                if change.type != ChangeType.REMOVED:
+                    self._put(doc_to_user(change.document))
+
+            # Lag between the commit of the changes and the moment they can be read from the index
+            self._lag = max(self.clock() - read_time.timestamp(), 0)
+            self._max_lag = max(self._max_lag, self._lag)
+
+            if not self._synced:
+                self.logger.info('User index synced with %d users', len(self._by_key))
+                self._synced = True
+
+    def _put(self, user: User) -> None:
+        self._by_key[(user.client_id, user.id)] = user
+        self._by_email[normalize_email(user.email)] = user
+
+    def ready(self) -> bool:
+        watch = self._watch
+        if watch is not None and watch.is_active:
+            return self._synced
+
+        # The listener stopped after an unrecoverable error, restart it from time to time
+        if self.clock() - self._started_at >= RESTART_INTERVAL and self._restart_lock.acquire(blocking=False):
+            try:
+                self.logger.warning('User index listener is not active, restarting it')
+                self._restarts += 1
+                self.close()
+                self.start()
+            finally:
+                self._restart_lock.release()
+
+        return False
+
+    def get(self, user_id: str, client_id: str) -> User | None:
+        with self._lock:
+            return self._by_key.get((client_id, user_id))
+
+    def find_by_email(self, email: str) -> User | None:
+        with self._lock:
+            return self._by_email.get(normalize_email(email))
+
+    def put(self, user: User) -> None:
+        with self._lock:
+            self._put(user)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_key.clear()
+            self._by_email.clear()
+
+    def stats(self) -> IndexStats:
+        with self._lock:
+            return IndexStats(
+                size=len(self._by_key),
+                active=self._watch is not None and self._watch.is_active,
+                synced=self._synced,
+                lag=self._lag,
+                max_lag=self._max_lag,
+                restarts=self._restarts,
+            )
+
+
+class IndexedUserRepository(UserRepository):
+    # Serves lookups from the snapshot index, and from the fallback repository (normally the TTL cache)
+    # while the index is not ready. Writes go through the fallback and are applied to the index right away,
+    # so they can be read back before the listener delivers them.
+    def __init__(self, index: FirestoreUserIndex, fallback: UserRepository) -> None:
+        self.index = index
+        self.fallback = fallback
+
+    def get(self, user_id: str, client_id: str) -> User | None:
+        if not self.index.ready():
+            return self.fallback.get(user_id=user_id, client_id=client_id)
+
+        return self.index.get(user_id=user_id, client_id=client_id)
+
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        if not self.index.ready():
+            return self.fallback.get_many(keys)
+
+        users = [self.index.get(user_id=user_id, client_id=client_id) for client_id, user_id in dict.fromkeys(keys)]
+        return [user for user in users if user is not None]
+
+    def find_by_email(self, email: str) -> User | None:
+        if not self.index.ready():
+            return self.fallback.find_by_email(email)
+
+        return self.index.find_by_email(email)
+
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        return self.fallback.iter_by_client(client_id)
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        return self.fallback.list_by_client(client_id, cursor=cursor, limit=limit, fields=fields)
+
+    def create(self, user: User) -> None:
+        self.fallback.create(user)
+        self.index.put(user)
+
+    def update_password(self, user: User, password_hash: str) -> None:
+        self.fallback.update_password(user, password_hash)
+        self.index.put(replace(user, password=password_hash))
+
+    def create_many(self, users: list[User]) -> list[User]:
+        rejected = self.fallback.create_many(users)
+
+        rejected_ids = {user.id for user in rejected}
+        for user in users:
+            if user.id not in rejected_ids:
+                self.index.put(user)
+
+        return rejected
+
+    def delete_all(self) -> dict[str, int]:
+        deleted = self.fallback.delete_all()
+        self.index.clear()
+
+        return deleted
@@ -0,0 +1,97 @@
+from dataclasses import asdict, replace
+from datetime import UTC, datetime
+from typing import Any, cast
+
+import dacite
+from google.cloud.firestore import Client as FirestoreClient  # type: ignore[import-untyped]
+from google.cloud.firestore import transactional
+from google.cloud.firestore_v1 import CollectionReference, DocumentReference, DocumentSnapshot, Transaction
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from models import RefreshToken
+from repositories import RefreshTokenRepository
+from repositories.errors import RefreshTokenReusedError
+
+from .user import BATCH_SIZE
+
+
+def token_to_dict(token: RefreshToken) -> dict[str, Any]:
+    token_dict = asdict(token)
+    del token_dict['id']
+    del token_dict['client_id']
+    del token_dict['user_id']
+
+    return token_dict
+
+
+class FirestoreRefreshTokenRepository(RefreshTokenRepository):
+    # Tokens are stored under clients/{client_id}/users/{user_id}/refresh_tokens/{sha256}, so a refresh is
+    # a point read, and resetting the database deletes them with the users.
+    def __init__(self, database: str) -> None:
+        self.db = FirestoreClient(database=database)
+
+    def _tokens_ref(self, client_id: str, user_id: str) -> CollectionReference:
+        user_ref = self.db.collection('clients').document(client_id).collection('users').document(user_id)
+        return cast(CollectionReference, user_ref.collection('refresh_tokens'))
+
+    def _token_ref(self, token_id: str, client_id: str, user_id: str) -> DocumentReference:
+        return self._tokens_ref(client_id, user_id).document(token_id)
+
+    def create(self, token: RefreshToken) -> None:
+        self._token_ref(token.id, token.client_id, token.user_id).create(token_to_dict(token))
+
+    def rotate(
+        self, token_id: str, client_id: str, user_id: str, new_token_id: str, expires_at: datetime
+    ) -> RefreshToken | None:
+        token_ref = self._token_ref(token_id, client_id, user_id)
+        new_ref = self._token_ref(new_token_id, client_id, user_id)
+
+        @transactional  # type: ignore[misc]
+        def rotate_transaction(transaction: Transaction) -> RefreshToken | None:
+            doc: DocumentSnapshot = token_ref.get(transaction=transaction)
+            if not doc.exists:
+                return None
+
+            token = dacite.from_dict(
+                data_class=RefreshToken,
+                data={**cast(dict[str, Any], doc.to_dict()), 'id': doc.id, 'client_id': client_id, 'user_id': user_id},
+            )
+            if token.used:
+                raise RefreshTokenReusedError(token.family_id)
+
+            if token.expires_at <= datetime.now(UTC):
+                return None
+
+            new_token = replace(token, id=new_token_id, expires_at=expires_at)
+            transaction.update(token_ref, {'used': True})
+            transaction.create(new_ref, token_to_dict(new_token))
+
+            return new_token
+
+        return cast(RefreshToken | None, rotate_transaction(self.db.transaction()))
+
+    def revoke_family(self, client_id: str, user_id: str, family_id: str) -> int:
+        query = self._tokens_ref(client_id, user_id).where(
+            filter=FieldFilter('family_id', '==', family_id)  # type: ignore[no-untyped-call]
+        )
+        docs = query.select([FieldPath.document_id()]).stream()  # type: ignore[no-untyped-call]
+
+        revoked = 0
+        batch = self.db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+            revoked += 1
+
+            if len(batch) == BATCH_SIZE:
+                batch.commit()
+                batch = self.db.batch()
+
+        if len(batch) > 0:
+            batch.commit()
+
+        return revoked
+
+    def delete_all(self) -> dict[str, int]:
+        # The tokens are deleted and counted with their users by FirestoreUserRepository.delete_all
+        return {}
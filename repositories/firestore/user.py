@@ -1,8 +1,10 @@
 import contextlib
 import logging
-from collections.abc import Generator
+import threading
+from collections.abc import Generator, Iterator
 from dataclasses import asdict
 from typing import Any, cast
+from urllib.parse import quote
 
 import dacite
 from google.api_core.exceptions import AlreadyExists
@@ -14,62 +16,175 @@ from google.cloud.firestore_v1 import (
     DocumentSnapshot,
     Transaction,
 )
+from google.cloud.firestore_v1.base_document import BaseDocumentReference
 from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.bulk_writer import BulkWriter, BulkWriterOptions
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.cloud.firestore_v1.query_results import QueryResultsList
+from google.cloud.firestore_v1.types.write import WriteResult
 
 from models import User
-from repositories import UserRepository
+from repositories import USER_FIELDS, UserRepository, decode_cursor, encode_cursor, normalize_email
 from repositories.errors import DuplicateEmailError
 
+BATCH_SIZE = 500
+DELETE_OPS_PER_SECOND = 10000
+PROGRESS_INTERVAL = 10000
+EXPORT_PAGE_SIZE = 1000
+# Most values an 'in' filter accepts
+IN_FILTER_SIZE = 30
+# Never written, read for unknown emails so they cost the same two reads as known ones
+MISSING_USER_KEY = ('missing', 'missing')
+
+
+def email_doc_id(email: str) -> str:
+    # Document IDs cannot contain '/', so the normalized email is percent-encoded
+    return quote(normalize_email(email), safe='@+')
+
+
+def doc_to_user(doc: DocumentSnapshot) -> User:
+    return dacite.from_dict(
+        data_class=User,
+        data={
+            **cast(dict[str, Any], doc.to_dict()),
+            'id': doc.id,
+            'client_id': cast(
+                DocumentReference, cast(CollectionReference, cast(DocumentReference, doc.reference).parent).parent
+            ).id,
+        },
+    )
+
+
+def doc_to_key(doc: DocumentSnapshot) -> tuple[str, str, str]:
+    client_ref = cast(DocumentReference, cast(CollectionReference, cast(DocumentReference, doc.reference).parent).parent)
+    return client_ref.id, doc.id, cast(dict[str, Any], doc.to_dict())['email']
+
 
 class FirestoreUserRepository(UserRepository):
-    def __init__(self, database: str) -> None:
+    # With email_fallback, emails without an emails/{email} lookup are also searched with a collection group query,
+    # so users stored before the lookups existed can be found until scripts/backfill_emails.py has indexed them.
+    def __init__(self, database: str, *, email_fallback: bool = False) -> None:
         self.db = FirestoreClient(database=database)
+        self.email_fallback = email_fallback
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def doc_to_user(self, doc: DocumentSnapshot) -> User:
-        return dacite.from_dict(
-            data_class=User,
-            data={
-                **cast(dict[str, Any], doc.to_dict()),
-                'id': doc.id,
-                'client_id': cast(
-                    DocumentReference, cast(CollectionReference, cast(DocumentReference, doc.reference).parent).parent
-                ).id,
-            },
-        )
+    def _user_ref(self, user_id: str, client_id: str) -> DocumentReference:
+        client_ref = self.db.collection('clients').document(client_id)
+        return cast(CollectionReference, client_ref.collection('users')).document(user_id)
 
     def get(self, user_id: str, client_id: str) -> User | None:
-        client_ref = self.db.collection('clients').document(client_id)
-        user_ref = cast(CollectionReference, client_ref.collection('users')).document(user_id)
-        doc = user_ref.get()
+        doc = self._user_ref(user_id, client_id).get()
 
         if not doc.exists:
             return None
 
-        return self.doc_to_user(doc)
+        return doc_to_user(doc)
 
-    def _find_by_email(self, email: str, transaction: Transaction | None = None) -> DocumentSnapshot | None:
-        docs: QueryResultsList[DocumentSnapshot] = (
-            self.db.collection_group('users').where(filter=FieldFilter('email', '==', email)).get(transaction=transaction)  # type: ignore[no-untyped-call]
-        )
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        if len(keys) == 0:
+            return []
+
+        refs = [self._user_ref(user_id, client_id) for client_id, user_id in dict.fromkeys(keys)]
+        docs: Generator[DocumentSnapshot, None, None] = self.db.get_all(refs)
 
+        return [doc_to_user(doc) for doc in docs if doc.exists]
+
+    def _email_ref(self, email: str) -> DocumentReference:
+        return cast(DocumentReference, self.db.collection('emails').document(email_doc_id(email)))
+
+    def _query_email(self, email: str, transaction: Transaction | None = None) -> QueryResultsList[DocumentSnapshot]:
+        # Exact match on the stored email, like the lookups before the emails collection
+        query = self.db.collection_group('users').where(filter=FieldFilter('email', '==', email))  # type: ignore[no-untyped-call]
+        return cast(QueryResultsList[DocumentSnapshot], query.get(transaction=transaction))
+
+    def _find_unindexed(self, email: str) -> User | None:
+        docs = self._query_email(email.strip())
         if len(docs) == 0:
             return None
 
         if len(docs) > 1:
             self.logger.error('Multiple users found with email %s', email)
-            return None
+            return doc_to_user(docs[0])
 
-        return docs[0]
+        # Indexed on first use. Left as is if another user of the same email in another case got it first.
+        user = doc_to_user(docs[0])
+        with contextlib.suppress(AlreadyExists):
+            self._email_ref(email).create({'client_id': user.client_id, 'user_id': user.id})
+
+        return user
 
     def find_by_email(self, email: str) -> User | None:
-        doc = self._find_by_email(email)
+        lookup = self._email_ref(email).get()
+
+        if not lookup.exists:
+            if self.email_fallback:
+                return self._find_unindexed(email)
+
+            self._user_ref(*MISSING_USER_KEY).get()
+            return None
+
+        lookup_dict = cast(dict[str, Any], lookup.to_dict())
+        user = self.get(user_id=lookup_dict['user_id'], client_id=lookup_dict['client_id'])
 
-        if doc is None:
+        if user is None or normalize_email(user.email) != normalize_email(email):
+            self.logger.error('Email lookup for %s points to a missing user', email)
             return None
 
-        return self.doc_to_user(doc)
+        # Users stored before the lookups may share the email in another case, the exact match wins
+        if self.email_fallback and user.email != email.strip():
+            docs = self._query_email(email.strip())
+            if len(docs) > 0:
+                return doc_to_user(docs[0])
+
+        return user
+
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        # Pages with start_after on the document ID instead of streaming a single query,
+        # so long exports do not hold one query open nor keep more than a page in memory
+        users_ref = cast(CollectionReference, self.db.collection('clients').document(client_id).collection('users'))
+        query = users_ref.order_by(FieldPath.document_id()).limit(EXPORT_PAGE_SIZE)  # type: ignore[no-untyped-call]
+        last_doc: DocumentSnapshot | None = None
+
+        while True:
+            page_query = query if last_doc is None else query.start_after(last_doc)
+            docs: list[DocumentSnapshot] = page_query.get()
+
+            for doc in docs:
+                yield doc_to_user(doc)
+
+            if len(docs) < EXPORT_PAGE_SIZE:
+                return
+
+            last_doc = docs[-1]
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        fields = list(USER_FIELDS) if fields is None else fields
+        stored_fields = [f for f in fields if f not in ('id', 'client_id')]
+
+        # The projection keeps the password hash and any unrequested field out of the response,
+        # selecting only the document ID when nothing stored in the document is needed
+        users_ref = cast(CollectionReference, self.db.collection('clients').document(client_id).collection('users'))
+        query = (
+            users_ref.select(stored_fields or [FieldPath.document_id()])  # type: ignore[no-untyped-call]
+            .order_by(FieldPath.document_id())  # type: ignore[no-untyped-call]
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            query = query.start_after({FieldPath.document_id(): decode_cursor(cursor)})  # type: ignore[no-untyped-call]
+
+        docs: list[DocumentSnapshot] = query.get()
+
+        users = []
+        for doc in docs[:limit]:
+            doc_dict = cast(dict[str, Any], doc.to_dict())
+            values = {'id': doc.id, 'client_id': client_id}
+            users.append({f: values[f] if f in values else doc_dict.get(f) for f in fields})
+
+        next_cursor = encode_cursor(docs[limit - 1].id) if len(docs) > limit else None
+
+        return users, next_cursor
 
     def create(self, user: User) -> None:
         user_dict = asdict(user)
@@ -79,18 +194,143 @@ class FirestoreUserRepository(UserRepository):
         client_ref = self.db.collection('clients').document(user.client_id)
         with contextlib.suppress(AlreadyExists):
             client_ref.create({})
-        user_ref = cast(CollectionReference, client_ref.collection('users')).document(user.id)
+        user_ref = self._user_ref(user.id, user.client_id)
+        email_ref = self._email_ref(user.email)
 
         @transactional  # type: ignore[misc]
         def create_user_transaction(transaction: Transaction, user_dict: dict[str, Any]) -> None:
-            if self._find_by_email(user_dict['email'], transaction) is not None:
+            if email_ref.get(transaction=transaction).exists:
+                raise DuplicateEmailError(user_dict['email'])
+
+            if self.email_fallback and len(self._query_email(user_dict['email'], transaction)) > 0:
                 raise DuplicateEmailError(user_dict['email'])
 
             transaction.create(user_ref, user_dict)
+            transaction.create(email_ref, {'client_id': user.client_id, 'user_id': user.id})
 
         create_user_transaction(self.db.transaction(), user_dict)
 
-    def delete_all(self) -> None:
-        stream: Generator[DocumentSnapshot, None, None] = self.db.collection_group('users').stream()
-        for e in stream:
-            cast(DocumentReference, e.reference).delete()
+    def update_password(self, user: User, password_hash: str) -> None:
+        self._user_ref(user.id, user.client_id).update({'password': password_hash})
+
+    def _unindexed_emails(self, emails: list[str]) -> set[str]:
+        # Lookup IDs of the emails used by stored users, found with collection group queries
+        found: set[str] = set()
+        emails = list(dict.fromkeys(emails))
+        for i in range(0, len(emails), IN_FILTER_SIZE):
+            query = (
+                self.db.collection_group('users')
+                .where(filter=FieldFilter('email', 'in', emails[i : i + IN_FILTER_SIZE]))  # type: ignore[no-untyped-call]
+                .select(['email'])
+            )
+            docs: list[DocumentSnapshot] = query.get()
+            found.update(email_doc_id(cast(dict[str, Any], doc.to_dict())['email']) for doc in docs)
+
+        return found
+
+    def create_many(self, users: list[User]) -> list[User]:
+        # Unlike create, the writes are not transactional: an email taken concurrently after the
+        # duplicate check makes the batch containing it fail. Meant for seeding and imports.
+        email_refs = {email_doc_id(user.email): self._email_ref(user.email) for user in users}
+        refs = list(email_refs.values())
+        taken: set[str] = set()
+        for i in range(0, len(refs), BATCH_SIZE):
+            lookups: Generator[DocumentSnapshot, None, None] = self.db.get_all(refs[i : i + BATCH_SIZE])
+            taken.update(lookup.id for lookup in lookups if lookup.exists)
+
+        if self.email_fallback:
+            taken.update(self._unindexed_emails([user.email for user in users if email_doc_id(user.email) not in taken]))
+
+        rejected: list[User] = []
+        clients: set[str] = set()
+        batch = self.db.batch()
+        for user in users:
+            email_id = email_doc_id(user.email)
+            if email_id in taken:
+                rejected.append(user)
+                continue
+            taken.add(email_id)
+
+            if user.client_id not in clients:
+                batch.set(self.db.collection('clients').document(user.client_id), {}, merge=True)
+                clients.add(user.client_id)
+
+            user_dict = asdict(user)
+            del user_dict['id']
+            del user_dict['client_id']
+
+            batch.create(self._user_ref(user.id, user.client_id), user_dict)
+            batch.create(email_refs[email_id], {'client_id': user.client_id, 'user_id': user.id})
+
+            if len(batch) >= BATCH_SIZE - 2:
+                batch.commit()
+                batch = self.db.batch()
+
+        if len(batch) > 0:
+            batch.commit()
+
+        return rejected
+
+    def delete_all(self) -> dict[str, int]:
+        # Deletes every client, user and email lookup through a BulkWriter, which sends the deletes
+        # in parallel batches instead of one RPC per document.
+        deleted: dict[str, int] = {}
+        lock = threading.Lock()
+
+        def on_write_result(ref: BaseDocumentReference, _result: WriteResult, _bulk_writer: BulkWriter) -> None:
+            with lock:
+                collection = ref.parent.id
+                deleted[collection] = deleted.get(collection, 0) + 1
+
+                total = sum(deleted.values())
+                if total % PROGRESS_INTERVAL == 0:
+                    self.logger.info('Deleted %d documents', total)
+
+        bulk_writer = self.db.bulk_writer(
+            BulkWriterOptions(initial_ops_per_second=DELETE_OPS_PER_SECOND, max_ops_per_second=DELETE_OPS_PER_SECOND)
+        )
+        bulk_writer.on_write_result(on_write_result)
+
+        for collection in ('clients', 'emails'):
+            query = self.db.collection(collection).recursive().select([FieldPath.document_id()])  # type: ignore[no-untyped-call]
+            stream: Generator[DocumentSnapshot, None, None] = query.stream()
+            for doc in stream:
+                bulk_writer.delete(doc.reference)
+
+        bulk_writer.close()
+
+        self.logger.info('Deleted %d documents: %s', sum(deleted.values()), deleted)
+
+        return deleted
+
+    def backfill_email_index(self) -> tuple[int, list[str]]:
+        # Creates the emails/{email} lookup documents for users stored before the index existed.
+        # Returns the number of lookups written and the emails shared by more than one user, which are left unindexed.
+        owners: dict[str, list[tuple[str, str, str]]] = {}
+        stream: Generator[DocumentSnapshot, None, None] = self.db.collection_group('users').select(['email']).stream()
+        for doc in stream:
+            user = doc_to_key(doc)
+            owners.setdefault(email_doc_id(user[2]), []).append(user)
+
+        written = 0
+        conflicts: list[str] = []
+        batch = self.db.batch()
+        for users in owners.values():
+            client_id, user_id, email = users[0]
+
+            if len(users) > 1:
+                self.logger.error('Multiple users found with email %s', email)
+                conflicts.append(email)
+                continue
+
+            batch.set(self._email_ref(email), {'client_id': client_id, 'user_id': user_id})
+            written += 1
+
+            if len(batch) == BATCH_SIZE:
+                batch.commit()
+                batch = self.db.batch()
+
+        if len(batch) > 0:
+            batch.commit()
+
+        return written, conflicts
@@ -0,0 +1,7 @@
+from .refresh_token import InMemoryRefreshTokenRepository
+from .user import InMemoryUserRepository
+
+__all__ = [
+    'InMemoryRefreshTokenRepository',
+    'InMemoryUserRepository',
+]
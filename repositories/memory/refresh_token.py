@@ -0,0 +1,54 @@
+import threading
+from dataclasses import replace
+from datetime import UTC, datetime
+
+from models import RefreshToken
+from repositories import RefreshTokenRepository
+from repositories.errors import RefreshTokenReusedError
+
+
+class InMemoryRefreshTokenRepository(RefreshTokenRepository):
+    def __init__(self) -> None:
+        self._tokens: dict[tuple[str, str, str], RefreshToken] = {}
+        self._lock = threading.Lock()
+
+    def create(self, token: RefreshToken) -> None:
+        with self._lock:
+            self._tokens[(token.client_id, token.user_id, token.id)] = token
+
+    def rotate(
+        self, token_id: str, client_id: str, user_id: str, new_token_id: str, expires_at: datetime
+    ) -> RefreshToken | None:
+        with self._lock:
+            token = self._tokens.get((client_id, user_id, token_id))
+            if token is None:
+                return None
+
+            if token.used:
+                raise RefreshTokenReusedError(token.family_id)
+
+            if token.expires_at <= datetime.now(UTC):
+                return None
+
+            new_token = replace(token, id=new_token_id, expires_at=expires_at)
+            self._tokens[(client_id, user_id, token_id)] = replace(token, used=True)
+            self._tokens[(client_id, user_id, new_token_id)] = new_token
+
+            return new_token
+
+    def revoke_family(self, client_id: str, user_id: str, family_id: str) -> int:
+        with self._lock:
+            keys = [
+                key for key, token in self._tokens.items() if key[:2] == (client_id, user_id) and token.family_id == family_id
+            ]
+            for key in keys:
+                del self._tokens[key]
+
+        return len(keys)
+
+    def delete_all(self) -> dict[str, int]:
+        with self._lock:
+            count = len(self._tokens)
+            self._tokens.clear()
+
+        return {'refresh_tokens': count} if count > 0 else {}
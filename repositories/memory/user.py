@@ -0,0 +1,98 @@
+import bisect
+import threading
+from collections.abc import Iterator
+from dataclasses import replace
+from typing import Any
+
+from models import User
+from repositories import USER_FIELDS, UserRepository, decode_cursor, encode_cursor, normalize_email
+from repositories.errors import DuplicateEmailError
+
+
+class InMemoryUserRepository(UserRepository):
+    # Keeps the users in process memory, for tests, local load testing and measuring the layers above storage.
+    # Users are indexed by (client_id, user_id) and by normalized email, and each client keeps its user IDs
+    # sorted so listings page in the same order as Firestore's document ID order.
+    def __init__(self) -> None:
+        self._by_key: dict[tuple[str, str], User] = {}
+        self._by_email: dict[str, tuple[str, str]] = {}
+        self._by_client: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, client_id: str) -> User | None:
+        with self._lock:
+            return self._by_key.get((client_id, user_id))
+
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        with self._lock:
+            users = [self._by_key.get(key) for key in dict.fromkeys(keys)]
+
+        return [user for user in users if user is not None]
+
+    def find_by_email(self, email: str) -> User | None:
+        with self._lock:
+            key = self._by_email.get(normalize_email(email))
+            return None if key is None else self._by_key[key]
+
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        with self._lock:
+            users = [self._by_key[(client_id, user_id)] for user_id in self._by_client.get(client_id, [])]
+
+        yield from users
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        fields = list(USER_FIELDS) if fields is None else fields
+        after = None if cursor is None else decode_cursor(cursor)
+
+        with self._lock:
+            user_ids = self._by_client.get(client_id, [])
+            start = 0 if after is None else bisect.bisect_right(user_ids, after)
+            page = [self._by_key[(client_id, user_id)] for user_id in user_ids[start : start + limit + 1]]
+
+        users = [{f: getattr(user, f) for f in fields} for user in page[:limit]]
+        next_cursor = encode_cursor(page[limit - 1].id) if len(page) > limit else None
+
+        return users, next_cursor
+
+    def _insert(self, user: User) -> None:
+        self._by_key[(user.client_id, user.id)] = user
+        self._by_email[normalize_email(user.email)] = (user.client_id, user.id)
+        bisect.insort(self._by_client.setdefault(user.client_id, []), user.id)
+
+    def create(self, user: User) -> None:
+        with self._lock:
+            if normalize_email(user.email) in self._by_email:
+                raise DuplicateEmailError(user.email)
+
+            self._insert(user)
+
+    def update_password(self, user: User, password_hash: str) -> None:
+        with self._lock:
+            stored = self._by_key.get((user.client_id, user.id))
+            if stored is not None:
+                self._by_key[(user.client_id, user.id)] = replace(stored, password=password_hash)
+
+    def create_many(self, users: list[User]) -> list[User]:
+        rejected: list[User] = []
+
+        with self._lock:
+            for user in users:
+                if normalize_email(user.email) in self._by_email:
+                    rejected.append(user)
+                    continue
+
+                self._insert(user)
+
+        return rejected
+
+    def delete_all(self) -> dict[str, int]:
+        with self._lock:
+            # Counted like the Firestore documents: one client, user and email lookup document each
+            counts = {'clients': len(self._by_client), 'users': len(self._by_key), 'emails': len(self._by_email)}
+            self._by_key.clear()
+            self._by_email.clear()
+            self._by_client.clear()
+
+        return {collection: count for collection, count in counts.items() if count > 0}
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from models import RefreshToken
+
+
+class RefreshTokenRepository:
+    def create(self, token: RefreshToken) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+    def rotate(
+        self, token_id: str, client_id: str, user_id: str, new_token_id: str, expires_at: datetime
+    ) -> RefreshToken | None:
+        # Marks the token as used and returns its replacement, stored as new_token_id in the same family.
+        # Returns None if the token does not exist or has expired, and raises RefreshTokenReusedError if it was already used.
+        raise NotImplementedError  # pragma: no cover
+
+    def revoke_family(self, client_id: str, user_id: str, family_id: str) -> int:
+        raise NotImplementedError  # pragma: no cover
+
+    def delete_all(self) -> dict[str, int]:
+        # Called by the database reset after the users are deleted, returns the number of deleted tokens
+        raise NotImplementedError  # pragma: no cover
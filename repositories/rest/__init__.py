@@ -1,4 +1,12 @@
 from .client import RestClientRepository
-from .util import TokenProvider
+from .token import CachingTokenProvider, TokenRefreshStats
+from .util import TokenProvider, create_session, init_http_session
 
-__all__ = ['TokenProvider', 'RestClientRepository']
+__all__ = [
+    'CachingTokenProvider',
+    'RestClientRepository',
+    'TokenProvider',
+    'TokenRefreshStats',
+    'create_session',
+    'init_http_session',
+]
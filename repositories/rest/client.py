@@ -10,9 +10,10 @@ from .util import TokenProvider
 
 
 class RestClientRepository(ClientRepository):
-    def __init__(self, base_url: str, token_provider: TokenProvider | None) -> None:
+    def __init__(self, base_url: str, token_provider: TokenProvider | None, session: requests.Session | None = None) -> None:
         self.base_url = base_url
         self.token_provider = token_provider
+        self.session = session if session is not None else requests.Session()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def authenticated_get(self, url: str) -> requests.Response:
@@ -22,7 +23,7 @@ class RestClientRepository(ClientRepository):
             id_token = self.token_provider.get_token()
             headers = {'Authorization': f'Bearer {id_token}'}
 
-        return requests.get(url, timeout=2, headers=headers)
+        return self.session.get(url, timeout=2, headers=headers)
 
     def get(self, client_id: str) -> Client | None:
         resp = self.authenticated_get(f'{self.base_url}/api/v1/clients/{client_id}')
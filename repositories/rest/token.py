@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import jwt
+
+from .util import TokenProvider
+
+
+@dataclass(frozen=True)
+class TokenRefreshStats:
+    refreshes: int
+    failures: int
+    last_latency: float
+    total_latency: float
+
+
+class CachingTokenProvider:
+    # Serves the cached ID token until it is close to expiring, then refreshes it on a background thread while
+    # request threads keep using the old token. Only a missing or expired token makes a caller wait, and then
+    # only one caller fetches while the others wait for its result.
+    def __init__(
+        self,
+        provider: TokenProvider,
+        refresh_margin: float = 300,
+        retry_interval: float = 10,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.provider = provider
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._cached: tuple[str, float] | None = None
+        self._next_refresh = 0.0
+        self._fetch_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._refreshes = 0
+        self._failures = 0
+        self._last_latency = 0.0
+        self._total_latency = 0.0
+
+    def _expiry(self, token: str) -> float:
+        try:
+            claims = jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            self.logger.warning('Unable to decode token expiry, token will not be cached')
+            return 0.0
+
+        return float(claims.get('exp', 0))
+
+    def _fetch(self) -> str:
+        start = time.perf_counter()
+        try:
+            token = self.provider.get_token()
+        except Exception:
+            with self._stats_lock:
+                self._failures += 1
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            with self._stats_lock:
+                self._last_latency = latency
+                self._total_latency += latency
+
+        with self._stats_lock:
+            self._refreshes += 1
+
+        self._cached = (token, self._expiry(token))
+        self._next_refresh = self.clock() + self.retry_interval
+
+        return token
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self._fetch()
+        except Exception:
+            self.logger.exception('Background token refresh failed')
+        finally:
+            self._fetch_lock.release()
+
+    def _start_background_refresh(self, now: float) -> None:
+        if not self._fetch_lock.acquire(blocking=False):
+            return
+
+        self._next_refresh = now + self.retry_interval
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def get_token(self) -> str:
+        cached = self._cached
+        now = self.clock()
+
+        if cached is not None and now < cached[1]:
+            if now >= max(cached[1] - self.refresh_margin, self._next_refresh):
+                self._start_background_refresh(now)
+
+            return cached[0]
+
+        with self._fetch_lock:
+            cached = self._cached
+            if cached is not None and self.clock() < cached[1]:
+                return cached[0]
+
+            return self._fetch()
+
+    def stats(self) -> TokenRefreshStats:
+        with self._stats_lock:
+            return TokenRefreshStats(
+                refreshes=self._refreshes,
+                failures=self._failures,
+                last_latency=self._last_latency,
+                total_latency=self._total_latency,
+            )
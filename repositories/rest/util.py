@@ -1,5 +1,34 @@
+from collections.abc import Generator
 from typing import Protocol
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
 
 class TokenProvider(Protocol):
     def get_token(self) -> str: ...  # pragma: no cover
+
+
+def create_session(pool_size: int, retries: int, backoff_factor: float) -> requests.Session:
+    # Only idempotent requests are retried, and the last response is returned so callers can inspect its status.
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+def init_http_session(pool_size: int, retries: int, backoff_factor: float) -> Generator[requests.Session, None, None]:
+    session = create_session(pool_size, retries, backoff_factor)
+    yield session
+    session.close()
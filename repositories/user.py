@@ -1,15 +1,71 @@
+import base64
+import binascii
+import json
+from collections.abc import Iterator
+from typing import Any, cast
+
 from models import User
 
+from .errors import InvalidCursorError
+
+# Fields that can be requested from list_by_client, the password hash is never listed
+USER_FIELDS = ('id', 'client_id', 'name', 'email')
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def encode_cursor(user_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'id': user_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError) as err:
+        raise InvalidCursorError(cursor) from err
+
+    if not isinstance(data, dict) or not isinstance(data.get('id'), str):
+        raise InvalidCursorError(cursor)
+
+    return cast(str, data['id'])
+
 
 class UserRepository:
     def get(self, user_id: str, client_id: str) -> User | None:
         raise NotImplementedError  # pragma: no cover
 
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        # keys are (client_id, user_id) pairs, users that do not exist are left out of the result
+        raise NotImplementedError  # pragma: no cover
+
     def find_by_email(self, email: str) -> User | None:
         raise NotImplementedError  # pragma: no cover
 
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        # Yields every user of the client ordered by ID, reading one page at a time
+        raise NotImplementedError  # pragma: no cover
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        # Returns a page of users ordered by ID, each with only the requested USER_FIELDS (all of them by default),
+        # and the opaque cursor of the next page, or None on the last page.
+        # Raises InvalidCursorError if the cursor was not returned by this method.
+        raise NotImplementedError  # pragma: no cover
+
     def create(self, user: User) -> None:
         raise NotImplementedError  # pragma: no cover
 
-    def delete_all(self) -> None:
+    def update_password(self, user: User, password_hash: str) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+    def create_many(self, users: list[User]) -> list[User]:
+        # Returns the users that were not created because their email is already taken,
+        # either by an existing user or by an earlier user in the list
+        raise NotImplementedError  # pragma: no cover
+
+    def delete_all(self) -> dict[str, int]:
+        # Returns the number of deleted documents per collection
         raise NotImplementedError  # pragma: no cover
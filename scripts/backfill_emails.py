@@ -0,0 +1,19 @@
+# ruff: noqa: INP001, T201
+# Usage: PYTHONPATH=. python scripts/backfill_emails.py
+import os
+import sys
+
+from repositories.firestore import FirestoreUserRepository
+
+FIRESTORE_DB = os.getenv('FIRESTORE_DB') or '(default)'
+
+repo = FirestoreUserRepository(database=FIRESTORE_DB)
+written, conflicts = repo.backfill_email_index()
+
+print(f'Wrote {written} email lookup documents')
+
+if conflicts:
+    print(f'{len(conflicts)} emails belong to more than one user and were not indexed:')
+    for email in conflicts:
+        print(f'    {email}')
+    sys.exit(1)
@@ -1,20 +1,39 @@
 # ruff: noqa: INP001, T201
+# Usage: PYTHONPATH=. python scripts/dump_db.py [--client CLIENT_ID]
+import argparse
+import json
 import os
-from collections.abc import Generator
+from collections.abc import Generator, Iterator
 from typing import Any, cast
 
 from google.cloud.firestore import Client as FirestoreClient  # type: ignore[import-untyped]
-from google.cloud.firestore_v1 import CollectionReference, DocumentReference
+from google.cloud.firestore_v1 import CollectionReference, DocumentReference, DocumentSnapshot
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from blueprints.user import user_to_dict
+from repositories.firestore import FirestoreUserRepository
 
 FIRESTORE_DB = os.getenv('FIRESTORE_DB') or '(default)'
+PAGE_SIZE = 1000
+
+
+def iter_docs(collection: CollectionReference) -> Iterator[DocumentSnapshot]:
+    query = collection.order_by(FieldPath.document_id()).limit(PAGE_SIZE)  # type: ignore[no-untyped-call]
+    last_doc: DocumentSnapshot | None = None
 
-db = FirestoreClient(database=FIRESTORE_DB)
+    while True:
+        docs: list[DocumentSnapshot] = (query if last_doc is None else query.start_after(last_doc)).get()
+        yield from docs
+
+        if len(docs) < PAGE_SIZE:
+            return
+
+        last_doc = docs[-1]
 
 
 def print_collection(collection: CollectionReference, indent: int) -> None:
     print(f'{"    " * indent}#### {collection.id} ####')
-    docs = collection.get()
-    for doc in docs:
+    for doc in iter_docs(collection):
         print(f'{"    " * indent}{doc.id}')
 
         for k, v in cast(dict[str, Any], doc.to_dict()).items():
@@ -26,6 +45,16 @@ def print_collection(collection: CollectionReference, indent: int) -> None:
             print_collection(c, indent + 1)
 
 
-gen_collections: Generator[CollectionReference, None, None] = db.collections()
-for collection in gen_collections:
-    print_collection(collection, 0)
+parser = argparse.ArgumentParser(description='Print the contents of the database.')
+parser.add_argument('--client', help='print the users of a single client as NDJSON, without their password hash')
+args = parser.parse_args()
+
+if args.client is not None:
+    repo = FirestoreUserRepository(database=FIRESTORE_DB)
+    for user in repo.iter_by_client(args.client):
+        print(json.dumps(user_to_dict(user)))
+else:
+    db = FirestoreClient(database=FIRESTORE_DB)
+    gen_collections: Generator[CollectionReference, None, None] = db.collections()
+    for collection in gen_collections:
+        print_collection(collection, 0)
@@ -0,0 +1,51 @@
+from .auth import AuthService
+from .errors import UserServiceError
+from .hashing import HashingExecutor, HashingQueueFullError, create_crypt_context, init_hashing, parse_hash_settings
+from .metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    InstrumentedClientRepository,
+    InstrumentedUserRepository,
+    MetricsRegistry,
+    collect_client_cache,
+    collect_token_refresh,
+    collect_user_cache,
+    collect_user_index,
+)
+from .rate_limit import InMemoryRateLimitStore, LoginRateLimiter, RateLimitStore
+from .tokens import InvalidRefreshTokenError, RefreshTokenIssuer, SigningKey, SigningKeyProvider, TokenIssuer
+from .tracing import setup_tracing, span, traced
+from .users import UserService
+
+__all__ = [
+    'AuthService',
+    'Counter',
+    'Gauge',
+    'HashingExecutor',
+    'HashingQueueFullError',
+    'Histogram',
+    'InMemoryRateLimitStore',
+    'InstrumentedClientRepository',
+    'InstrumentedUserRepository',
+    'InvalidRefreshTokenError',
+    'LoginRateLimiter',
+    'MetricsRegistry',
+    'RateLimitStore',
+    'RefreshTokenIssuer',
+    'SigningKey',
+    'SigningKeyProvider',
+    'TokenIssuer',
+    'UserService',
+    'UserServiceError',
+    'collect_client_cache',
+    'collect_token_refresh',
+    'collect_user_cache',
+    'collect_user_index',
+    'create_crypt_context',
+    'init_hashing',
+    'parse_hash_settings',
+    'setup_tracing',
+    'span',
+    'traced',
+]
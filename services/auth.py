@@ -0,0 +1,57 @@
+import functools
+
+from repositories import UserRepository
+
+from .errors import InvalidCredentialsError, RefreshRejectedError, ServerBusyError, TooManyLoginAttemptsError
+from .hashing import HashingExecutor, HashingQueueFullError
+from .rate_limit import LoginRateLimiter
+from .tokens import InvalidRefreshTokenError, RefreshTokenIssuer, TokenIssuer
+
+
+class AuthService:
+    # Login and token refresh behind the auth blueprint
+    def __init__(
+        self,
+        user_repo: UserRepository,
+        hashing: HashingExecutor,
+        token_issuer: TokenIssuer,
+        refresh_token_issuer: RefreshTokenIssuer,
+        rate_limiter: LoginRateLimiter,
+    ) -> None:
+        self.user_repo = user_repo
+        self.hashing = hashing
+        self.token_issuer = token_issuer
+        self.refresh_token_issuer = refresh_token_issuer
+        self.rate_limiter = rate_limiter
+
+    def login(self, username: str, password: str, forwarded_for: str | None, remote_addr: str | None) -> tuple[str, str]:
+        # Returns the access token and the refresh token
+        if not self.rate_limiter.allow(username, forwarded_for, remote_addr):
+            raise TooManyLoginAttemptsError
+
+        user = self.user_repo.find_by_email(username)
+
+        # Unknown users are checked against a dummy hash, so they take as long to reject as a wrong password
+        try:
+            valid_password = self.hashing.verify(password, self.hashing.dummy_hash() if user is None else user.password)
+        except HashingQueueFullError as err:
+            raise ServerBusyError from err
+
+        if user is None or not valid_password:
+            raise InvalidCredentialsError
+
+        if self.hashing.needs_update(user.password):
+            self.hashing.rehash_in_background(password, functools.partial(self.user_repo.update_password, user))
+
+        return self.token_issuer.issue(user), self.refresh_token_issuer.issue(user)
+
+    def refresh(self, refresh_token: str) -> tuple[str, str]:
+        # Renewing only costs a point read and a signature, the password KDF is not involved
+        try:
+            token, new_refresh_token = self.refresh_token_issuer.rotate(refresh_token)
+        except InvalidRefreshTokenError as err:
+            raise RefreshRejectedError from err
+
+        access_token = self.token_issuer.issue_for(user_id=token.user_id, client_id=token.client_id, email=token.email)
+
+        return access_token, new_refresh_token
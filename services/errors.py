@@ -0,0 +1,42 @@
+class UserServiceError(Exception):
+    # Errors of the user and auth services, with the message and HTTP status both front ends return
+    status = 500
+    message = 'Internal server error.'
+
+    def __init__(self) -> None:
+        super().__init__(self.message)
+
+
+class TooManyLoginAttemptsError(UserServiceError):
+    status = 429
+    message = 'Too many login attempts, please try again later.'
+
+
+class InvalidCredentialsError(UserServiceError):
+    status = 401
+    message = 'Invalid username or password.'
+
+
+class RefreshRejectedError(UserServiceError):
+    status = 401
+    message = 'Invalid refresh token.'
+
+
+class ServerBusyError(UserServiceError):
+    status = 503
+    message = 'The server is busy, please try again later.'
+
+
+class UserNotFoundError(UserServiceError):
+    status = 404
+    message = 'User not found'
+
+
+class UnknownClientError(UserServiceError):
+    status = 400
+    message = 'Invalid value for clientId: Client does not exist.'
+
+
+class EmailTakenError(UserServiceError):
+    status = 409
+    message = 'A user with the email already exists.'
@@ -0,0 +1,204 @@
+import functools
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from passlib.context import CryptContext
+
+from hashing_worker import hash_password, verify_password
+
+from .tracing import traced
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+
+T = TypeVar('T')
+
+# The first scheme hashes new passwords, hashes with the other schemes are verified and then rehashed.
+# argon2 at the OWASP baseline below costs about 2.5 times a pbkdf2_sha256 verify, so it is opt-in through PASSWORD_SCHEMES.
+DEFAULT_SCHEMES = ['pbkdf2_sha256']
+DEFAULT_SETTINGS = {
+    'argon2__rounds': 2,
+    'argon2__memory_cost': 19456,
+    'argon2__parallelism': 1,
+    'bcrypt__rounds': 12,
+    'pbkdf2_sha256__rounds': 29000,
+}
+
+
+class HashingQueueFullError(Exception):
+    def __init__(self) -> None:
+        super().__init__('Too many password hashing operations are pending.')
+
+
+def create_crypt_context(schemes: list[str] | None = None, settings: dict[str, int] | None = None) -> CryptContext:
+    schemes = DEFAULT_SCHEMES if schemes is None else schemes
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+
+    policy: dict[str, Any] = {k: v for k, v in settings.items() if k.split('__')[0] in schemes}
+
+    return CryptContext(schemes=schemes, deprecated='auto', **policy)
+
+
+def slowest_hash(context: CryptContext, password: str) -> str:
+    # Hashes the password with every scheme of the context, at its configured costs, and returns the hash that took
+    # the longest. For the KDFs, verifying a hash costs about as much as creating it.
+    timed: list[tuple[float, str]] = []
+    for scheme in context.schemes():
+        start = time.perf_counter()
+        password_hash = context.handler(scheme).hash(password)
+        timed.append((time.perf_counter() - start, password_hash))
+
+    return max(timed)[1]
+
+
+def parse_hash_settings(value: str | None) -> dict[str, int]:
+    # Parses 'argon2__rounds=3,argon2__memory_cost=65536'
+    if not value:
+        return {}
+
+    return {k.strip(): int(v) for k, v in (item.split('=', 1) for item in value.split(','))}
+
+
+class HashingExecutor:
+    # Runs the CPU-bound password KDF outside the request threads, so a burst of logins cannot hold
+    # the GIL for the whole worker. With workers=0 the operations run inline in the calling thread.
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_pending: int | None = None,
+        context: CryptContext | None = None,
+        metrics: 'MetricsRegistry | None' = None,
+    ) -> None:
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max(self.workers, 1) * 4 if max_pending is None else max_pending
+        self.context = create_crypt_context() if context is None else context
+        self._config = self.context.to_string()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        self._background: ThreadPoolExecutor | None = None
+        self._rehash_slots = threading.BoundedSemaphore(self.max_pending)
+        self._dummy_hash: str | None = None
+        self.metrics = metrics
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+            return self._pool
+
+    @contextmanager
+    def _timed(self, operation: str) -> Iterator[None]:
+        if self.metrics is None:
+            yield
+            return
+
+        with self.metrics.hashing_duration.time(operation):
+            yield
+
+    def _run(self, operation: str, fn: Callable[..., T], *args: str) -> T:
+        if not self._slots.acquire(blocking=False):
+            if self.metrics is not None:
+                self.metrics.hashing_rejected.inc(operation)
+            raise HashingQueueFullError
+
+        try:
+            with self._timed(operation):
+                if self.workers == 0:
+                    return fn(self._config, *args)
+
+                future: Future[T] = self._get_pool().submit(fn, self._config, *args)
+                return future.result()
+        finally:
+            self._slots.release()
+
+    @traced('hashing.hash')
+    def hash(self, password: str) -> str:
+        return self._run('hash', hash_password, password)
+
+    @traced('hashing.verify')
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._run('verify', verify_password, password, password_hash)
+
+    def dummy_hash(self) -> str:
+        # Hash of a random password with the slowest scheme of the context. Verifying against it takes as long as
+        # verifying the most expensive stored hash, so unknown users are not rejected faster than wrong passwords of
+        # users whose hash has a deprecated scheme.
+        if self._dummy_hash is not None:
+            return self._dummy_hash
+
+        # Hashed outside of the lock, so _get_pool does not wait for the KDFs. Concurrent first calls may each hash,
+        # the first one stored is kept.
+        dummy_hash = slowest_hash(self.context, secrets.token_urlsafe(32))
+        with self._lock:
+            if self._dummy_hash is None:
+                self._dummy_hash = dummy_hash
+
+            return self._dummy_hash
+
+    def needs_update(self, password_hash: str) -> bool:
+        # True if the hash uses a deprecated scheme or outdated cost settings
+        return self.context.needs_update(password_hash)
+
+    @traced('hashing.hash_many')
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        # Spreads the hashes over all the workers. Bulk callers wait for a free slot instead of failing,
+        # and only hold one, so interactive requests are not rejected while an import is running.
+        with self._slots, self._timed('hash_many'):
+            if self.workers == 0:
+                return [hash_password(self._config, password) for password in passwords]
+
+            chunksize = max(len(passwords) // (self.workers * 4), 1)
+            return list(self._get_pool().map(functools.partial(hash_password, self._config), passwords, chunksize=chunksize))
+
+    def rehash_in_background(self, password: str, on_done: Callable[[str], None]) -> Future[None] | None:
+        # Hashes the password with the current default scheme and passes the hash to on_done, without
+        # blocking the caller. It is skipped when the executor is busy, the next login will try again.
+        if not self._rehash_slots.acquire(blocking=False):
+            self.logger.info('Skipped password rehash, too many rehashes pending')
+            return None
+
+        def rehash() -> None:
+            try:
+                password_hash = self.hash(password)
+                on_done(password_hash)
+            except HashingQueueFullError:
+                self.logger.info('Skipped password rehash, hashing queue is full')
+            except Exception:
+                self.logger.exception('Could not store the rehashed password')
+            finally:
+                self._rehash_slots.release()
+
+        with self._lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+
+            return self._background.submit(rehash)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+            if self._background is not None:
+                self._background.shutdown()
+                self._background = None
+
+
+def init_hashing(
+    workers: int | None, max_pending: int | None, context: CryptContext | None, metrics: 'MetricsRegistry | None'
+) -> Generator[HashingExecutor, None, None]:
+    executor = HashingExecutor(workers=workers, max_pending=max_pending, context=context, metrics=metrics)
+    yield executor
+    executor.shutdown()
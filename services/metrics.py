@@ -0,0 +1,370 @@
+import bisect
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from models import Client, User
+from repositories import ClientRepository, UserRepository
+from repositories.cache import CachedClientRepository, CachedUserRepository
+from repositories.cache.util import CacheStats
+from repositories.firestore import FirestoreUserIndex
+from repositories.rest import CachingTokenProvider
+
+from .tracing import settings, span
+
+T = TypeVar('T')
+
+# Upper bounds in seconds, from cache hits to slow password hashes and Firestore writes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metric:
+    # Every thread records into its own shard, so recording takes no lock and threads do not contend.
+    # Collecting copies each shard, a shard only gets a new key when its thread records a new label set.
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: list[dict[Labels, Any]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict[Labels, Any]:
+        shard: dict[Labels, Any] | None = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+
+        return shard
+
+    def _copies(self) -> list[dict[Labels, Any]]:
+        with self._lock:
+            shards = list(self._shards)
+
+        return [shard.copy() for shard in shards]
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError  # pragma: no cover
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}', *self.samples()]
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + value
+
+    def values(self) -> dict[Labels, float]:
+        totals: dict[Labels, float] = {}
+        for shard in self._copies():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+
+        return totals
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.values().items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    # Summed over the threads, so one thread may increment it and another decrement it
+    kind = 'gauge'
+
+    def dec(self, *labels: str, value: float = 1) -> None:
+        self.inc(*labels, value=-value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        # Non-cumulative bucket counts, then the sum and the count of the observations
+        counts: list[float] | None = shard.get(labels)
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 3)
+            shard[labels] = counts
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def values(self) -> dict[Labels, list[float]]:
+        totals: dict[Labels, list[float]] = {}
+        for shard in self._copies():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * (len(self.buckets) + 3))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+
+        return totals
+
+    def samples(self) -> Iterator[str]:
+        for labels, counts in sorted(self.values().items()):
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=False):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"' if math.isinf(bound) else f'le="{bound}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}'
+
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}'
+
+
+class MetricsRegistry:
+    # Metrics of this process. With several gunicorn workers, each worker exposes its own.
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.http_requests = Counter(
+            'user_http_requests_total', 'HTTP requests handled, by route and status.', ('method', 'route', 'status')
+        )
+        self.http_request_duration = Histogram(
+            'user_http_request_duration_seconds', 'Time to handle an HTTP request.', ('method', 'route'), buckets
+        )
+        self.http_requests_in_flight = Gauge(
+            'user_http_requests_in_flight', 'HTTP requests being handled.', ('method', 'route')
+        )
+        self.hashing_duration = Histogram(
+            'user_hashing_duration_seconds',
+            'Time spent in the password hashing executor, including the wait for a worker.',
+            ('operation',),
+            buckets,
+        )
+        self.hashing_rejected = Counter(
+            'user_hashing_rejected_total', 'Hashing operations rejected because the queue was full.', ('operation',)
+        )
+        self.repository_duration = Histogram(
+            'user_repository_call_duration_seconds', 'Time of user repository calls.', ('repository', 'method'), buckets
+        )
+        self.repository_errors = Counter(
+            'user_repository_call_errors_total', 'User repository calls that raised.', ('repository', 'method')
+        )
+        self.client_repository_duration = Histogram(
+            'user_client_repository_call_duration_seconds',
+            'Time of client service calls, cache misses only.',
+            ('method',),
+            buckets,
+        )
+        self.client_repository_errors = Counter(
+            'user_client_repository_call_errors_total', 'Client service calls that raised.', ('method',)
+        )
+        self._collectors: list[Callable[[], list[Metric]]] = []
+        self._collectors_lock = threading.Lock()
+
+    def add_collector(self, collector: Callable[[], list[Metric]]) -> None:
+        # A collector builds metrics from stats kept elsewhere (caches, the user index) each time they are rendered
+        with self._collectors_lock:
+            self._collectors.append(collector)
+
+    def metrics(self) -> list[Metric]:
+        with self._collectors_lock:
+            collectors = list(self._collectors)
+
+        own = [value for value in vars(self).values() if isinstance(value, Metric)]
+        return own + [metric for collector in collectors for metric in collector()]
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4
+        return ''.join(metric.render() for metric in self.metrics())
+
+
+def _snapshot(metric: Counter, value: float, *labels: str) -> Counter:
+    metric.inc(*labels, value=value)
+    return metric
+
+
+def _cache_metrics(prefix: str, description: str, stats: dict[str, CacheStats]) -> list[Metric]:
+    # One series per cache, labelled with its name
+    hits = Counter(f'{prefix}_hits_total', f'Lookups served by the {description}.', ('cache',))
+    misses = Counter(f'{prefix}_misses_total', f'Lookups missed by the {description}.', ('cache',))
+    evictions = Counter(f'{prefix}_evictions_total', f'Entries evicted from the {description} when full.', ('cache',))
+    entries = Gauge(f'{prefix}_entries', f'Entries in the {description}.', ('cache',))
+    for name, cache_stats in stats.items():
+        hits.inc(name, value=cache_stats.hits)
+        misses.inc(name, value=cache_stats.misses)
+        evictions.inc(name, value=cache_stats.evictions)
+        entries.inc(name, value=cache_stats.size)
+
+    return [hits, misses, evictions, entries]
+
+
+def collect_client_cache(repository: CachedClientRepository, metrics: MetricsRegistry) -> CachedClientRepository:
+    metrics.add_collector(lambda: _cache_metrics('user_client_cache', 'client cache', {'client': repository.stats()}))
+    return repository
+
+
+def collect_user_cache(repository: CachedUserRepository, metrics: MetricsRegistry) -> CachedUserRepository:
+    def collect() -> list[Metric]:
+        by_key, by_email, missing_emails = repository.stats()
+        return _cache_metrics(
+            'user_cache',
+            'user cache',
+            {'by_key': by_key, 'by_email': by_email, 'missing_emails': missing_emails},
+        )
+
+    metrics.add_collector(collect)
+    return repository
+
+
+def collect_token_refresh(provider: CachingTokenProvider, metrics: MetricsRegistry) -> CachingTokenProvider:
+    def collect() -> list[Metric]:
+        stats = provider.stats()
+        return [
+            _snapshot(Counter('user_token_refreshes_total', 'ID token refreshes for the client service.'), stats.refreshes),
+            _snapshot(Counter('user_token_refresh_failures_total', 'ID token refreshes that failed.'), stats.failures),
+            _snapshot(
+                Counter('user_token_refresh_duration_seconds_total', 'Time spent refreshing ID tokens.'),
+                stats.total_latency,
+            ),
+            _snapshot(
+                Gauge('user_token_refresh_last_duration_seconds', 'Time of the last ID token refresh.'),
+                stats.last_latency,
+            ),
+        ]
+
+    metrics.add_collector(collect)
+    return provider
+
+
+def collect_user_index(index: FirestoreUserIndex, metrics: MetricsRegistry) -> FirestoreUserIndex:
+    def collect() -> list[Metric]:
+        stats = index.stats()
+        collected: list[Metric] = [
+            _snapshot(Gauge('user_index_users', 'Users in the snapshot index.'), stats.size),
+            _snapshot(Gauge('user_index_active', 'Whether the snapshot listener is active.'), stats.active),
+            _snapshot(Gauge('user_index_synced', 'Whether the snapshot listener delivered its first snapshot.'), stats.synced),
+            _snapshot(
+                Gauge('user_index_max_lag_seconds', 'Highest lag between a commit and its arrival in the index.'),
+                stats.max_lag,
+            ),
+            _snapshot(Counter('user_index_restarts_total', 'Restarts of the snapshot listener.'), stats.restarts),
+        ]
+        if stats.lag is not None:
+            collected.append(
+                _snapshot(Gauge('user_index_lag_seconds', 'Lag of the last snapshot delivered to the index.'), stats.lag)
+            )
+
+        return collected
+
+    metrics.add_collector(collect)
+    return index
+
+
+class InstrumentedUserRepository(UserRepository):
+    # Records the latency and the errors of every call to the wrapped repository, labelled with its name,
+    # and traces the calls when tracing is set up
+    def __init__(self, repository: UserRepository, metrics: MetricsRegistry, name: str) -> None:
+        self.repository = repository
+        self.metrics = metrics
+        self.name = name
+
+    def _call(self, method: str, fn: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        try:
+            if settings.trace or settings.log_timings:
+                with span(f'user_repository.{method}'):
+                    return fn()
+
+            return fn()
+        except Exception:
+            self.metrics.repository_errors.inc(self.name, method)
+            raise
+        finally:
+            self.metrics.repository_duration.observe(time.perf_counter() - start, self.name, method)
+
+    def get(self, user_id: str, client_id: str) -> User | None:
+        return self._call('get', lambda: self.repository.get(user_id, client_id))
+
+    def get_many(self, keys: list[tuple[str, str]]) -> list[User]:
+        return self._call('get_many', lambda: self.repository.get_many(keys))
+
+    def find_by_email(self, email: str) -> User | None:
+        return self._call('find_by_email', lambda: self.repository.find_by_email(email))
+
+    def iter_by_client(self, client_id: str) -> Iterator[User]:
+        # Not timed, the iteration is paced by the caller
+        return self.repository.iter_by_client(client_id)
+
+    def list_by_client(
+        self, client_id: str, cursor: str | None = None, limit: int = 50, fields: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        return self._call('list_by_client', lambda: self.repository.list_by_client(client_id, cursor, limit, fields))
+
+    def create(self, user: User) -> None:
+        self._call('create', lambda: self.repository.create(user))
+
+    def update_password(self, user: User, password_hash: str) -> None:
+        self._call('update_password', lambda: self.repository.update_password(user, password_hash))
+
+    def create_many(self, users: list[User]) -> list[User]:
+        return self._call('create_many', lambda: self.repository.create_many(users))
+
+    def delete_all(self) -> dict[str, int]:
+        return self._call('delete_all', self.repository.delete_all)
+
+
+class InstrumentedClientRepository(ClientRepository):
+    # Records the latency and the errors of the calls to the client service, and traces them when tracing is set up
+    def __init__(self, repository: ClientRepository, metrics: MetricsRegistry) -> None:
+        self.repository = repository
+        self.metrics = metrics
+
+    def get(self, client_id: str) -> Client | None:
+        start = time.perf_counter()
+        try:
+            if settings.trace or settings.log_timings:
+                with span('client_repository.get'):
+                    return self.repository.get(client_id)
+
+            return self.repository.get(client_id)
+        except Exception:
+            self.metrics.client_repository_errors.inc('get')
+            raise
+        finally:
+            self.metrics.client_repository_duration.observe(time.perf_counter() - start, 'get')
@@ -0,0 +1,88 @@
+import math
+import threading
+import time
+from collections.abc import Callable
+
+from repositories import normalize_email
+
+
+class RateLimitStore:
+    def acquire(self, key: str, limit: int, window: float) -> bool:
+        # Counts a hit for key and returns True if the sliding window count stays within limit.
+        # Rejected hits are not counted. Implementations for a shared store must check and count atomically.
+        raise NotImplementedError  # pragma: no cover
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    # Sliding window counter: each key keeps the counts of the current and the previous fixed window, and the
+    # previous count is weighted by how much of it still overlaps the sliding window. Keys idle for two windows
+    # are swept at most once per window.
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.clock = clock
+        self._counters: dict[str, tuple[int, int, int]] = {}
+        self._lock = threading.Lock()
+        self._swept_at = 0
+
+    def acquire(self, key: str, limit: int, window: float) -> bool:
+        now = self.clock()
+        index = math.floor(now / window)
+
+        with self._lock:
+            if index > self._swept_at:
+                self._sweep(index)
+
+            counter_index, previous, current = self._counters.get(key, (index, 0, 0))
+            if counter_index == index - 1:
+                previous, current = current, 0
+            elif counter_index < index - 1:
+                previous, current = 0, 0
+
+            overlap = 1 - (now / window - index)
+            if previous * overlap + current + 1 > limit:
+                return False
+
+            self._counters[key] = (index, previous, current + 1)
+            return True
+
+    def _sweep(self, index: int) -> None:
+        self._counters = {k: v for k, v in self._counters.items() if v[0] >= index - 1}
+        self._swept_at = index
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._counters)
+
+
+def client_ip(forwarded_for: str | None, remote_addr: str | None, trusted_proxies: int) -> str:
+    # Every proxy appends the address it received the request from to X-Forwarded-For, only the entries
+    # added by the trusted proxies in front of the service cannot be forged by the client
+    route = [addr.strip() for addr in forwarded_for.split(',')] if forwarded_for else []
+    if trusted_proxies > 0 and len(route) > 0:
+        return route[max(len(route) - trusted_proxies, 0)]
+
+    return remote_addr or ''
+
+
+class LoginRateLimiter:
+    # Limits login attempts per username and per source IP, so retries cannot keep the password KDF busy
+    def __init__(
+        self,
+        store: RateLimitStore,
+        username_limit: int = 10,
+        ip_limit: int = 30,
+        window: float = 60,
+        trusted_proxies: int = 2,
+    ) -> None:
+        self.store = store
+        self.username_limit = username_limit
+        self.ip_limit = ip_limit
+        self.window = window
+        self.trusted_proxies = trusted_proxies
+
+    def allow(self, username: str, forwarded_for: str | None, remote_addr: str | None) -> bool:
+        ip = client_ip(forwarded_for, remote_addr, self.trusted_proxies)
+
+        if not self.store.acquire(f'ip:{ip}', self.ip_limit, self.window):
+            return False
+
+        return self.store.acquire(f'user:{normalize_email(username)}', self.username_limit, self.window)
@@ -0,0 +1,226 @@
+import base64
+import datetime
+import hashlib
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+import typing
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from models import RefreshToken, User
+from repositories import RefreshTokenRepository
+from repositories.errors import RefreshTokenReusedError
+
+from .tracing import traced
+
+RELOAD_INTERVAL = 60
+REFRESH_TOKEN_PATTERN = re.compile(r'(?P<client_id>[\w-]+)\.(?P<user_id>[\w-]+)\.(?P<secret>[\w-]+)')
+
+
+class JWTPayload(typing.TypedDict):
+    iss: str
+    sub: str
+    cid: str
+    email: str
+    role: str
+    aud: str
+    iat: int
+    exp: int
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    key: Ed25519PrivateKey
+
+
+def key_id(key: Ed25519PrivateKey) -> str:
+    # RFC 7638 JWK thumbprint of the public key, so a rotated key gets a new kid without extra configuration
+    public_bytes = key.public_key().public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
+    jwk = {'crv': 'Ed25519', 'kty': 'OKP', 'x': base64.urlsafe_b64encode(public_bytes).decode().rstrip('=')}
+    digest = hashlib.sha256(json.dumps(jwk, separators=(',', ':'), sort_keys=True).encode()).digest()
+
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+def load_signing_key(pem: str | bytes) -> SigningKey:
+    key = serialization.load_pem_private_key(pem.encode() if isinstance(pem, str) else pem, password=None)
+    if not isinstance(key, Ed25519PrivateKey):
+        raise TypeError('The JWT private key must be an Ed25519 key')
+
+    return SigningKey(kid=key_id(key), key=key)
+
+
+class SigningKeyProvider:
+    # Parses the private key once. When it comes from a file (e.g. a Secret Manager volume), the file is
+    # re-read at most every reload_interval seconds and the key is swapped when its contents change.
+    def __init__(
+        self,
+        private_key: str | bytes | None = None,
+        private_key_file: str | None = None,
+        reload_interval: float = RELOAD_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        pem: str | bytes
+        if private_key_file is not None:
+            pem = Path(private_key_file).read_bytes()
+        elif private_key is not None:
+            pem = private_key
+        else:
+            raise ValueError('Either private_key or private_key_file is required')
+
+        self.private_key_file = private_key_file
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._pem = pem
+        self._key = load_signing_key(pem)
+        self._checked_at = self.clock()
+
+    def current(self) -> SigningKey:
+        if self.private_key_file is not None and self.clock() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+        return self._key
+
+    def reload(self) -> None:
+        if self.private_key_file is None:
+            return
+
+        with self._lock:
+            self._checked_at = self.clock()
+
+            try:
+                pem = Path(self.private_key_file).read_bytes()
+                if pem == self._pem:
+                    return
+
+                key = load_signing_key(pem)
+            except (OSError, ValueError, TypeError):
+                self.logger.exception('Could not reload the JWT private key, keeping key %s', self._key.kid)
+                return
+
+            self.logger.info('Rotated JWT signing key from %s to %s', self._key.kid, key.kid)
+            self._pem = pem
+            self._key = key
+
+
+class TokenIssuer:
+    def __init__(
+        self,
+        key_provider: SigningKeyProvider,
+        issuer: str,
+        lifetime: datetime.timedelta = datetime.timedelta(minutes=60),
+    ) -> None:
+        self.key_provider = key_provider
+        self.issuer = issuer
+        self.lifetime = lifetime
+
+    def issue(self, user: User) -> str:
+        return self.issue_for(user_id=user.id, client_id=user.client_id, email=user.email)
+
+    @traced('jwt.encode')
+    def issue_for(self, user_id: str, client_id: str, email: str) -> str:
+        time_issued = datetime.datetime.now(datetime.UTC)
+        time_expiry = time_issued + self.lifetime
+
+        payload: JWTPayload = {
+            'iss': self.issuer,
+            'sub': user_id,
+            'cid': client_id,
+            'email': email,
+            'role': 'user',
+            'aud': 'user',
+            'iat': int(time_issued.timestamp()),
+            'exp': int(time_expiry.timestamp()),
+        }
+
+        signing_key = self.key_provider.current()
+
+        return jwt.encode(
+            typing.cast(dict[str, typing.Any], payload),
+            signing_key.key,
+            algorithm='EdDSA',
+            headers={'kid': signing_key.kid},
+        )
+
+
+class InvalidRefreshTokenError(Exception):
+    def __init__(self) -> None:
+        super().__init__('Invalid refresh token.')
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    # The tokens are long random strings, a plain SHA-256 is enough to keep them unusable if the database leaks
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+class RefreshTokenIssuer:
+    # Refresh tokens have the form {client_id}.{user_id}.{secret}, so they can be looked up with a single point read.
+    # Each refresh rotates the token. A token used twice means it was stolen, so every token descending from the
+    # same login (its family) is revoked.
+    def __init__(
+        self,
+        repository: RefreshTokenRepository,
+        lifetime: datetime.timedelta = datetime.timedelta(days=30),
+    ) -> None:
+        self.repository = repository
+        self.lifetime = lifetime
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _new_secret(self, client_id: str, user_id: str) -> str:
+        return f'{client_id}.{user_id}.{secrets.token_urlsafe(32)}'
+
+    @traced('refresh_token.issue')
+    def issue(self, user: User) -> str:
+        refresh_token = self._new_secret(user.client_id, user.id)
+        token = RefreshToken(
+            id=hash_refresh_token(refresh_token),
+            client_id=user.client_id,
+            user_id=user.id,
+            family_id=str(uuid.uuid4()),
+            email=user.email,
+            expires_at=datetime.datetime.now(datetime.UTC) + self.lifetime,
+        )
+        self.repository.create(token)
+
+        return refresh_token
+
+    @traced('refresh_token.rotate')
+    def rotate(self, refresh_token: str) -> tuple[RefreshToken, str]:
+        # Returns the stored replacement and the new refresh token
+        match = REFRESH_TOKEN_PATTERN.fullmatch(refresh_token)
+        if match is None:
+            raise InvalidRefreshTokenError
+
+        client_id, user_id = match['client_id'], match['user_id']
+        new_refresh_token = self._new_secret(client_id, user_id)
+
+        try:
+            token = self.repository.rotate(
+                hash_refresh_token(refresh_token),
+                client_id=client_id,
+                user_id=user_id,
+                new_token_id=hash_refresh_token(new_refresh_token),
+                expires_at=datetime.datetime.now(datetime.UTC) + self.lifetime,
+            )
+        except RefreshTokenReusedError as err:
+            revoked = self.repository.revoke_family(client_id, user_id, err.family_id)
+            self.logger.warning('Refresh token reused, revoked %d tokens of family %s', revoked, err.family_id)
+            raise InvalidRefreshTokenError from err
+
+        if token is None:
+            raise InvalidRefreshTokenError
+
+        return token, new_refresh_token
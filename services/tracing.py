@@ -0,0 +1,120 @@
+import functools
+import logging
+import secrets
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, ParamSpec, TypeVar
+
+from flask import current_app, g, has_request_context, request
+
+P = ParamSpec('P')
+T = TypeVar('T')
+
+logger = logging.getLogger('Tracing')
+
+
+@dataclass
+class TracingSettings:
+    # trace adds child spans to the Cloud Trace span of the request, log_timings logs the duration of every span
+    trace: bool = False
+    log_timings: bool = False
+
+
+settings = TracingSettings()
+
+
+def setup_tracing(*, trace: bool = False, log_timings: bool = False) -> None:
+    settings.trace = trace
+    settings.log_timings = log_timings
+
+
+def _trace_context() -> tuple[str, str] | None:
+    # Returns the trace ID and the parent span ID of a sampled request, from its W3C traceparent header
+    parts = request.headers.get('Traceparent', '').split('-')
+    if len(parts) != 4 or parts[0] != '00':  # noqa: PLR2004
+        return None
+
+    _, trace_id, parent_span_id, flags = parts
+    try:
+        sampled = int(flags, 16) & 1
+    except ValueError:
+        return None
+
+    return (trace_id, parent_span_id) if sampled else None
+
+
+@contextmanager
+def _trace_span(display_name: str) -> Iterator[None]:
+    # Records the span in g.spans in the format of the TraceSpan of gcp_microservice_utils, so setup_cloud_trace sends
+    # it with the request. TraceSpan only keeps a nesting level, it closes the wrong span once a span has a sibling.
+    if not hasattr(current_app, 'cloud_trace_client'):
+        yield
+        return
+
+    if 'trace_stack' not in g:
+        g.trace_context = _trace_context()
+        g.trace_stack = []
+
+    if g.trace_context is None:
+        yield
+        return
+
+    trace_id, parent_span_id = g.trace_context
+    stack: list[dict[str, Any]] = g.trace_stack
+    trace_span = {
+        'display_name': display_name,
+        'trace_id': trace_id,
+        'span_id': secrets.token_hex(8),
+        'parent_span_id': stack[-1]['span_id'] if stack else parent_span_id,
+        'start_time': time.time_ns(),
+    }
+    g.setdefault('spans', []).append(trace_span)
+    stack.append(trace_span)
+    try:
+        yield
+    finally:
+        stack.pop()
+        trace_span['end_time'] = time.time_ns()
+
+
+@contextmanager
+def span(display_name: str) -> Iterator[None]:
+    # Outside of a Flask request (background threads) spans are not traced, only their timing is logged
+    if settings.trace and has_request_context():
+        with _trace_span(display_name):
+            yield
+        return
+
+    if not settings.log_timings:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            '%s took %.2f ms',
+            display_name,
+            duration_ms,
+            extra={'json_fields': {'span': display_name, 'duration_ms': duration_ms}},
+        )
+
+
+def traced(display_name: str) -> Callable[[Callable[P, T]], Callable[P, T]]:
+    def decorator(fn: Callable[P, T]) -> Callable[P, T]:
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            # Only a settings lookup when tracing and timing logs are both off
+            if not settings.trace and not settings.log_timings:
+                return fn(*args, **kwargs)
+
+            with span(display_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,48 @@
+import uuid
+
+from models import User
+from repositories import ClientRepository, UserRepository
+from repositories.errors import DuplicateEmailError
+
+from .errors import EmailTakenError, ServerBusyError, UnknownClientError, UserNotFoundError
+from .hashing import HashingExecutor, HashingQueueFullError
+
+
+class UserService:
+    # User lookups and registration behind the user blueprint
+    def __init__(self, user_repo: UserRepository, client_repo: ClientRepository, hashing: HashingExecutor) -> None:
+        self.user_repo = user_repo
+        self.client_repo = client_repo
+        self.hashing = hashing
+
+    def get(self, user_id: str, client_id: str) -> User:
+        user = self.user_repo.get(user_id=user_id, client_id=client_id)
+        if user is None:
+            raise UserNotFoundError
+
+        return user
+
+    def find_by_email(self, email: str) -> User:
+        user = self.user_repo.find_by_email(email)
+        if user is None:
+            raise UserNotFoundError
+
+        return user
+
+    def register(self, client_id: str, name: str, email: str, password: str) -> User:
+        if self.client_repo.get(client_id) is None:
+            raise UnknownClientError
+
+        try:
+            password_hash = self.hashing.hash(password)
+        except HashingQueueFullError as err:
+            raise ServerBusyError from err
+
+        user = User(id=str(uuid.uuid4()), client_id=client_id, name=name, email=email, password=password_hash)
+
+        try:
+            self.user_repo.create(user)
+        except DuplicateEmailError as err:
+            raise EmailTakenError from err
+
+        return user
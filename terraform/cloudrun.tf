@@ -74,7 +74,8 @@ resource "google_cloud_run_v2_service" "default" {
         }
       }
 
-      # CPU is only allocated when processing requests
+      # CPU is only allocated when processing requests. USER_CACHE_MODE=snapshot needs cpu_idle = false,
+      # its snapshot listener runs between requests.
       resources {
         cpu_idle = true
         startup_cpu_boost = true
@@ -48,3 +48,12 @@ resource "google_firestore_field" "idx_users_email" {
     }
   }
 }
+
+# Enables a TTL policy on the "refresh_tokens" subcollections, so expired refresh tokens are deleted automatically.
+resource "google_firestore_field" "ttl_refresh_tokens_expires_at" {
+  database   = google_firestore_database.default.name
+  collection = "refresh_tokens"
+  field      = "expires_at"
+
+  ttl_config {}
+}
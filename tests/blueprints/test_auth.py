@@ -1,18 +1,23 @@
+import datetime
 import json
 from typing import Any, cast
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import jwt
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from faker import Faker
+from gcp_microservice_utils import setup_cloud_trace
 from passlib.hash import pbkdf2_sha256
 from unittest_parametrize import ParametrizedTestCase, parametrize
 from werkzeug.test import TestResponse
 
 from app import create_app
-from models import User
-from repositories import UserRepository
+from models import RefreshToken, User
+from repositories import RefreshTokenRepository, UserRepository
+from repositories.errors import RefreshTokenReusedError
+from services import HashingExecutor, HashingQueueFullError, LoginRateLimiter, setup_tracing
+from services.tokens import hash_refresh_token
 
 
 class TestAuth(ParametrizedTestCase):
@@ -34,14 +39,19 @@ class TestAuth(ParametrizedTestCase):
             )
         )
 
+        self.refresh_token_repo_mock = Mock(RefreshTokenRepository)
+        self.app.container.refresh_token_repo.override(self.refresh_token_repo_mock)
+        # The auth service is built with a user repository, also for refreshes that do not use it
+        self.app.container.user_repo.override(Mock(UserRepository))
+
         self.client = self.app.test_client()
 
     def tearDown(self) -> None:
         self.app.container.unwire()
 
-    def call_api(self, body: dict[str, Any] | str) -> TestResponse:
+    def call_api(self, body: dict[str, Any] | str, path: str = '/api/v1/auth/user') -> TestResponse:
         return self.client.post(
-            '/api/v1/auth/user',
+            path,
             data=body if isinstance(body, str) else json.dumps(body),
             content_type='application/json',
         )
@@ -90,10 +100,15 @@ class TestAuth(ParametrizedTestCase):
 
         user_repo_mock = Mock(UserRepository)
         cast(Mock, user_repo_mock.find_by_email).return_value = None
-        with self.app.container.user_repo.override(user_repo_mock):
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.dummy_hash).return_value = 'dummy-hash'
+        cast(Mock, hashing_mock.verify).return_value = True
+        with self.app.container.user_repo.override(user_repo_mock), self.app.container.hashing.override(hashing_mock):
             resp = self.call_api(login_data)
 
         cast(Mock, user_repo_mock.find_by_email).assert_called_once_with(login_data['username'])
+        # The password is still verified, against the dummy hash
+        cast(Mock, hashing_mock.verify).assert_called_once_with(login_data['password'], 'dummy-hash')
 
         self.assertEqual(resp.status_code, 401)
         resp_data = json.loads(resp.get_data())
@@ -136,3 +151,222 @@ class TestAuth(ParametrizedTestCase):
         self.assertEqual(decoded_token['role'], 'user')
         self.assertEqual(decoded_token['aud'], 'user')
         self.assertEqual(decoded_token['email'], user.email)
+        self.assertEqual(
+            jwt.get_unverified_header(resp_data['token'])['kid'],
+            self.app.container.signing_key().current().kid,
+        )
+
+        refresh_token: RefreshToken = cast(Mock, self.refresh_token_repo_mock.create).call_args[0][0]
+        self.assertEqual(refresh_token.id, hash_refresh_token(resp_data['refreshToken']))
+        self.assertEqual((refresh_token.client_id, refresh_token.user_id), (user.client_id, user.id))
+
+    def test_login_traced(self) -> None:
+        password = self.faker.password()
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=pbkdf2_sha256.hash(password),
+        )
+        self.app.container.user_repo.reset_override()
+        self.app.container.config.user.storage.override('memory')
+        self.app.container.config.user.cache.mode.override('none')
+        self.app.container.user_repo().create(user)
+
+        trace_client = Mock()
+        with (
+            patch('gcp_microservice_utils.trace.TraceServiceClient', return_value=trace_client),
+            patch('gcp_microservice_utils.trace.google.auth.default', return_value=(None, 'project')),
+        ):
+            setup_cloud_trace(self.app)
+        setup_tracing(trace=True)
+        self.addCleanup(setup_tracing)
+
+        with self.app.container.hashing.override(HashingExecutor(workers=0)):
+            resp = self.client.post(
+                '/api/v1/auth/user',
+                json={'username': user.email, 'password': password},
+                headers={'Traceparent': f'00-{"1" * 32}-{"2" * 16}-01'},
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        spans = cast(Mock, trace_client.batch_write_spans).call_args.kwargs['spans']
+        self.assertEqual(
+            [s.display_name.value for s in spans],
+            ['user_repository.find_by_email', 'hashing.verify', 'jwt.encode', 'refresh_token.issue'],
+        )
+
+    def test_login_rate_limited(self) -> None:
+        username = self.faker.email()
+        user_repo_mock = Mock(UserRepository)
+        hashing_mock = Mock(HashingExecutor)
+        rate_limiter_mock = Mock(LoginRateLimiter)
+        cast(Mock, rate_limiter_mock.allow).return_value = False
+        with (
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+            self.app.container.login_rate_limiter.override(rate_limiter_mock),
+        ):
+            resp = self.client.post(
+                '/api/v1/auth/user',
+                data=json.dumps({'username': username, 'password': self.faker.password()}),
+                content_type='application/json',
+                headers={'X-Forwarded-For': '1.1.1.1'},
+            )
+
+        self.assertEqual(resp.status_code, 429)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data['code'], 429)
+        self.assertEqual(resp_data['message'], 'Too many login attempts, please try again later.')
+        cast(Mock, rate_limiter_mock.allow).assert_called_once_with(username, '1.1.1.1', '127.0.0.1')
+        cast(Mock, user_repo_mock.find_by_email).assert_not_called()
+        cast(Mock, hashing_mock.verify).assert_not_called()
+
+    def test_login_rate_limit_per_username(self) -> None:
+        self.app.container.config.rate_limit.username_limit.override(2)
+        username = self.faker.email()
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.find_by_email).return_value = None
+        with self.app.container.user_repo.override(user_repo_mock):
+            statuses = [self.call_api({'username': username, 'password': self.faker.password()}).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [401, 401, 429])
+        self.assertEqual(cast(Mock, user_repo_mock.find_by_email).call_count, 2)
+
+    def test_login_rate_limit_per_ip_behind_gateway(self) -> None:
+        # Every request reaches the service from the gateway address, only the address before it identifies the client
+        self.app.container.config.rate_limit.ip_limit.override(1)
+
+        def login(client_ip: str) -> int:
+            return self.client.post(
+                '/api/v1/auth/user',
+                data=json.dumps({'username': self.faker.email(), 'password': self.faker.password()}),
+                content_type='application/json',
+                headers={'X-Forwarded-For': f'{client_ip}, 10.0.0.1'},
+            ).status_code
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.find_by_email).return_value = None
+        with self.app.container.user_repo.override(user_repo_mock):
+            statuses = [login('1.1.1.1'), login('2.2.2.2'), login('1.1.1.1')]
+
+        self.assertEqual(statuses, [401, 401, 429])
+
+    def test_login_hashing_busy(self) -> None:
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=pbkdf2_sha256.hash(self.faker.password()),
+        )
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.find_by_email).return_value = user
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.verify).side_effect = HashingQueueFullError
+        with self.app.container.user_repo.override(user_repo_mock), self.app.container.hashing.override(hashing_mock):
+            resp = self.call_api({'username': user.email, 'password': self.faker.password()})
+
+        self.assertEqual(resp.status_code, 503)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data['code'], 503)
+        self.assertEqual(resp_data['message'], 'The server is busy, please try again later.')
+
+    @parametrize(
+        'needs_update',
+        [
+            (True,),
+            (False,),
+        ],
+    )
+    def test_login_rehash(self, needs_update: bool) -> None:  # noqa: FBT001
+        password = self.faker.password()
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=pbkdf2_sha256.hash(password),
+        )
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.find_by_email).return_value = user
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.verify).return_value = True
+        cast(Mock, hashing_mock.needs_update).return_value = needs_update
+        with self.app.container.user_repo.override(user_repo_mock), self.app.container.hashing.override(hashing_mock):
+            resp = self.call_api({'username': user.email, 'password': password})
+
+        self.assertEqual(resp.status_code, 200)
+        cast(Mock, hashing_mock.needs_update).assert_called_once_with(user.password)
+
+        if not needs_update:
+            cast(Mock, hashing_mock.rehash_in_background).assert_not_called()
+            return
+
+        cast(Mock, hashing_mock.rehash_in_background).assert_called_once()
+        rehash_password, on_done = cast(Mock, hashing_mock.rehash_in_background).call_args[0]
+        self.assertEqual(rehash_password, password)
+
+        on_done('new-hash')
+        cast(Mock, user_repo_mock.update_password).assert_called_once_with(user, 'new-hash')
+
+    def test_refresh(self) -> None:
+        user_id = cast(str, self.faker.uuid4())
+        client_id = cast(str, self.faker.uuid4())
+        refresh_token = f'{client_id}.{user_id}.{self.faker.pystr()}'
+        new_token = RefreshToken(
+            id=self.faker.pystr(),
+            client_id=client_id,
+            user_id=user_id,
+            family_id=cast(str, self.faker.uuid4()),
+            email=self.faker.email(),
+            expires_at=datetime.datetime.now(datetime.UTC),
+        )
+        cast(Mock, self.refresh_token_repo_mock.rotate).return_value = new_token
+
+        resp = self.call_api({'refreshToken': refresh_token}, '/api/v1/auth/user/refresh')
+
+        self.assertEqual(resp.status_code, 200)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(cast(Mock, self.refresh_token_repo_mock.rotate).call_args[0], (hash_refresh_token(refresh_token),))
+        self.assertEqual(
+            cast(Mock, self.refresh_token_repo_mock.rotate).call_args[1]['new_token_id'],
+            hash_refresh_token(resp_data['refreshToken']),
+        )
+        decoded_token = jwt.decode(resp_data['token'], self.jwt_public_key, algorithms=['EdDSA'], audience='user')
+        self.assertEqual(decoded_token['sub'], user_id)
+        self.assertEqual(decoded_token['cid'], client_id)
+        self.assertEqual(decoded_token['email'], new_token.email)
+
+    @parametrize(
+        ('body', 'rotate_result', 'expected_message'),
+        [
+            ({}, None, 'Invalid value for refreshToken: Missing data for required field.'),
+            ({'refreshToken': 'malformed'}, None, 'Invalid refresh token.'),
+            ({'refreshToken': 'cid.uid.secret'}, None, 'Invalid refresh token.'),
+            ({'refreshToken': 'cid.uid.secret'}, RefreshTokenReusedError('family'), 'Invalid refresh token.'),
+        ],
+    )
+    def test_refresh_invalid(self, body: dict[str, Any], rotate_result: Exception | None, expected_message: str) -> None:
+        cast(Mock, self.refresh_token_repo_mock.rotate).side_effect = rotate_result
+        cast(Mock, self.refresh_token_repo_mock.rotate).return_value = None
+        cast(Mock, self.refresh_token_repo_mock.revoke_family).return_value = 2
+
+        resp = self.call_api(body, '/api/v1/auth/user/refresh')
+
+        resp_data = json.loads(resp.get_data())
+        self.assertEqual(resp_data['message'], expected_message)
+        self.assertEqual(resp.status_code, resp_data['code'])
+        self.assertEqual(resp.status_code, 400 if 'refreshToken' not in body else 401)
+
+        if rotate_result is not None:
+            cast(Mock, self.refresh_token_repo_mock.revoke_family).assert_called_once_with('cid', 'uid', 'family')
+        else:
+            cast(Mock, self.refresh_token_repo_mock.revoke_family).assert_not_called()
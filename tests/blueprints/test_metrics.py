@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from app import create_app
+
+
+class TestMetrics(TestCase):
+    def setUp(self) -> None:
+        app = create_app()
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        self.client = app.test_client()
+
+        @app.route('/fail')
+        def fail() -> str:
+            raise RuntimeError
+
+    def test_metrics(self) -> None:
+        self.client.get('/api/v1/health/user')
+        self.client.get('/api/v1/health/user')
+        self.client.get('/not-found/123')
+
+        resp = self.client.get('/api/v1/metrics/user')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'text/plain')
+        text = resp.get_data(as_text=True)
+        self.assertIn('user_http_requests_total{method="GET",route="/api/v1/health/user",status="200"} 2\n', text)
+        self.assertIn('user_http_requests_total{method="GET",route="unmatched",status="404"} 1\n', text)
+        self.assertIn('user_http_request_duration_seconds_count{method="GET",route="/api/v1/health/user"} 2\n', text)
+        self.assertIn('user_http_requests_in_flight{method="GET",route="/api/v1/health/user"} 0\n', text)
+        self.assertIn('user_http_requests_in_flight{method="GET",route="/api/v1/metrics/user"} 1\n', text)
+
+    def test_unhandled_error(self) -> None:
+        self.assertEqual(self.client.get('/fail').status_code, 500)
+
+        text = self.client.get('/api/v1/metrics/user').get_data(as_text=True)
+
+        self.assertIn('user_http_requests_total{method="GET",route="/fail",status="500"} 1\n', text)
+        self.assertIn('user_http_requests_in_flight{method="GET",route="/fail"} 0\n', text)
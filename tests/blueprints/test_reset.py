@@ -1,3 +1,5 @@
+import json
+from datetime import UTC, datetime, timedelta
 from typing import cast
 from unittest.mock import Mock
 
@@ -5,7 +7,11 @@ from unittest_parametrize import ParametrizedTestCase, parametrize
 
 import demo
 from app import create_app
-from repositories import UserRepository
+from blueprints.reset import MAX_RESET_SIZE
+from demo.generate import DEFAULT_PASSWORD
+from models import RefreshToken, User
+from repositories import RefreshTokenRepository, UserRepository
+from services import HashingExecutor
 
 
 class TestReset(ParametrizedTestCase):
@@ -14,6 +20,9 @@ class TestReset(ParametrizedTestCase):
     def setUp(self) -> None:
         self.app = create_app()
         self.client = self.app.test_client()
+        self.refresh_token_repo_mock = Mock(RefreshTokenRepository)
+        cast(Mock, self.refresh_token_repo_mock.delete_all).return_value = {}
+        self.app.container.refresh_token_repo.override(self.refresh_token_repo_mock)
 
     def tearDown(self) -> None:
         self.app.container.unwire()
@@ -31,8 +40,18 @@ class TestReset(ParametrizedTestCase):
         user_repo_mock = Mock(UserRepository)
         call_order = []
 
-        cast(Mock, user_repo_mock.delete_all).side_effect = lambda: call_order.append('user:delete_all')
-        cast(Mock, user_repo_mock.create).side_effect = lambda _x: call_order.append('user:create')
+        deleted = {'clients': 2, 'users': 3, 'emails': 3}
+
+        def delete_all() -> dict[str, int]:
+            call_order.append('user:delete_all')
+            return deleted
+
+        def create_many(_users: list[User]) -> list[User]:
+            call_order.append('user:create_many')
+            return []
+
+        cast(Mock, user_repo_mock.delete_all).side_effect = delete_all
+        cast(Mock, user_repo_mock.create_many).side_effect = create_many
 
         with self.app.container.user_repo.override(user_repo_mock):
             resp = self.client.post(self.API_ENDPOINT + (f'?demo={arg}' if arg is not None else ''))
@@ -42,6 +61,97 @@ class TestReset(ParametrizedTestCase):
         if not expected:
             self.assertEqual(call_order, ['user:delete_all'])
         else:
-            self.assertEqual(call_order, ['user:delete_all'] + ['user:create'] * len(demo.users))
+            self.assertEqual(call_order, ['user:delete_all', 'user:create_many'])
+            cast(Mock, user_repo_mock.create_many).assert_called_once_with(demo.users)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            json.loads(resp.get_data()),
+            {'status': 'Ok', 'deleted': deleted, 'created': len(demo.users) if expected else 0},
+        )
+
+    def test_reset_memory_storage(self) -> None:
+        # The refresh tokens of the deleted users cannot be used anymore
+        self.app.container.refresh_token_repo.reset_override()
+        self.app.container.config.user.storage.override('memory')
+        refresh_token_repo = self.app.container.refresh_token_repo()
+        user = demo.users[0]
+        token = RefreshToken(
+            id='token',
+            client_id=user.client_id,
+            user_id=user.id,
+            family_id='family',
+            email=user.email,
+            expires_at=datetime.now(UTC) + timedelta(days=1),
+        )
+        self.app.container.user_repo().create(user)
+        refresh_token_repo.create(token)
+
+        resp = self.client.post(self.API_ENDPOINT)
 
         self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.get_data())['deleted'], {'clients': 1, 'users': 1, 'emails': 1, 'refresh_tokens': 1})
+        self.assertIsNone(refresh_token_repo.rotate(token.id, user.client_id, user.id, 'new-token', token.expires_at))
+
+    def test_reset_size(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.delete_all).return_value = {}
+        cast(Mock, user_repo_mock.create_many).side_effect = lambda users: users[:2]
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.hash).return_value = 'hash'
+
+        with (
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.client.post(self.API_ENDPOINT + '?demo=true&size=50')
+
+        # Hashed once with the configured hashing
+        cast(Mock, hashing_mock.hash).assert_called_once_with(DEFAULT_PASSWORD)
+
+        users = cast(Mock, user_repo_mock.create_many).call_args.args[0]
+        self.assertEqual(len(users), len(demo.users) + 50)
+        self.assertEqual(users[: len(demo.users)], demo.users)
+        self.assertEqual(len({user.email for user in users}), len(users))
+        self.assertEqual({user.password for user in users[len(demo.users) :]}, {'hash'})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.get_data())['created'], len(demo.users) + 48)
+
+    def test_reset_without_size_does_not_hash(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.delete_all).return_value = {}
+
+        hashing_mock = Mock(HashingExecutor)
+
+        with (
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.client.post(self.API_ENDPOINT)
+
+        self.assertEqual(resp.status_code, 200)
+        cast(Mock, hashing_mock.hash).assert_not_called()
+        cast(Mock, user_repo_mock.create_many).assert_not_called()
+
+    @parametrize(
+        'size',
+        [
+            ('-1',),
+            ('foo',),
+            ('²',),
+            (str(MAX_RESET_SIZE + 1),),
+        ],
+    )
+    def test_reset_invalid_size(self, size: str) -> None:
+        user_repo_mock = Mock(UserRepository)
+
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.post(self.API_ENDPOINT + f'?size={size}')
+
+        cast(Mock, user_repo_mock.delete_all).assert_not_called()
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+        self.assertEqual(
+            resp_data, {'message': f'Invalid value for size: Must be an integer between 0 and {MAX_RESET_SIZE}.', 'code': 400}
+        )
@@ -1,7 +1,7 @@
 import base64
 import json
 from typing import Any, cast
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from faker import Faker
 from passlib.hash import pbkdf2_sha256
@@ -11,7 +11,8 @@ from werkzeug.test import TestResponse
 from app import create_app
 from models import Client, User
 from repositories import ClientRepository, UserRepository
-from repositories.errors import DuplicateEmailError
+from repositories.errors import DuplicateEmailError, InvalidCursorError
+from services import HashingExecutor, HashingQueueFullError, create_crypt_context
 
 
 class TestUser(ParametrizedTestCase):
@@ -281,7 +282,7 @@ class TestUser(ParametrizedTestCase):
         self.assertEqual(repo_user.client_id, register_data['clientId'])
         self.assertEqual(repo_user.name, register_data['name'])
         self.assertEqual(repo_user.email, register_data['email'])
-        self.assertTrue(pbkdf2_sha256.verify(register_data['password'], repo_user.password))
+        self.assertTrue(create_crypt_context().verify(register_data['password'], repo_user.password))
 
         self.assertEqual(resp.status_code, 201)
         resp_data = json.loads(resp.get_data())
@@ -367,6 +368,34 @@ class TestUser(ParametrizedTestCase):
         self.assertEqual(resp_data['code'], 400)
         self.assertEqual(resp_data['message'], 'Invalid value for clientId: Client does not exist.')
 
+    def test_register_hashing_busy(self) -> None:
+        register_data = {
+            'clientId': cast(str, self.faker.uuid4()),
+            'name': self.faker.name(),
+            'email': self.faker.email(),
+            'password': self.faker.password(),
+        }
+
+        user_repo_mock = Mock(UserRepository)
+        client_repo_mock = Mock(ClientRepository)
+        cast(Mock, client_repo_mock.get).return_value = Client(id=register_data['clientId'], name=self.faker.company())
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.hash).side_effect = HashingQueueFullError
+        with (
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.client_repo.override(client_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.call_register_api(register_data)
+
+        cast(Mock, user_repo_mock.create).assert_not_called()
+
+        self.assertEqual(resp.status_code, 503)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data['code'], 503)
+        self.assertEqual(resp_data['message'], 'The server is busy, please try again later.')
+
     @parametrize(
         ['param'],
         [
@@ -455,3 +484,336 @@ class TestUser(ParametrizedTestCase):
 
         self.assertEqual(resp_data['code'], 400)
         self.assertEqual(resp_data['message'], 'Invalid value for email: Not a valid email address.')
+
+    def call_batch_api(self, body: dict[str, Any] | str) -> TestResponse:
+        return self.client.post(
+            '/api/v1/users/batch',
+            data=body if isinstance(body, str) else json.dumps(body),
+            content_type='application/json',
+        )
+
+    def test_batch(self) -> None:
+        users = [
+            User(
+                id=cast(str, self.faker.uuid4()),
+                client_id=cast(str, self.faker.uuid4()),
+                name=self.faker.name(),
+                email=self.faker.email(),
+                password=pbkdf2_sha256.hash(self.faker.password()),
+            )
+            for _ in range(2)
+        ]
+        missing = {'clientId': cast(str, self.faker.uuid4()), 'userId': cast(str, self.faker.uuid4())}
+        keys = [{'clientId': user.client_id, 'userId': user.id} for user in users] + [missing]
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.get_many).return_value = users
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.call_batch_api({'users': [*keys, keys[0]]})
+
+        cast(Mock, user_repo_mock.get_many).assert_called_once_with([(k['clientId'], k['userId']) for k in keys])
+
+        self.assertEqual(resp.status_code, 200)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual([u['id'] for u in resp_data['users']], [user.id for user in users])
+        self.assertNotIn('password', resp_data['users'][0])
+        self.assertEqual(resp_data['missing'], [missing])
+
+    def test_batch_invalid_json(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.call_batch_api('invalid json')
+
+        cast(Mock, user_repo_mock.get_many).assert_not_called()
+        self.assertEqual(resp.status_code, 400)
+
+    def test_batch_invalid_id(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.call_batch_api({'users': [{'clientId': cast(str, self.faker.uuid4()), 'userId': self.faker.word()}]})
+
+        cast(Mock, user_repo_mock.get_many).assert_not_called()
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data['message'], 'Invalid value for users.0.userId: Not a valid UUID.')
+
+    @parametrize(
+        'count',
+        [
+            (0,),
+            (101,),
+        ],
+    )
+    def test_batch_size_bounds(self, count: int) -> None:
+        keys = [{'clientId': cast(str, self.faker.uuid4()), 'userId': cast(str, self.faker.uuid4())} for _ in range(count)]
+
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.call_batch_api({'users': keys})
+
+        cast(Mock, user_repo_mock.get_many).assert_not_called()
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data['message'], 'Invalid value for users: Length must be between 1 and 100.')
+
+    def call_import_api(self, lines: list[str]) -> TestResponse:
+        return self.client.post(
+            '/api/v1/users/import',
+            data='\n'.join(lines) + '\n',
+            content_type='application/x-ndjson',
+        )
+
+    def gen_register_data(self, client_id: str) -> dict[str, str]:
+        return {
+            'clientId': client_id,
+            'name': self.faker.name(),
+            'email': self.faker.unique.email(),
+            'password': self.faker.password(),
+        }
+
+    def test_import(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        invalid_client_id = cast(str, self.faker.uuid4())
+        valid_data = self.gen_register_data(client_id)
+        duplicate_data = self.gen_register_data(client_id)
+        lines = [
+            json.dumps(valid_data),
+            '',
+            'not json',
+            json.dumps({**self.gen_register_data(client_id), 'email': 'foo'}),
+            json.dumps(self.gen_register_data(invalid_client_id)),
+            json.dumps(duplicate_data),
+        ]
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.create_many).side_effect = lambda users: [
+            u for u in users if u.email == duplicate_data['email']
+        ]
+        client_repo_mock = Mock(ClientRepository)
+        cast(Mock, client_repo_mock.get).side_effect = lambda cid: Client(id=cid, name='Client') if cid == client_id else None
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.hash_many).side_effect = lambda passwords: [f'hash-{p}' for p in passwords]
+        with (
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.client_repo.override(client_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.call_import_api(lines)
+            results = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'application/x-ndjson')
+        self.assertEqual([(r['line'], r['code']) for r in results], [(1, 201), (3, 400), (4, 400), (5, 400), (6, 409)])
+        self.assertEqual(results[1]['message'], 'The line could not be parsed as valid JSON.')
+        self.assertEqual(results[2]['message'], 'Invalid value for email: Not a valid email address.')
+        self.assertEqual(results[3]['message'], 'Invalid value for clientId: Client does not exist.')
+        self.assertEqual(results[4]['message'], 'A user with the email already exists.')
+
+        user = results[0]['user']
+        self.assertEqual(
+            user, {'id': user['id'], 'clientId': client_id, 'name': valid_data['name'], 'email': valid_data['email']}
+        )
+
+        self.assertEqual(cast(Mock, client_repo_mock.get).call_count, 2)
+        cast(Mock, hashing_mock.hash_many).assert_called_once_with([valid_data['password'], duplicate_data['password']])
+        created: list[User] = cast(Mock, user_repo_mock.create_many).call_args[0][0]
+        self.assertEqual(
+            [u.password for u in created], [f'hash-{valid_data["password"]}', f'hash-{duplicate_data["password"]}']
+        )
+
+    def test_import_chunks(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        lines = [json.dumps(self.gen_register_data(client_id)) for _ in range(5)]
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.create_many).return_value = []
+        client_repo_mock = Mock(ClientRepository)
+        cast(Mock, client_repo_mock.get).return_value = Client(id=client_id, name=self.faker.company())
+        hashing_mock = Mock(HashingExecutor)
+        cast(Mock, hashing_mock.hash_many).side_effect = lambda passwords: passwords
+        with (
+            patch('blueprints.user.IMPORT_CHUNK_SIZE', 2),
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.client_repo.override(client_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.call_import_api(lines)
+            results = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+        self.assertEqual([r['code'] for r in results], [201] * 5)
+        cast(Mock, client_repo_mock.get).assert_called_once_with(client_id)
+        self.assertEqual([len(c[0][0]) for c in cast(Mock, user_repo_mock.create_many).call_args_list], [2, 2, 1])
+
+    @parametrize(
+        ('error', 'message'),
+        [
+            (HashingQueueFullError(), 'The server is busy, please try again later.'),
+            (RuntimeError('Firestore unavailable'), 'The user could not be imported, please try again later.'),
+        ],
+    )
+    def test_import_chunk_failure(self, error: Exception, message: str) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        lines = ['not json', *(json.dumps(self.gen_register_data(client_id)) for _ in range(3))]
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.create_many).return_value = []
+        client_repo_mock = Mock(ClientRepository)
+        cast(Mock, client_repo_mock.get).return_value = Client(id=client_id, name=self.faker.company())
+        hashing_mock = Mock(HashingExecutor)
+        # Only the first chunk fails, the next one is still imported
+        cast(Mock, hashing_mock.hash_many).side_effect = [error, ['hash']]
+        with (
+            patch('blueprints.user.IMPORT_CHUNK_SIZE', 3),
+            self.app.container.user_repo.override(user_repo_mock),
+            self.app.container.client_repo.override(client_repo_mock),
+            self.app.container.hashing.override(hashing_mock),
+        ):
+            resp = self.call_import_api(lines)
+            results = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([(r['line'], r['code']) for r in results], [(1, 400), (2, 503), (3, 503), (4, 201)])
+        self.assertEqual([r['message'] for r in results[1:3]], [message, message])
+
+    def test_export(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        users = [
+            User(
+                id=cast(str, self.faker.uuid4()),
+                client_id=client_id,
+                name=self.faker.name(),
+                email=self.faker.email(),
+                password=pbkdf2_sha256.hash(self.faker.password()),
+            )
+            for _ in range(3)
+        ]
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.iter_by_client).return_value = iter(users)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get(f'/api/v1/users/{client_id}/export')
+
+        cast(Mock, user_repo_mock.iter_by_client).assert_called_once_with(client_id)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'application/x-ndjson')
+        resp_data = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        self.assertEqual(
+            resp_data,
+            [{'id': user.id, 'clientId': user.client_id, 'name': user.name, 'email': user.email} for user in users],
+        )
+
+    def test_export_invalid_client(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get('/api/v1/users/foo/export')
+
+        cast(Mock, user_repo_mock.iter_by_client).assert_not_called()
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data, {'code': 400, 'message': 'Invalid client ID.'})
+
+    def test_list(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        users = [
+            {
+                'id': cast(str, self.faker.uuid4()),
+                'client_id': client_id,
+                'name': self.faker.name(),
+                'email': self.faker.email(),
+            }
+            for _ in range(2)
+        ]
+        next_cursor = self.faker.pystr()
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.list_by_client).return_value = (users, next_cursor)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get(f'/api/v1/users/{client_id}')
+
+        cast(Mock, user_repo_mock.list_by_client).assert_called_once_with(
+            client_id, cursor=None, limit=50, fields=['id', 'client_id', 'name', 'email']
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(
+            resp_data,
+            {
+                'users': [{'id': u['id'], 'clientId': u['client_id'], 'name': u['name'], 'email': u['email']} for u in users],
+                'nextCursor': next_cursor,
+            },
+        )
+
+    def test_list_fields(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        users = [{'email': self.faker.email(), 'id': cast(str, self.faker.uuid4())}]
+        cursor = self.faker.pystr()
+
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.list_by_client).return_value = (users, None)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get(f'/api/v1/users/{client_id}?fields=email,id,email&limit=10&cursor={cursor}')
+
+        cast(Mock, user_repo_mock.list_by_client).assert_called_once_with(
+            client_id, cursor=cursor, limit=10, fields=['email', 'id']
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data, {'users': [{'email': users[0]['email'], 'id': users[0]['id']}], 'nextCursor': None})
+
+    @parametrize(
+        ('query', 'message'),
+        [
+            ('limit=0', 'Invalid value for limit: Must be an integer between 1 and 100.'),
+            ('limit=101', 'Invalid value for limit: Must be an integer between 1 and 100.'),
+            ('limit=foo', 'Invalid value for limit: Must be an integer between 1 and 100.'),
+            ('limit=²', 'Invalid value for limit: Must be an integer between 1 and 100.'),
+            ('fields=name,password', 'Invalid value for fields: Must be a subset of id, clientId, name, email.'),
+            ('fields=', 'Invalid value for fields: Must be a subset of id, clientId, name, email.'),
+        ],
+    )
+    def test_list_invalid_params(self, query: str, message: str) -> None:
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get(f'/api/v1/users/{cast(str, self.faker.uuid4())}?{query}')
+
+        cast(Mock, user_repo_mock.list_by_client).assert_not_called()
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data, {'code': 400, 'message': message})
+
+    def test_list_invalid_client(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get('/api/v1/users/foo')
+
+        cast(Mock, user_repo_mock.list_by_client).assert_not_called()
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data, {'code': 400, 'message': 'Invalid client ID.'})
+
+    def test_list_invalid_cursor(self) -> None:
+        user_repo_mock = Mock(UserRepository)
+        cast(Mock, user_repo_mock.list_by_client).side_effect = InvalidCursorError('foo')
+        with self.app.container.user_repo.override(user_repo_mock):
+            resp = self.client.get(f'/api/v1/users/{cast(str, self.faker.uuid4())}?cursor=foo')
+
+        self.assertEqual(resp.status_code, 400)
+        resp_data = json.loads(resp.get_data())
+
+        self.assertEqual(resp_data, {'code': 400, 'message': 'Invalid value for cursor: Not a valid cursor.'})
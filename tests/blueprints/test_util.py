@@ -0,0 +1,33 @@
+import threading
+from dataclasses import dataclass
+from unittest import TestCase
+
+from blueprints.util import schema_for
+
+
+@dataclass
+class SampleBody:
+    name: str
+
+
+class TestUtil(TestCase):
+    def test_schema_for_cached(self) -> None:
+        schema = schema_for(SampleBody)
+
+        self.assertIs(schema_for(SampleBody), schema)
+        self.assertEqual(schema.load({'name': 'foo'}), SampleBody(name='foo'))
+
+    def test_schema_for_concurrent(self) -> None:
+        @dataclass
+        class ConcurrentBody:
+            value: int
+
+        schemas = []
+        threads = [threading.Thread(target=lambda: schemas.append(schema_for(ConcurrentBody))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(schemas), 8)
+        self.assertTrue(all(schema is schemas[0] for schema in schemas))
@@ -0,0 +1,52 @@
+from typing import cast
+from unittest.mock import Mock
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase
+
+from models import Client
+from repositories import ClientRepository
+from repositories.cache import CachedClientRepository
+
+
+class TestCachedClient(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.inner = Mock(ClientRepository)
+        self.repo = CachedClientRepository(self.inner, maxsize=16, ttl=300, negative_ttl=30)
+
+    def test_get_cached(self) -> None:
+        client = Client(id=cast(str, self.faker.uuid4()), name=self.faker.company())
+        cast(Mock, self.inner.get).return_value = client
+
+        self.assertEqual(self.repo.get(client.id), client)
+        self.assertEqual(self.repo.get(client.id), client)
+
+        cast(Mock, self.inner.get).assert_called_once_with(client.id)
+        stats = self.repo.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    def test_get_not_found_cached_shorter(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        cast(Mock, self.inner.get).return_value = None
+
+        self.repo.cache.clock = Mock(return_value=1000.0)
+        self.assertIsNone(self.repo.get(client_id))
+        self.assertIsNone(self.repo.get(client_id))
+
+        cast(Mock, self.inner.get).assert_called_once_with(client_id)
+
+        self.repo.cache.clock = Mock(return_value=1031.0)
+        self.assertIsNone(self.repo.get(client_id))
+
+        self.assertEqual(cast(Mock, self.inner.get).call_count, 2)
+
+    def test_get_error_not_cached(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        cast(Mock, self.inner.get).side_effect = RuntimeError
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self.repo.get(client_id)
+
+        self.assertEqual(cast(Mock, self.inner.get).call_count, 2)
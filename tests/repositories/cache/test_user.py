@@ -0,0 +1,210 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import cast
+from unittest.mock import Mock
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase
+
+from app import create_container
+from models import User
+from repositories import UserRepository
+from repositories.cache import CachedUserRepository
+
+
+class TestCachedUser(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.inner = Mock(UserRepository)
+        self.repo = CachedUserRepository(self.inner, maxsize=16, ttl=60)
+
+    def gen_user(self) -> User:
+        return User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.unique.email(),
+            password=self.faker.password(),
+        )
+
+    def test_get_cached(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.get).return_value = user
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+        self.assertEqual(self.repo.find_by_email(user.email.upper()), user)
+
+        cast(Mock, self.inner.get).assert_called_once_with(user_id=user.id, client_id=user.client_id)
+        cast(Mock, self.inner.find_by_email).assert_not_called()
+
+    def test_get_not_found_not_cached(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.get).return_value = None
+
+        self.assertIsNone(self.repo.get(user.id, user.client_id))
+        self.assertIsNone(self.repo.get(user.id, user.client_id))
+
+        self.assertEqual(cast(Mock, self.inner.get).call_count, 2)
+
+    def test_ttl(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.get).return_value = user
+
+        self.repo.by_key.clock = Mock(return_value=1000.0)
+        self.repo.get(user.id, user.client_id)
+        self.repo.by_key.clock = Mock(return_value=1061.0)
+        self.repo.get(user.id, user.client_id)
+
+        self.assertEqual(cast(Mock, self.inner.get).call_count, 2)
+
+    def test_find_by_email_cached(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.find_by_email).return_value = user
+
+        self.assertEqual(self.repo.find_by_email(user.email), user)
+        self.assertEqual(self.repo.find_by_email(f' {user.email.upper()} '), user)
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+
+        cast(Mock, self.inner.find_by_email).assert_called_once_with(user.email)
+        cast(Mock, self.inner.get).assert_not_called()
+
+    def test_find_by_email_negative_cache(self) -> None:
+        repo = CachedUserRepository(self.inner, maxsize=16, ttl=60, negative_ttl=10)
+        repo.missing_emails.clock = Mock(return_value=1000.0)
+        user = self.gen_user()
+        cast(Mock, self.inner.find_by_email).return_value = None
+
+        self.assertIsNone(repo.find_by_email(user.email))
+        self.assertIsNone(repo.find_by_email(user.email.upper()))
+        cast(Mock, self.inner.find_by_email).assert_called_once_with(user.email)
+
+        repo.missing_emails.clock = Mock(return_value=1010.0)
+        self.assertIsNone(repo.find_by_email(user.email))
+        self.assertEqual(cast(Mock, self.inner.find_by_email).call_count, 2)
+
+        # A user created through this repository is visible right away
+        repo.create(user)
+        cast(Mock, self.inner.find_by_email).return_value = user
+        self.assertEqual(repo.find_by_email(user.email), user)
+
+    def test_find_by_email_negative_cache_disabled(self) -> None:
+        cast(Mock, self.inner.find_by_email).return_value = None
+        email = self.faker.email()
+
+        self.repo.find_by_email(email)
+        self.repo.find_by_email(email)
+
+        self.assertEqual(cast(Mock, self.inner.find_by_email).call_count, 2)
+        self.assertEqual(self.repo.stats()[2].size, 0)
+
+    def test_get_many(self) -> None:
+        users = [self.gen_user() for _ in range(3)]
+        cast(Mock, self.inner.get).return_value = users[0]
+        cast(Mock, self.inner.get_many).return_value = users[1:]
+        self.repo.get(users[0].id, users[0].client_id)
+
+        keys = [(user.client_id, user.id) for user in users]
+        self.assertEqual(self.repo.get_many(keys), users)
+        self.assertEqual(self.repo.get_many(keys), users)
+
+        cast(Mock, self.inner.get_many).assert_called_once_with(keys[1:])
+
+    def test_create_invalidates(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.find_by_email).return_value = user
+        self.repo.find_by_email(user.email)
+
+        self.repo.create(user)
+
+        cast(Mock, self.inner.create).assert_called_once_with(user)
+        self.assertIsNone(self.repo.by_key.lookup((user.client_id, user.id)))
+        self.assertIsNone(self.repo.by_email.lookup(user.email))
+
+    def test_update_password_invalidates(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.find_by_email).return_value = user
+        self.repo.find_by_email(user.email)
+
+        self.repo.update_password(user, 'new-hash')
+
+        cast(Mock, self.inner.update_password).assert_called_once_with(user, 'new-hash')
+        self.assertIsNone(self.repo.by_key.lookup((user.client_id, user.id)))
+        self.assertIsNone(self.repo.by_email.lookup(user.email))
+
+    def test_create_many_invalidates(self) -> None:
+        users = [self.gen_user() for _ in range(2)]
+        cast(Mock, self.inner.get_many).return_value = users
+        cast(Mock, self.inner.create_many).return_value = []
+        self.repo.get_many([(user.client_id, user.id) for user in users])
+
+        self.assertEqual(self.repo.create_many(users), [])
+
+        self.assertEqual(self.repo.stats()[0].size, 0)
+        self.assertEqual(self.repo.stats()[1].size, 0)
+
+    def test_delete_all_clears(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.get).return_value = user
+        cast(Mock, self.inner.delete_all).return_value = {'users': 1}
+        self.repo.get(user.id, user.client_id)
+
+        self.assertEqual(self.repo.delete_all(), {'users': 1})
+
+        self.repo.get(user.id, user.client_id)
+        self.assertEqual(cast(Mock, self.inner.get).call_count, 2)
+
+    def test_negative_cache_off_by_default(self) -> None:
+        container = create_container()
+        container.config.user.storage.override('memory')
+        user = self.gen_user()
+
+        self.assertIsNone(container.user_repo().find_by_email(user.email))
+        # Created by another instance, so the cache is not invalidated
+        container.user_store().create(user)
+
+        self.assertEqual(container.user_repo().find_by_email(user.email), user)
+
+    def test_read_during_invalidation_not_cached(self) -> None:
+        user = self.gen_user()
+
+        def get(**_kwargs: str) -> User:
+            self.repo.delete_all()
+            return user
+
+        cast(Mock, self.inner.get).side_effect = get
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+        self.assertEqual(self.repo.stats()[0].size, 0)
+
+    def test_concurrent_misses_single_read(self) -> None:
+        user = self.gen_user()
+        started = threading.Event()
+        release = threading.Event()
+
+        def get(**_kwargs: str) -> User:
+            started.set()
+            release.wait(5)
+            return user
+
+        cast(Mock, self.inner.get).side_effect = get
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            first = executor.submit(self.repo.get, user.id, user.client_id)
+            started.wait(5)
+            others = [executor.submit(self.repo.get, user.id, user.client_id) for _ in range(7)]
+            release.set()
+
+            self.assertEqual([f.result(5) for f in [first, *others]], [user] * 8)
+
+        cast(Mock, self.inner.get).assert_called_once()
+
+    def test_delegates_listing(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        cast(Mock, self.inner.list_by_client).return_value = ([], None)
+        cast(Mock, self.inner.iter_by_client).return_value = iter([])
+
+        self.assertEqual(self.repo.list_by_client(client_id, limit=10), ([], None))
+        self.assertEqual(list(self.repo.iter_by_client(client_id)), [])
+
+        cast(Mock, self.inner.list_by_client).assert_called_once_with(client_id, cursor=None, limit=10, fields=None)
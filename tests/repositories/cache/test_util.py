@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from repositories.cache import CacheStats, SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_hit_and_miss(self) -> None:
+        self.assertIsNone(self.cache.lookup('a'))
+
+        self.cache.set('a', 1)
+        entry = self.cache.lookup('a')
+
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.value if entry is not None else None, 1)
+        self.assertEqual(self.cache.stats(), CacheStats(hits=1, misses=1, evictions=0, size=1))
+
+    def test_expiry(self) -> None:
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=1)
+
+        self.clock.now = 5
+        self.assertIsNone(self.cache.lookup('b'))
+        self.assertIsNotNone(self.cache.lookup('a'))
+
+        self.clock.now = 10
+        self.assertIsNone(self.cache.lookup('a'))
+        self.assertEqual(self.cache.stats().size, 0)
+
+    def test_lru_eviction(self) -> None:
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.lookup('a')
+        self.cache.set('c', 3)
+
+        self.assertIsNone(self.cache.lookup('b'))
+        self.assertIsNotNone(self.cache.lookup('a'))
+        self.assertIsNotNone(self.cache.lookup('c'))
+        self.assertEqual(self.cache.stats().evictions, 1)
+
+    def test_delete_and_clear(self) -> None:
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.lookup('a'))
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.lookup('b'))
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_calls_share_result(self) -> None:
+        flight: SingleFlight[str, int] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = 0
+
+        def fn() -> int:
+            nonlocal calls
+            calls += 1
+            started.set()
+            release.wait(5)
+            return 42
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(flight.do, 'a', fn)
+            started.wait(5)
+            followers = [executor.submit(flight.do, 'a', fn) for _ in range(3)]
+            release.set()
+
+            self.assertEqual([f.result(5) for f in [leader, *followers]], [42] * 4)
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.do('a', lambda: 7), 7)
+
+    def test_error_propagates(self) -> None:
+        flight: SingleFlight[str, int] = SingleFlight()
+
+        def fn() -> int:
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            flight.do('a', fn)
+
+        self.assertEqual(flight.do('a', lambda: 1), 1)
@@ -0,0 +1,218 @@
+import os
+import time
+from dataclasses import replace
+from datetime import UTC, datetime
+from typing import Any, cast
+from unittest import TestCase, skipUnless
+from unittest.mock import Mock, patch
+
+import requests
+from faker import Faker
+from google.cloud.firestore_v1.watch import ChangeType
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from models import User
+from repositories import UserRepository
+from repositories.firestore import FirestoreUserIndex, FirestoreUserRepository, IndexedUserRepository
+from repositories.firestore.index import RESTART_INTERVAL
+
+FIRESTORE_DATABASE = '(default)'
+
+
+def user_change(change_type: ChangeType, user: User) -> Mock:
+    doc = Mock()
+    doc.id = user.id
+    doc.reference.parent.parent.id = user.client_id
+    doc.to_dict.return_value = {'name': user.name, 'email': user.email, 'password': user.password}
+
+    return Mock(type=change_type, document=doc)
+
+
+class TestFirestoreUserIndex(TestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.now = 1000.0
+
+        patcher = patch('repositories.firestore.index.FirestoreClient')
+        self.client_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.watch = self.client_mock.return_value.collection_group.return_value.on_snapshot.return_value
+        self.watch.is_active = True
+
+        self.index = FirestoreUserIndex(FIRESTORE_DATABASE, clock=lambda: self.now)
+        self.callback = self.client_mock.return_value.collection_group.return_value.on_snapshot.call_args[0][0]
+
+    def gen_user(self, **kwargs: Any) -> User:  # noqa: ANN401
+        return User(
+            **{
+                'id': cast(str, self.faker.uuid4()),
+                'client_id': cast(str, self.faker.uuid4()),
+                'name': self.faker.name(),
+                'email': self.faker.unique.email(),
+                'password': self.faker.password(),
+                **kwargs,
+            }
+        )
+
+    def test_not_ready_until_synced(self) -> None:
+        self.client_mock.return_value.collection_group.assert_called_once_with('users')
+        self.assertFalse(self.index.ready())
+
+        self.callback([], [], datetime.fromtimestamp(self.now, UTC))
+
+        self.assertTrue(self.index.ready())
+
+    def test_apply_changes(self) -> None:
+        user1 = self.gen_user()
+        user2 = self.gen_user()
+        self.callback([], [user_change(ChangeType.ADDED, user1), user_change(ChangeType.ADDED, user2)], datetime.now(UTC))
+
+        self.assertEqual(self.index.get(user1.id, user1.client_id), user1)
+        self.assertEqual(self.index.find_by_email(user2.email.upper()), user2)
+
+        user1_changed = self.gen_user(id=user1.id, client_id=user1.client_id)
+        self.callback(
+            [], [user_change(ChangeType.MODIFIED, user1_changed), user_change(ChangeType.REMOVED, user2)], datetime.now(UTC)
+        )
+
+        self.assertEqual(self.index.get(user1.id, user1.client_id), user1_changed)
+        self.assertIsNone(self.index.find_by_email(user1.email))
+        self.assertEqual(self.index.find_by_email(user1_changed.email), user1_changed)
+        self.assertIsNone(self.index.get(user2.id, user2.client_id))
+        self.assertIsNone(self.index.find_by_email(user2.email))
+        self.assertEqual(self.index.stats().size, 1)
+
+    def test_lag(self) -> None:
+        self.callback([], [], datetime.fromtimestamp(self.now - 2.5, UTC))
+        self.callback([], [], datetime.fromtimestamp(self.now - 0.5, UTC))
+
+        stats = self.index.stats()
+        self.assertEqual(stats.lag, 0.5)
+        self.assertEqual(stats.max_lag, 2.5)
+        self.assertTrue(stats.active)
+        self.assertTrue(stats.synced)
+
+    def test_restart_when_inactive(self) -> None:
+        self.callback([], [user_change(ChangeType.ADDED, self.gen_user())], datetime.now(UTC))
+        self.watch.is_active = False
+
+        self.assertFalse(self.index.ready())
+        self.assertEqual(self.index.stats().restarts, 0)
+
+        self.now += RESTART_INTERVAL
+        self.assertFalse(self.index.ready())
+
+        self.watch.unsubscribe.assert_called_once()
+        self.assertEqual(self.client_mock.return_value.collection_group.return_value.on_snapshot.call_count, 2)
+        stats = self.index.stats()
+        self.assertEqual((stats.restarts, stats.size, stats.synced), (1, 0, False))
+
+
+class TestIndexedUserRepository(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.index = Mock(FirestoreUserIndex)
+        self.fallback = Mock(UserRepository)
+        self.repo = IndexedUserRepository(self.index, self.fallback)
+        self.user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+
+    @parametrize(
+        'ready',
+        [
+            (True,),
+            (False,),
+        ],
+    )
+    def test_reads(self, ready: bool) -> None:  # noqa: FBT001
+        cast(Mock, self.index.ready).return_value = ready
+        source = self.index if ready else self.fallback
+        cast(Mock, source.get).return_value = self.user
+        cast(Mock, source.find_by_email).return_value = self.user
+        cast(Mock, self.fallback.get_many).return_value = [self.user]
+
+        self.assertEqual(self.repo.get(self.user.id, self.user.client_id), self.user)
+        self.assertEqual(self.repo.find_by_email(self.user.email), self.user)
+        self.assertEqual(self.repo.get_many([(self.user.client_id, self.user.id)]), [self.user])
+
+        cast(Mock, source.get).assert_called_with(user_id=self.user.id, client_id=self.user.client_id)
+        cast(Mock, source.find_by_email).assert_called_once_with(self.user.email)
+
+    def test_get_many_missing(self) -> None:
+        cast(Mock, self.index.ready).return_value = True
+        cast(Mock, self.index.get).return_value = None
+
+        self.assertEqual(self.repo.get_many([(self.user.client_id, self.user.id)]), [])
+
+    def test_writes_applied_to_index(self) -> None:
+        other = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=self.user.client_id,
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+        cast(Mock, self.fallback.create_many).return_value = [other]
+        cast(Mock, self.fallback.delete_all).return_value = {'users': 2}
+
+        self.repo.create(self.user)
+        self.assertEqual(self.repo.create_many([self.user, other]), [other])
+        self.assertEqual(self.repo.delete_all(), {'users': 2})
+
+        cast(Mock, self.fallback.create).assert_called_once_with(self.user)
+        self.assertEqual(cast(Mock, self.index.put).call_args_list, [((self.user,),), ((self.user,),)])
+        cast(Mock, self.index.clear).assert_called_once()
+
+    def test_update_password(self) -> None:
+        password_hash = self.faker.pystr()
+        self.repo.update_password(self.user, password_hash)
+
+        cast(Mock, self.fallback.update_password).assert_called_once_with(self.user, password_hash)
+        cast(Mock, self.index.put).assert_called_once_with(replace(self.user, password=password_hash))
+
+
+@skipUnless('FIRESTORE_EMULATOR_HOST' in os.environ, 'Firestore emulator not available')
+class TestFirestoreUserIndexEmulator(TestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+
+        requests.delete(
+            f'http://{os.environ["FIRESTORE_EMULATOR_HOST"]}/emulator/v1/projects/google-cloud-firestore-emulator/databases/{FIRESTORE_DATABASE}/documents',
+            timeout=5,
+        )
+
+        self.repo = FirestoreUserRepository(FIRESTORE_DATABASE)
+        self.index = FirestoreUserIndex(FIRESTORE_DATABASE)
+        self.addCleanup(self.index.close)
+
+    def wait_for(self, condition: Any) -> None:  # noqa: ANN401
+        deadline = time.monotonic() + 10
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Timed out waiting for the user index')
+            time.sleep(0.05)
+
+    def test_follows_changes(self) -> None:
+        self.wait_for(self.index.ready)
+
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+        self.repo.create(user)
+
+        self.wait_for(lambda: self.index.find_by_email(user.email) == user)
+        self.assertEqual(self.index.get(user.id, user.client_id), user)
+        self.assertIsNotNone(self.index.stats().lag)
+
+        self.repo.delete_all()
+
+        self.wait_for(lambda: self.index.get(user.id, user.client_id) is None)
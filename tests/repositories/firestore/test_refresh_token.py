@@ -0,0 +1,80 @@
+import os
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from typing import cast
+from unittest import TestCase, skipUnless
+
+import requests
+from faker import Faker
+
+from models import RefreshToken
+from repositories.errors import RefreshTokenReusedError
+from repositories.firestore import FirestoreRefreshTokenRepository
+
+FIRESTORE_DATABASE = '(default)'
+
+
+@skipUnless('FIRESTORE_EMULATOR_HOST' in os.environ, 'Firestore emulator not available')
+class TestRefreshToken(TestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+
+        requests.delete(
+            f'http://{os.environ["FIRESTORE_EMULATOR_HOST"]}/emulator/v1/projects/google-cloud-firestore-emulator/databases/{FIRESTORE_DATABASE}/documents',
+            timeout=5,
+        )
+
+        self.repo = FirestoreRefreshTokenRepository(FIRESTORE_DATABASE)
+        self.now = datetime.now(UTC)
+        self.token = RefreshToken(
+            id=self.faker.pystr(),
+            client_id=cast(str, self.faker.uuid4()),
+            user_id=cast(str, self.faker.uuid4()),
+            family_id=cast(str, self.faker.uuid4()),
+            email=self.faker.email(),
+            expires_at=self.now + timedelta(days=1),
+        )
+        self.repo.create(self.token)
+
+    def rotate(self, token_id: str, new_token_id: str) -> RefreshToken | None:
+        return self.repo.rotate(
+            token_id,
+            client_id=self.token.client_id,
+            user_id=self.token.user_id,
+            new_token_id=new_token_id,
+            expires_at=self.now + timedelta(days=2),
+        )
+
+    def test_rotate(self) -> None:
+        new_id = self.faker.pystr()
+        new_token = self.rotate(self.token.id, new_id)
+
+        self.assertIsNotNone(new_token)
+        new_token = cast(RefreshToken, new_token)
+        self.assertEqual(new_token.id, new_id)
+        self.assertEqual(new_token.family_id, self.token.family_id)
+        self.assertEqual(new_token.email, self.token.email)
+        self.assertEqual(new_token.expires_at, self.now + timedelta(days=2))
+
+        # The replacement can be rotated in turn
+        self.assertIsNotNone(self.rotate(new_id, self.faker.pystr()))
+
+    def test_rotate_unknown(self) -> None:
+        self.assertIsNone(self.rotate(self.faker.pystr(), self.faker.pystr()))
+
+    def test_rotate_expired(self) -> None:
+        expired = replace(self.token, id=self.faker.pystr(), expires_at=self.now - timedelta(seconds=1))
+        self.repo.create(expired)
+
+        self.assertIsNone(self.rotate(expired.id, self.faker.pystr()))
+
+    def test_reuse_revokes_family(self) -> None:
+        new_id = self.faker.pystr()
+        self.rotate(self.token.id, new_id)
+
+        with self.assertRaises(RefreshTokenReusedError) as ctx:
+            self.rotate(self.token.id, self.faker.pystr())
+
+        self.assertEqual(ctx.exception.family_id, self.token.family_id)
+        self.assertEqual(self.repo.revoke_family(self.token.client_id, self.token.user_id, self.token.family_id), 2)
+        self.assertIsNone(self.rotate(new_id, self.faker.pystr()))
@@ -1,7 +1,8 @@
 import os
-from dataclasses import asdict
-from typing import cast
+from dataclasses import asdict, replace
+from typing import Any, cast
 from unittest import skipUnless
+from unittest.mock import patch
 
 import requests
 from faker import Faker
@@ -11,8 +12,9 @@ from passlib.hash import pbkdf2_sha256
 from unittest_parametrize import ParametrizedTestCase, parametrize
 
 from models import User
-from repositories.errors import DuplicateEmailError
+from repositories.errors import DuplicateEmailError, InvalidCursorError
 from repositories.firestore import FirestoreUserRepository
+from repositories.firestore.user import email_doc_id
 
 FIRESTORE_DATABASE = '(default)'
 
@@ -33,51 +35,147 @@ class TestUser(ParametrizedTestCase):
 
         self.emails = [self.faker.unique.email() for _ in range(4)]
 
+    def add_user(self, client_id: str, email: str) -> User:
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=client_id,
+            name=self.faker.name(),
+            email=email,
+            password=pbkdf2_sha256.hash(self.faker.password()),
+        )
+        user_dict = asdict(user)
+        del user_dict['id']
+        del user_dict['client_id']
+        self.client.collection('clients').document(client_id).collection('users').document(user.id).set(user_dict)
+
+        return user
+
     @parametrize(
-        ('email_idx_map', 'find_idx', 'expected'),
+        ('find_idx', 'expected'),
         [
-            ({0: 0, 1: 1, 2: 2}, 0, 0),  # User found
-            ({0: 0, 1: 1, 2: 2}, 3, None),  # User not found
-            ({0: 0, 1: 0, 2: 2}, 0, None),  # Multiple users found
+            (0, 0),  # User found
+            (3, None),  # User not found
         ],
     )
-    def test_find_by_email(self, email_idx_map: dict[int, int], find_idx: int, expected: int | None) -> None:
+    def test_find_by_email(self, find_idx: int, expected: int | None) -> None:
         client_id = cast(str, self.faker.uuid4())
-        self.client.collection('clients').document(client_id).set({})
 
         users: list[User] = []
-        for idx, _ in enumerate(range(3)):
+        for idx in range(3):
             user = User(
                 id=cast(str, self.faker.uuid4()),
                 client_id=client_id,
                 name=self.faker.name(),
-                email=self.emails[email_idx_map[idx]],
+                email=self.emails[idx],
                 password=pbkdf2_sha256.hash(self.faker.password()),
             )
             users.append(user)
-            user_dict = asdict(user)
-            del user_dict['id']
-            del user_dict['client_id']
-            self.client.collection('clients').document(client_id).collection('users').document(user.id).set(user_dict)
+            self.repo.create(user)
 
-        duplicate_emails = len(set(email_idx_map.values())) != len(email_idx_map)
-
-        if duplicate_emails:
-            with self.assertLogs() as cm:
-                user_db = self.repo.find_by_email(self.emails[find_idx])
-        else:
-            with self.assertNoLogs():
-                user_db = self.repo.find_by_email(self.emails[find_idx])
+        with self.assertNoLogs():
+            user_db = self.repo.find_by_email(self.emails[find_idx])
 
         if expected is not None:
-            self.assertIsNotNone(user_db)
             self.assertEqual(user_db, users[expected])
         else:
             self.assertIsNone(user_db)
 
-            if duplicate_emails:
-                self.assertEqual(cm.records[0].message, f'Multiple users found with email {self.emails[find_idx]}')
-                self.assertEqual(cm.records[0].levelname, 'ERROR')
+    def test_find_by_email_normalized(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=client_id,
+            name=self.faker.name(),
+            email=self.emails[0],
+            password=pbkdf2_sha256.hash(self.faker.password()),
+        )
+        self.repo.create(user)
+
+        self.assertEqual(self.repo.find_by_email(f' {self.emails[0].upper()} '), user)
+
+    def test_find_by_email_same_reads(self) -> None:
+        # A known email reads the lookup and the user, an unknown one the lookup and a missing user
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.emails[0],
+            password=pbkdf2_sha256.hash(self.faker.password()),
+        )
+        self.repo.create(user)
+
+        with patch.object(self.repo, '_user_ref', wraps=self.repo._user_ref) as user_ref:  # noqa: SLF001
+            self.assertEqual(self.repo.find_by_email(self.emails[0]), user)
+            self.assertIsNone(self.repo.find_by_email(self.emails[1]))
+
+        self.assertEqual(user_ref.call_count, 2)
+
+    def test_find_by_email_stale_lookup(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        self.client.collection('emails').document(email_doc_id(self.emails[0])).set(
+            {'client_id': client_id, 'user_id': cast(str, self.faker.uuid4())}
+        )
+
+        with self.assertLogs() as cm:
+            user_db = self.repo.find_by_email(self.emails[0])
+
+        self.assertIsNone(user_db)
+        self.assertEqual(cm.records[0].message, f'Email lookup for {self.emails[0]} points to a missing user')
+        self.assertEqual(cm.records[0].levelname, 'ERROR')
+
+    def test_backfill_email_index(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        self.client.collection('clients').document(client_id).set({})
+
+        user1 = self.add_user(client_id, self.emails[0])
+        user2 = self.add_user(client_id, self.emails[1])
+        self.add_user(client_id, self.emails[2])
+        self.add_user(client_id, self.emails[2])
+
+        with self.assertLogs() as cm:
+            written, conflicts = self.repo.backfill_email_index()
+
+        self.assertEqual(written, 2)
+        self.assertEqual(conflicts, [self.emails[2]])
+        self.assertEqual(cm.records[0].message, f'Multiple users found with email {self.emails[2]}')
+
+        self.assertEqual(self.repo.find_by_email(user1.email), user1)
+        self.assertEqual(self.repo.find_by_email(user2.email), user2)
+        self.assertIsNone(self.repo.find_by_email(self.emails[2]))
+
+    def test_find_by_email_fallback(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        user = self.add_user(client_id, self.emails[0])
+        fallback_repo = FirestoreUserRepository(FIRESTORE_DATABASE, email_fallback=True)
+
+        self.assertIsNone(self.repo.find_by_email(user.email))
+        self.assertEqual(fallback_repo.find_by_email(user.email), user)
+        self.assertIsNone(fallback_repo.find_by_email(self.emails[1]))
+
+        # Indexed by the first lookup
+        self.assertEqual(self.repo.find_by_email(user.email), user)
+
+    def test_find_by_email_fallback_case_conflict(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        lower = self.add_user(client_id, self.emails[0].lower())
+        upper = self.add_user(client_id, self.emails[0].upper())
+        fallback_repo = FirestoreUserRepository(FIRESTORE_DATABASE, email_fallback=True)
+
+        self.assertEqual(fallback_repo.find_by_email(lower.email), lower)
+        self.assertEqual(fallback_repo.find_by_email(upper.email), upper)
+        self.assertEqual(fallback_repo.find_by_email(lower.email), lower)
+
+    def test_create_duplicate_fallback(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        existing = self.add_user(client_id, self.emails[0])
+        fallback_repo = FirestoreUserRepository(FIRESTORE_DATABASE, email_fallback=True)
+        user = replace(existing, id=cast(str, self.faker.uuid4()))
+
+        with self.assertRaises(DuplicateEmailError):
+            fallback_repo.create(user)
+
+        self.assertEqual(fallback_repo.create_many([user]), [user])
+        self.assertIsNone(self.repo.get(user.id, client_id))
 
     def test_get_found(self) -> None:
         client_id = cast(str, self.faker.uuid4())
@@ -99,6 +197,76 @@ class TestUser(ParametrizedTestCase):
 
         self.assertEqual(user_db, user)
 
+    def test_get_many(self) -> None:
+        client_ids = [cast(str, self.faker.uuid4()) for _ in range(2)]
+        users = [self.add_user(client_id, self.faker.unique.email()) for client_id in client_ids for _ in range(2)]
+
+        missing = (cast(str, self.faker.uuid4()), cast(str, self.faker.uuid4()))
+        keys = [(user.client_id, user.id) for user in users]
+
+        users_db = self.repo.get_many([*keys, missing, keys[0]])
+
+        self.assertEqual(sorted(users_db, key=lambda u: u.id), sorted(users, key=lambda u: u.id))
+        self.assertEqual(self.repo.get_many([]), [])
+
+    @parametrize(
+        'count',
+        [
+            (0,),
+            (2,),
+            (5,),
+        ],
+    )
+    def test_iter_by_client(self, count: int) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        users = [self.add_user(client_id, self.faker.unique.email()) for _ in range(count)]
+        self.add_user(cast(str, self.faker.uuid4()), self.faker.unique.email())
+
+        with patch('repositories.firestore.user.EXPORT_PAGE_SIZE', 2):
+            users_db = list(self.repo.iter_by_client(client_id))
+
+        self.assertEqual(users_db, sorted(users, key=lambda u: u.id))
+
+    def test_list_by_client(self) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        users = sorted([self.add_user(client_id, self.faker.unique.email()) for _ in range(5)], key=lambda u: u.id)
+        self.add_user(cast(str, self.faker.uuid4()), self.faker.unique.email())
+
+        pages: list[list[dict[str, Any]]] = []
+        cursor = None
+        while True:
+            page, cursor = self.repo.list_by_client(client_id, cursor=cursor, limit=2)
+            pages.append(page)
+            if cursor is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [user for page in pages for user in page],
+            [{'id': u.id, 'client_id': u.client_id, 'name': u.name, 'email': u.email} for u in users],
+        )
+
+    @parametrize(
+        'fields',
+        [
+            (['email'],),
+            (['id', 'client_id'],),
+            (['name', 'id'],),
+        ],
+    )
+    def test_list_by_client_fields(self, fields: list[str]) -> None:
+        client_id = cast(str, self.faker.uuid4())
+        user = self.add_user(client_id, self.faker.unique.email())
+
+        page, cursor = self.repo.list_by_client(client_id, fields=fields)
+
+        self.assertIsNone(cursor)
+        self.assertEqual(page, [{f: getattr(user, f) for f in fields}])
+
+    def test_list_by_client_invalid_cursor(self) -> None:
+        with self.assertRaises(InvalidCursorError):
+            self.repo.list_by_client(cast(str, self.faker.uuid4()), cursor='foo')
+
     def test_get_not_found(self) -> None:
         client_id = cast(str, self.faker.uuid4())
         user_id = cast(str, self.faker.uuid4())
@@ -133,6 +301,9 @@ class TestUser(ParametrizedTestCase):
         del user_dict['client_id']
         self.assertEqual(doc.to_dict(), user_dict)
 
+        lookup = self.client.collection('emails').document(email_doc_id(user.email)).get()
+        self.assertEqual(lookup.to_dict(), {'client_id': client_id, 'user_id': user.id})
+
     def test_create_duplicate(self) -> None:
         client_id = cast(str, self.faker.uuid4())
         self.client.collection('clients').document(client_id).set({})
@@ -144,16 +315,13 @@ class TestUser(ParametrizedTestCase):
             email=self.faker.unique.email(),
             password=pbkdf2_sha256.hash(self.faker.password()),
         )
-        user_dict = asdict(user1)
-        del user_dict['id']
-        del user_dict['client_id']
-        self.client.collection('clients').document(client_id).collection('users').document(user1.id).set(user_dict)
+        self.repo.create(user1)
 
         user2 = User(
             id=cast(str, self.faker.uuid4()),
             client_id=client_id,
             name=self.faker.name(),
-            email=user1.email,
+            email=user1.email.upper(),
             password=pbkdf2_sha256.hash(self.faker.password()),
         )
 
@@ -169,6 +337,50 @@ class TestUser(ParametrizedTestCase):
         doc = user_ref.get()
         self.assertFalse(doc.exists)
 
+    def test_create_many(self) -> None:
+        client_ids = [cast(str, self.faker.uuid4()) for _ in range(2)]
+        existing = self.add_user(client_ids[0], self.faker.unique.email())
+        self.client.collection('emails').document(email_doc_id(existing.email)).set(
+            {'client_id': client_ids[0], 'user_id': existing.id}
+        )
+
+        users = [
+            User(
+                id=cast(str, self.faker.uuid4()),
+                client_id=client_ids[i % 2],
+                name=self.faker.name(),
+                email=self.faker.unique.email(),
+                password=pbkdf2_sha256.hash(self.faker.password()),
+            )
+            for i in range(300)
+        ]
+        taken_existing = replace(users[10], email=existing.email.upper())
+        taken_in_list = replace(users[20], id=cast(str, self.faker.uuid4()), email=users[5].email)
+        users[10] = taken_existing
+        users.append(taken_in_list)
+
+        rejected = self.repo.create_many(users)
+
+        self.assertEqual(rejected, [taken_existing, taken_in_list])
+        self.assertTrue(self.client.collection('clients').document(client_ids[1]).get().exists)
+
+        for user in users:
+            if user in rejected:
+                continue
+
+            self.assertEqual(self.repo.get(user.id, user.client_id), user)
+            self.assertEqual(self.repo.find_by_email(user.email), user)
+
+        self.assertIsNone(self.repo.get(taken_in_list.id, taken_in_list.client_id))
+
+    def test_update_password(self) -> None:
+        password_hash = self.faker.pystr()
+        user = self.add_user(cast(str, self.faker.uuid4()), self.faker.unique.email())
+
+        self.repo.update_password(user, password_hash)
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), replace(user, password=password_hash))
+
     def test_delete_all(self) -> None:
         users: list[User] = []
 
@@ -186,12 +398,13 @@ class TestUser(ParametrizedTestCase):
                     password=pbkdf2_sha256.hash(self.faker.password()),
                 )
                 users.append(user)
-                user_dict = asdict(user)
-                del user_dict['id']
-                del user_dict['client_id']
-                self.client.collection('clients').document(client_id).collection('users').document(user.id).set(user_dict)
+                self.repo.create(user)
+
+        deleted = self.repo.delete_all()
 
-        self.repo.delete_all()
+        self.assertEqual(deleted, {'clients': 3, 'users': 9, 'emails': 9})
+        self.assertEqual(len(self.client.collection('emails').get()), 0)
+        self.assertEqual(len(self.client.collection('clients').get()), 0)
 
         for user in users:
             user_ref = cast(
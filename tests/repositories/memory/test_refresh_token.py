@@ -0,0 +1,64 @@
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from typing import cast
+from unittest import TestCase
+
+from faker import Faker
+
+from models import RefreshToken
+from repositories.errors import RefreshTokenReusedError
+from repositories.memory import InMemoryRefreshTokenRepository
+
+
+class TestInMemoryRefreshToken(TestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.repo = InMemoryRefreshTokenRepository()
+        self.token = RefreshToken(
+            id=self.faker.pystr(),
+            client_id=cast(str, self.faker.uuid4()),
+            user_id=cast(str, self.faker.uuid4()),
+            family_id=cast(str, self.faker.uuid4()),
+            email=self.faker.email(),
+            expires_at=datetime.now(UTC) + timedelta(days=1),
+        )
+        self.repo.create(self.token)
+
+    def rotate(self, token_id: str, new_token_id: str) -> RefreshToken | None:
+        return self.repo.rotate(
+            token_id,
+            client_id=self.token.client_id,
+            user_id=self.token.user_id,
+            new_token_id=new_token_id,
+            expires_at=datetime.now(UTC) + timedelta(days=1),
+        )
+
+    def test_rotate(self) -> None:
+        new_id = self.faker.pystr()
+        new_token = self.rotate(self.token.id, new_id)
+
+        self.assertEqual(cast(RefreshToken, new_token).id, new_id)
+        self.assertEqual(cast(RefreshToken, new_token).family_id, self.token.family_id)
+        self.assertIsNone(self.rotate(self.faker.pystr(), self.faker.pystr()))
+
+    def test_rotate_expired(self) -> None:
+        expired = replace(self.token, id=self.faker.pystr(), expires_at=datetime.now(UTC) - timedelta(seconds=1))
+        self.repo.create(expired)
+
+        self.assertIsNone(self.rotate(expired.id, self.faker.pystr()))
+
+    def test_reuse_revokes_family(self) -> None:
+        new_id = self.faker.pystr()
+        self.rotate(self.token.id, new_id)
+
+        with self.assertRaises(RefreshTokenReusedError):
+            self.rotate(self.token.id, self.faker.pystr())
+
+        self.assertEqual(self.repo.revoke_family(self.token.client_id, self.token.user_id, self.token.family_id), 2)
+        self.assertIsNone(self.rotate(new_id, self.faker.pystr()))
+
+    def test_delete_all(self) -> None:
+        self.assertEqual(self.repo.delete_all(), {'refresh_tokens': 1})
+
+        self.assertIsNone(self.rotate(self.token.id, self.faker.pystr()))
+        self.assertEqual(self.repo.delete_all(), {})
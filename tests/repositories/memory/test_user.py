@@ -0,0 +1,131 @@
+import threading
+from dataclasses import replace
+from typing import cast
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase
+
+from app import create_container
+from models import User
+from repositories.errors import DuplicateEmailError, InvalidCursorError
+from repositories.memory import InMemoryUserRepository
+from services import InstrumentedUserRepository
+
+
+class TestInMemoryUser(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.repo = InMemoryUserRepository()
+        self.client_id = cast(str, self.faker.uuid4())
+
+    def gen_user(self, client_id: str | None = None) -> User:
+        return User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=client_id or self.client_id,
+            name=self.faker.name(),
+            email=self.faker.unique.email(),
+            password=self.faker.password(),
+        )
+
+    def test_create_get(self) -> None:
+        user = self.gen_user()
+        self.repo.create(user)
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+        self.assertIsNone(self.repo.get(user.id, cast(str, self.faker.uuid4())))
+        self.assertEqual(self.repo.find_by_email(f' {user.email.upper()} '), user)
+        self.assertIsNone(self.repo.find_by_email(self.faker.unique.email()))
+
+    def test_create_duplicate_email(self) -> None:
+        user = self.gen_user()
+        self.repo.create(user)
+
+        with self.assertRaises(DuplicateEmailError):
+            self.repo.create(replace(self.gen_user(), email=user.email.upper()))
+
+    def test_get_many(self) -> None:
+        users = [self.gen_user() for _ in range(3)]
+        self.repo.create_many(users)
+        keys = [(user.client_id, user.id) for user in users]
+
+        self.assertEqual(self.repo.get_many([*keys, keys[0], (self.client_id, cast(str, self.faker.uuid4()))]), users)
+
+    def test_create_many_rejects_taken_emails(self) -> None:
+        existing = self.gen_user()
+        self.repo.create(existing)
+        users = [self.gen_user() for _ in range(3)]
+        taken = replace(self.gen_user(), email=existing.email)
+        repeated = replace(self.gen_user(), email=users[0].email)
+
+        self.assertEqual(self.repo.create_many([*users, taken, repeated]), [taken, repeated])
+        self.assertEqual(self.repo.find_by_email(existing.email), existing)
+        self.assertEqual(self.repo.find_by_email(users[0].email), users[0])
+
+    def test_list_by_client(self) -> None:
+        users = sorted([self.gen_user() for _ in range(5)], key=lambda u: u.id)
+        self.repo.create_many([*users, self.gen_user(cast(str, self.faker.uuid4()))])
+
+        page, cursor = self.repo.list_by_client(self.client_id, limit=2, fields=['id', 'email'])
+        self.assertEqual(page, [{'id': u.id, 'email': u.email} for u in users[:2]])
+
+        listed = [u['id'] for u in page]
+        while cursor is not None:
+            page, cursor = self.repo.list_by_client(self.client_id, cursor=cursor, limit=2)
+            listed.extend(u['id'] for u in page)
+
+        self.assertEqual(listed, [u.id for u in users])
+        self.assertEqual(set(page[0]), {'id', 'client_id', 'name', 'email'})
+        self.assertEqual(self.repo.list_by_client(cast(str, self.faker.uuid4())), ([], None))
+
+        with self.assertRaises(InvalidCursorError):
+            self.repo.list_by_client(self.client_id, cursor='!')
+
+    def test_iter_by_client(self) -> None:
+        users = [self.gen_user() for _ in range(3)]
+        self.repo.create_many(users)
+
+        self.assertEqual(list(self.repo.iter_by_client(self.client_id)), sorted(users, key=lambda u: u.id))
+
+    def test_update_password(self) -> None:
+        user = self.gen_user()
+        self.repo.create(user)
+        password_hash = self.faker.pystr()
+
+        self.repo.update_password(user, password_hash)
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), replace(user, password=password_hash))
+        self.assertEqual(self.repo.find_by_email(user.email), replace(user, password=password_hash))
+
+    def test_delete_all(self) -> None:
+        self.repo.create_many([self.gen_user(), self.gen_user(), self.gen_user(cast(str, self.faker.uuid4()))])
+
+        self.assertEqual(self.repo.delete_all(), {'clients': 2, 'users': 3, 'emails': 3})
+        self.assertEqual(self.repo.delete_all(), {})
+        self.assertEqual(list(self.repo.iter_by_client(self.client_id)), [])
+
+    def test_concurrent_create_same_email(self) -> None:
+        email = self.faker.unique.email()
+        errors: list[Exception] = []
+
+        def create() -> None:
+            try:
+                self.repo.create(replace(self.gen_user(), email=email))
+            except DuplicateEmailError as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 7)
+
+    def test_selected_by_config(self) -> None:
+        container = create_container()
+        container.config.user.storage.override('memory')
+        container.config.user.cache.mode.override('none')
+
+        user_repo = container.user_repo()
+        self.assertIsInstance(user_repo, InstrumentedUserRepository)
+        self.assertIsInstance(cast(InstrumentedUserRepository, user_repo).repository, InMemoryUserRepository)
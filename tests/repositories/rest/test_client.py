@@ -7,7 +7,7 @@ from requests import HTTPError
 from unittest_parametrize import ParametrizedTestCase, parametrize
 
 from models import Client
-from repositories.rest import RestClientRepository, TokenProvider
+from repositories.rest import RestClientRepository, TokenProvider, create_session
 
 
 class TestClient(ParametrizedTestCase):
@@ -81,3 +81,20 @@ class TestClient(ParametrizedTestCase):
 
             with self.assertRaises(HTTPError):
                 self.repo.get(client_id)
+
+    def test_get_retries_unavailable(self) -> None:
+        client = Client(
+            id=cast(str, self.faker.uuid4()),
+            name=self.faker.company(),
+        )
+        repo = RestClientRepository(self.base_url, None, create_session(pool_size=1, retries=2, backoff_factor=0))
+
+        with responses.RequestsMock() as rsps:
+            rsps.get(f'{self.base_url}/api/v1/clients/{client.id}', status=503)
+            rsps.get(f'{self.base_url}/api/v1/clients/{client.id}', json={'id': client.id, 'name': client.name})
+
+            client_repo = repo.get(client.id)
+
+            self.assertEqual(len(rsps.calls), 2)
+
+        self.assertEqual(client_repo, client)
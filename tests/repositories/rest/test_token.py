@@ -0,0 +1,120 @@
+import threading
+from typing import cast
+from unittest import TestCase
+from unittest.mock import Mock
+
+import jwt
+from faker import Faker
+
+from repositories.rest import CachingTokenProvider, TokenProvider
+
+
+class TestCachingTokenProvider(TestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.now = 1_000_000.0
+        self.provider = Mock(TokenProvider)
+        self.caching = CachingTokenProvider(self.provider, refresh_margin=300, retry_interval=10, clock=lambda: self.now)
+
+    def gen_token(self, expires_in: float) -> str:
+        return jwt.encode({'sub': self.faker.pystr(), 'exp': int(self.now + expires_in)}, 'secret', algorithm='HS256')
+
+    def test_cached(self) -> None:
+        token = self.gen_token(3600)
+        cast(Mock, self.provider.get_token).return_value = token
+
+        self.assertEqual(self.caching.get_token(), token)
+        self.assertEqual(self.caching.get_token(), token)
+
+        cast(Mock, self.provider.get_token).assert_called_once()
+        self.assertEqual(self.caching.stats().refreshes, 1)
+
+    def test_background_refresh(self) -> None:
+        old_token = self.gen_token(3600)
+        cast(Mock, self.provider.get_token).return_value = old_token
+        self.caching.get_token()
+
+        new_token = self.gen_token(7200)
+        refreshed = threading.Event()
+
+        def fetch_new_token() -> str:
+            refreshed.set()
+            return new_token
+
+        cast(Mock, self.provider.get_token).side_effect = fetch_new_token
+        self.now += 3400
+
+        self.assertEqual(self.caching.get_token(), old_token)
+        self.assertTrue(refreshed.wait(5))
+
+        with self.caching._fetch_lock:  # noqa: SLF001
+            self.assertEqual(self.caching.get_token(), new_token)
+
+    def test_background_refresh_failure(self) -> None:
+        token = self.gen_token(3600)
+        cast(Mock, self.provider.get_token).return_value = token
+        self.caching.get_token()
+
+        failed = threading.Event()
+
+        def fail() -> str:
+            failed.set()
+            raise RuntimeError
+
+        cast(Mock, self.provider.get_token).side_effect = fail
+        self.now += 3400
+
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(self.caching.get_token(), token)
+            self.assertTrue(failed.wait(5))
+
+            with self.caching._fetch_lock:  # noqa: SLF001
+                self.assertEqual(self.caching.stats().failures, 1)
+
+        # Retries are spaced out by the retry interval
+        self.assertEqual(self.caching.get_token(), token)
+        self.assertEqual(cast(Mock, self.provider.get_token).call_count, 2)
+
+    def test_expired_single_fetch(self) -> None:
+        token = self.gen_token(3600)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_fetch() -> str:
+            started.set()
+            release.wait(5)
+            return token
+
+        cast(Mock, self.provider.get_token).side_effect = slow_fetch
+
+        results: list[str] = []
+        threads = [threading.Thread(target=lambda: results.append(self.caching.get_token())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        started.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [token] * 4)
+        cast(Mock, self.provider.get_token).assert_called_once()
+
+    def test_expired_failure(self) -> None:
+        cast(Mock, self.provider.get_token).side_effect = RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            self.caching.get_token()
+
+        self.assertEqual(self.caching.stats().failures, 1)
+        self.assertEqual(self.caching.stats().refreshes, 0)
+
+    def test_undecodable_not_cached(self) -> None:
+        token = self.faker.pystr()
+        cast(Mock, self.provider.get_token).return_value = token
+
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(self.caching.get_token(), token)
+            self.assertEqual(self.caching.get_token(), token)
+
+        self.assertEqual(cast(Mock, self.provider.get_token).call_count, 2)
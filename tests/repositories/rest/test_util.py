@@ -0,0 +1,29 @@
+from typing import cast
+from unittest import TestCase
+
+from requests.adapters import HTTPAdapter
+
+from repositories.rest import create_session, init_http_session
+
+
+class TestUtil(TestCase):
+    def test_create_session(self) -> None:
+        session = create_session(pool_size=4, retries=3, backoff_factor=0.5)
+
+        adapter = cast(HTTPAdapter, session.get_adapter('https://example.org'))
+        self.assertEqual(adapter._pool_maxsize, 4)  # type: ignore[attr-defined] # noqa: SLF001
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.5)
+        self.assertNotIn('POST', adapter.max_retries.allowed_methods or [])
+
+    def test_init_http_session_closes(self) -> None:
+        resource = init_http_session(pool_size=1, retries=0, backoff_factor=0)
+        session = next(resource)
+        adapter = cast(HTTPAdapter, session.get_adapter('https://example.org'))
+        adapter.poolmanager.connection_from_url('https://example.org')
+        self.assertEqual(len(adapter.poolmanager.pools), 1)
+
+        with self.assertRaises(StopIteration):
+            next(resource)
+
+        self.assertEqual(len(adapter.poolmanager.pools), 0)
@@ -0,0 +1,35 @@
+from typing import cast
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from repositories import decode_cursor, encode_cursor
+from repositories.errors import InvalidCursorError
+
+
+class TestUserRepository(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+
+    def test_cursor_roundtrip(self) -> None:
+        user_id = cast(str, self.faker.uuid4())
+
+        cursor = encode_cursor(user_id)
+
+        self.assertNotIn(user_id, cursor)
+        self.assertEqual(decode_cursor(cursor), user_id)
+
+    @parametrize(
+        'cursor',
+        [
+            ('foo',),
+            ('!!!',),
+            ('WzFd',),  # [1]
+            ('eyJpZCI6IDF9',),  # {"id": 1}
+        ],
+    )
+    def test_decode_invalid_cursor(self, cursor: str) -> None:
+        with self.assertRaises(InvalidCursorError) as context:
+            decode_cursor(cursor)
+
+        self.assertEqual(str(context.exception), f"Invalid cursor '{cursor}'.")
@@ -0,0 +1,233 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import cast
+from unittest.mock import Mock, patch
+
+from faker import Faker
+from passlib.context import CryptContext
+from passlib.hash import argon2, pbkdf2_sha256
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from app import create_container
+from services import HashingExecutor, HashingQueueFullError, MetricsRegistry, create_crypt_context, parse_hash_settings
+from services.hashing import slowest_hash
+
+
+class TestHashing(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+
+    @parametrize(
+        'workers',
+        [
+            (0,),
+            (1,),
+        ],
+    )
+    def test_hash_verify(self, workers: int) -> None:
+        executor = HashingExecutor(workers=workers)
+        self.addCleanup(executor.shutdown)
+        password = self.faker.password()
+
+        password_hash = executor.hash(password)
+
+        self.assertTrue(password_hash.startswith('$pbkdf2-sha256$29000$'))
+        self.assertTrue(executor.verify(password, password_hash))
+        self.assertFalse(executor.verify(self.faker.password(), password_hash))
+
+    @parametrize(
+        'workers',
+        [
+            (0,),
+            (2,),
+        ],
+    )
+    def test_hash_many(self, workers: int) -> None:
+        executor = HashingExecutor(workers=workers)
+        self.addCleanup(executor.shutdown)
+        passwords = [self.faker.password() for _ in range(5)]
+
+        password_hashes = executor.hash_many(passwords)
+
+        self.assertEqual(len(password_hashes), len(passwords))
+        for password, password_hash in zip(passwords, password_hashes, strict=True):
+            self.assertTrue(executor.context.verify(password, password_hash))
+
+    def test_verify_deprecated_scheme(self) -> None:
+        executor = HashingExecutor(workers=0, context=create_crypt_context(['argon2', 'pbkdf2_sha256']))
+        password = self.faker.password()
+        old_hash = pbkdf2_sha256.hash(password)
+
+        self.assertTrue(executor.verify(password, old_hash))
+        self.assertTrue(executor.needs_update(old_hash))
+        self.assertFalse(executor.needs_update(executor.hash(password)))
+
+    def test_dummy_hash(self) -> None:
+        executor = HashingExecutor(workers=0)
+        dummy_hash = executor.dummy_hash()
+
+        self.assertIs(executor.dummy_hash(), dummy_hash)
+        self.assertEqual(executor.context.identify(dummy_hash), executor.context.default_scheme())
+        self.assertFalse(executor.needs_update(dummy_hash))
+        self.assertFalse(executor.verify(self.faker.password(), dummy_hash))
+
+    def test_dummy_hash_slowest_scheme(self) -> None:
+        # argon2 hashes are deprecated but still stored, the dummy hash has to cost as much to verify
+        context = create_crypt_context(['pbkdf2_sha256', 'argon2'], parse_hash_settings('pbkdf2_sha256__rounds=1000'))
+        executor = HashingExecutor(workers=0, context=context)
+        dummy_hash = executor.dummy_hash()
+
+        self.assertEqual(context.identify(dummy_hash), 'argon2')
+        self.assertTrue(executor.needs_update(dummy_hash))
+
+    def test_unknown_user_verify_as_slow_as_legacy(self) -> None:
+        context = create_crypt_context(['pbkdf2_sha256', 'argon2'], parse_hash_settings('pbkdf2_sha256__rounds=1000'))
+        executor = HashingExecutor(workers=0, context=context)
+        legacy_hash = argon2.using(rounds=2, memory_cost=19456, parallelism=1).hash(self.faker.password())
+        dummy_hash = executor.dummy_hash()
+
+        def verify_time(password_hash: str) -> float:
+            start = time.perf_counter()
+            executor.verify(self.faker.password(), password_hash)
+            return time.perf_counter() - start
+
+        legacy_time = min(verify_time(legacy_hash) for _ in range(3))
+        unknown_time = min(verify_time(dummy_hash) for _ in range(3))
+
+        # The current pbkdf2_sha256 hash is about 50 times faster, half of the legacy cost leaves room for noise
+        self.assertGreater(unknown_time, legacy_time / 2)
+
+    def test_slowest_hash(self) -> None:
+        context = create_crypt_context(['pbkdf2_sha256'], parse_hash_settings('pbkdf2_sha256__rounds=1000'))
+
+        self.assertTrue(slowest_hash(context, self.faker.password()).startswith('$pbkdf2-sha256$1000$'))
+
+    def test_dummy_hash_outside_lock(self) -> None:
+        executor = HashingExecutor(workers=0)
+        locked: list[bool] = []
+
+        def hash_checking_lock(context: CryptContext, password: str) -> str:
+            locked.append(executor._lock.locked())  # noqa: SLF001
+            return slowest_hash(context, password)
+
+        with patch('services.hashing.slowest_hash', side_effect=hash_checking_lock):
+            executor.dummy_hash()
+
+        self.assertEqual(locked, [False])
+
+    def test_context_settings(self) -> None:
+        context = create_crypt_context(['pbkdf2_sha256'], parse_hash_settings('pbkdf2_sha256__rounds=1000'))
+        executor = HashingExecutor(workers=1, context=context)
+        self.addCleanup(executor.shutdown)
+        password = self.faker.password()
+
+        password_hash = executor.hash(password)
+
+        self.assertTrue(password_hash.startswith('$pbkdf2-sha256$1000$'))
+        self.assertTrue(executor.verify(password, password_hash))
+        self.assertTrue(executor.needs_update(pbkdf2_sha256.using(rounds=2000).hash(password)))
+
+    @parametrize(
+        ('value', 'expected'),
+        [
+            (None, {}),
+            ('', {}),
+            ('argon2__rounds=3, argon2__memory_cost=65536', {'argon2__rounds': 3, 'argon2__memory_cost': 65536}),
+        ],
+    )
+    def test_parse_hash_settings(self, value: str | None, expected: dict[str, int]) -> None:
+        self.assertEqual(parse_hash_settings(value), expected)
+
+    def test_rehash_in_background(self) -> None:
+        executor = HashingExecutor(workers=0)
+        self.addCleanup(executor.shutdown)
+        password = self.faker.password()
+        on_done = Mock()
+
+        future = executor.rehash_in_background(password, on_done)
+
+        self.assertIsNotNone(future)
+        cast(Future[None], future).result(5)
+        on_done.assert_called_once()
+        self.assertTrue(executor.verify(password, on_done.call_args[0][0]))
+
+    def test_rehash_in_background_error_logged(self) -> None:
+        executor = HashingExecutor(workers=0)
+        self.addCleanup(executor.shutdown)
+
+        with self.assertLogs('HashingExecutor', 'ERROR'):
+            future = executor.rehash_in_background(self.faker.password(), Mock(side_effect=RuntimeError))
+            cast(Future[None], future).result(5)
+
+    def test_rehash_in_background_skipped_when_busy(self) -> None:
+        executor = HashingExecutor(workers=0, max_pending=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+
+        first = executor.rehash_in_background(self.faker.password(), Mock(side_effect=lambda _h: release.wait(5)))
+
+        self.assertIsNone(executor.rehash_in_background(self.faker.password(), Mock()))
+
+        release.set()
+        cast(Future[None], first).result(5)
+
+    def test_defaults(self) -> None:
+        with patch('os.cpu_count', return_value=3):
+            executor = HashingExecutor()
+
+        self.assertEqual(executor.workers, 3)
+        self.assertEqual(executor.max_pending, 12)
+
+    def test_queue_full(self) -> None:
+        executor = HashingExecutor(workers=0, max_pending=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_hash(_config: str, password: str) -> str:
+            started.set()
+            release.wait(5)
+            return password
+
+        with patch('services.hashing.hash_password', slow_hash):
+            thread = threading.Thread(target=executor.hash, args=(self.faker.password(),))
+            thread.start()
+            started.wait(5)
+
+            with self.assertRaises(HashingQueueFullError):
+                executor.hash(self.faker.password())
+
+            release.set()
+            thread.join()
+
+        password_hash = executor.hash(self.faker.password())
+        self.assertTrue(password_hash.startswith('$pbkdf2-sha256$29000$'))
+
+    def test_metrics(self) -> None:
+        metrics = MetricsRegistry()
+        executor = HashingExecutor(workers=0, max_pending=1, metrics=metrics)
+        password = self.faker.password()
+
+        executor.verify(password, executor.hash(password))
+        executor.hash_many([password])
+
+        durations = metrics.hashing_duration.values()
+        self.assertEqual({k: v[-1] for k, v in durations.items()}, {('hash',): 1, ('verify',): 1, ('hash_many',): 1})
+
+        with executor._slots, self.assertRaises(HashingQueueFullError):  # noqa: SLF001
+            executor.verify(password, password)
+
+        self.assertEqual(metrics.hashing_rejected.values(), {('verify',): 1})
+
+    def test_container_shutdown(self) -> None:
+        container = create_container()
+        container.config.hashing.workers.from_value(1)
+        executor = container.hashing()
+        self.addCleanup(executor.shutdown)
+
+        executor.verify(self.faker.password(), executor.hash(self.faker.password()))
+        self.assertIs(container.hashing(), executor)
+
+        container.shutdown_resources()
+
+        self.assertIsNone(executor._pool)  # noqa: SLF001
@@ -0,0 +1,264 @@
+import threading
+from typing import Any, cast
+from unittest.mock import Mock
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from models import Client, User
+from repositories import ClientRepository, UserRepository
+from repositories.cache import CachedClientRepository, CachedUserRepository
+from repositories.cache.util import CacheStats
+from repositories.firestore import FirestoreUserIndex
+from repositories.firestore.index import IndexStats
+from repositories.rest import CachingTokenProvider, TokenRefreshStats
+from services import (
+    Counter,
+    Gauge,
+    Histogram,
+    InstrumentedClientRepository,
+    InstrumentedUserRepository,
+    MetricsRegistry,
+    collect_client_cache,
+    collect_token_refresh,
+    collect_user_cache,
+    collect_user_index,
+    setup_tracing,
+)
+
+
+class TestMetrics(ParametrizedTestCase):
+    def test_counter(self) -> None:
+        counter = Counter('requests_total', 'Requests.', ('route', 'status'))
+        counter.inc('/a', '200')
+        counter.inc('/a', '200', value=2)
+        counter.inc('/a', '404')
+
+        self.assertEqual(counter.values(), {('/a', '200'): 3, ('/a', '404'): 1})
+        self.assertEqual(
+            counter.render(),
+            '# HELP requests_total Requests.\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{route="/a",status="200"} 3\n'
+            'requests_total{route="/a",status="404"} 1\n',
+        )
+
+    def test_counter_threads(self) -> None:
+        counter = Counter('requests_total', 'Requests.')
+
+        def work() -> None:
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.values(), {(): 8000})
+        self.assertIn('requests_total 8000\n', counter.render())
+
+    def test_gauge_across_threads(self) -> None:
+        gauge = Gauge('in_flight', 'In flight.')
+        gauge.inc()
+        gauge.inc()
+
+        thread = threading.Thread(target=gauge.dec)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(gauge.values(), {(): 1})
+        self.assertIn('# TYPE in_flight gauge\n', gauge.render())
+
+    def test_histogram(self) -> None:
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, '/a')
+
+        self.assertEqual(
+            histogram.render(),
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{route="/a",le="0.1"} 2\n'
+            'latency_seconds_bucket{route="/a",le="1.0"} 3\n'
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4\n'
+            'latency_seconds_sum{route="/a"} 3.65\n'
+            'latency_seconds_count{route="/a"} 4\n',
+        )
+
+    def test_histogram_time(self) -> None:
+        histogram = Histogram('latency_seconds', 'Latency.')
+
+        with self.assertRaises(RuntimeError), histogram.time():
+            raise RuntimeError
+
+        self.assertEqual(histogram.values()[()][-1], 1)
+
+    @parametrize(
+        ('value', 'expected'),
+        [
+            ('a"b', 'a\\"b'),
+            ('a\\b', 'a\\\\b'),
+            ('a\nb', 'a\\nb'),
+        ],
+    )
+    def test_label_escaping(self, value: str, expected: str) -> None:
+        counter = Counter('requests_total', 'Requests.', ('route',))
+        counter.inc(value)
+
+        self.assertIn(f'requests_total{{route="{expected}"}} 1\n', counter.render())
+
+    def test_registry_render(self) -> None:
+        registry = MetricsRegistry()
+        registry.http_requests.inc('GET', '/a', '200')
+
+        text = registry.render()
+
+        for metric in registry.metrics():
+            self.assertIn(f'# TYPE {metric.name} {metric.kind}\n', text)
+        self.assertIn('user_http_requests_total{method="GET",route="/a",status="200"} 1\n', text)
+
+    def test_collect_user_index(self) -> None:
+        registry = MetricsRegistry()
+        index = Mock(FirestoreUserIndex)
+        cast(Mock, index.stats).return_value = IndexStats(
+            size=3, active=True, synced=False, lag=None, max_lag=0.25, restarts=2
+        )
+
+        self.assertIs(collect_user_index(index, registry), index)
+        text = registry.render()
+
+        self.assertIn('user_index_users 3\n', text)
+        self.assertIn('user_index_active 1\n', text)
+        self.assertIn('user_index_synced 0\n', text)
+        self.assertIn('user_index_max_lag_seconds 0.25\n', text)
+        self.assertIn('# TYPE user_index_restarts_total counter\nuser_index_restarts_total 2\n', text)
+        self.assertNotIn('user_index_lag_seconds', text)
+
+        # The stats are read again on every render
+        cast(Mock, index.stats).return_value = IndexStats(size=4, active=True, synced=True, lag=0.5, max_lag=0.5, restarts=2)
+        text = registry.render()
+
+        self.assertIn('user_index_users 4\n', text)
+        self.assertIn('user_index_synced 1\n', text)
+        self.assertIn('user_index_lag_seconds 0.5\n', text)
+
+    def test_collect_client_cache(self) -> None:
+        registry = MetricsRegistry()
+        repository = Mock(CachedClientRepository)
+        cast(Mock, repository.stats).return_value = CacheStats(hits=5, misses=2, evictions=1, size=3)
+
+        self.assertIs(collect_client_cache(repository, registry), repository)
+        text = registry.render()
+
+        self.assertIn('user_client_cache_hits_total{cache="client"} 5\n', text)
+        self.assertIn('user_client_cache_misses_total{cache="client"} 2\n', text)
+        self.assertIn('user_client_cache_evictions_total{cache="client"} 1\n', text)
+        self.assertIn('user_client_cache_entries{cache="client"} 3\n', text)
+
+    def test_collect_user_cache(self) -> None:
+        registry = MetricsRegistry()
+        repository = Mock(CachedUserRepository)
+        cast(Mock, repository.stats).return_value = (
+            CacheStats(hits=4, misses=1, evictions=0, size=1),
+            CacheStats(hits=6, misses=2, evictions=0, size=1),
+            CacheStats(hits=9, misses=3, evictions=2, size=1),
+        )
+
+        self.assertIs(collect_user_cache(repository, registry), repository)
+        text = registry.render()
+
+        self.assertIn('user_cache_hits_total{cache="by_key"} 4\n', text)
+        self.assertIn('user_cache_hits_total{cache="by_email"} 6\n', text)
+        self.assertIn('user_cache_hits_total{cache="missing_emails"} 9\n', text)
+        self.assertIn('user_cache_evictions_total{cache="missing_emails"} 2\n', text)
+        self.assertEqual(text.count('# TYPE user_cache_hits_total counter\n'), 1)
+
+    def test_collect_token_refresh(self) -> None:
+        registry = MetricsRegistry()
+        provider = Mock(CachingTokenProvider)
+        cast(Mock, provider.stats).return_value = TokenRefreshStats(
+            refreshes=3, failures=1, last_latency=0.25, total_latency=1.5
+        )
+
+        self.assertIs(collect_token_refresh(provider, registry), provider)
+        text = registry.render()
+
+        self.assertIn('user_token_refreshes_total 3\n', text)
+        self.assertIn('user_token_refresh_failures_total 1\n', text)
+        self.assertIn('user_token_refresh_duration_seconds_total 1.5\n', text)
+        self.assertIn('user_token_refresh_last_duration_seconds 0.25\n', text)
+
+
+class TestInstrumentedClientRepository(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.inner = Mock(ClientRepository)
+        self.metrics = MetricsRegistry()
+        self.repo = InstrumentedClientRepository(self.inner, self.metrics)
+
+    def tearDown(self) -> None:
+        setup_tracing()
+
+    def test_call_recorded(self) -> None:
+        client = Client(id=cast(str, self.faker.uuid4()), name=self.faker.company())
+        cast(Mock, self.inner.get).return_value = client
+        setup_tracing(log_timings=True)
+
+        with self.assertLogs('Tracing', 'INFO') as logs:
+            self.assertEqual(self.repo.get(client.id), client)
+
+        cast(Mock, self.inner.get).assert_called_once_with(client.id)
+        self.assertEqual(cast(Any, logs.records[0]).json_fields['span'], 'client_repository.get')
+        self.assertEqual(self.metrics.client_repository_duration.values()[('get',)][-1], 1)
+        self.assertEqual(self.metrics.client_repository_errors.values(), {})
+
+    def test_error_recorded(self) -> None:
+        cast(Mock, self.inner.get).side_effect = RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            self.repo.get(cast(str, self.faker.uuid4()))
+
+        self.assertEqual(self.metrics.client_repository_errors.values(), {('get',): 1})
+        self.assertEqual(self.metrics.client_repository_duration.values()[('get',)][-1], 1)
+
+
+class TestInstrumentedUserRepository(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.inner = Mock(UserRepository)
+        self.metrics = MetricsRegistry()
+        self.repo = InstrumentedUserRepository(self.inner, self.metrics, 'memory')
+
+    def gen_user(self) -> User:
+        return User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+
+    def test_call_recorded(self) -> None:
+        user = self.gen_user()
+        cast(Mock, self.inner.get).return_value = user
+
+        self.assertEqual(self.repo.get(user.id, user.client_id), user)
+        self.repo.create(user)
+
+        cast(Mock, self.inner.get).assert_called_once_with(user.id, user.client_id)
+        cast(Mock, self.inner.create).assert_called_once_with(user)
+        durations = self.metrics.repository_duration.values()
+        self.assertEqual(durations[('memory', 'get')][-1], 1)
+        self.assertEqual(durations[('memory', 'create')][-1], 1)
+        self.assertEqual(self.metrics.repository_errors.values(), {})
+
+    def test_error_recorded(self) -> None:
+        cast(Mock, self.inner.find_by_email).side_effect = RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            self.repo.find_by_email(self.faker.email())
+
+        self.assertEqual(self.metrics.repository_errors.values(), {('memory', 'find_by_email'): 1})
+        self.assertEqual(self.metrics.repository_duration.values()[('memory', 'find_by_email')][-1], 1)
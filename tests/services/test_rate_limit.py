@@ -0,0 +1,82 @@
+from typing import cast
+from unittest.mock import Mock
+
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from services import InMemoryRateLimitStore, LoginRateLimiter, RateLimitStore
+from services.rate_limit import client_ip
+
+
+class TestInMemoryRateLimitStore(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.now = 6000.0
+        self.store = InMemoryRateLimitStore(clock=lambda: self.now)
+
+    def test_limit(self) -> None:
+        self.assertEqual([self.store.acquire('a', 3, 60) for _ in range(4)], [True, True, True, False])
+        self.assertTrue(self.store.acquire('b', 3, 60))
+
+    def test_sliding_window(self) -> None:
+        for _ in range(4):
+            self.store.acquire('a', 4, 60)
+
+        # A quarter into the next window, three quarters of the previous count still apply
+        self.now += 75
+        self.assertEqual([self.store.acquire('a', 4, 60) for _ in range(2)], [True, False])
+        self.assertEqual([self.store.acquire('a', 5, 60) for _ in range(2)], [True, False])
+
+        # Two windows later the key starts over
+        self.now += 120
+        self.assertEqual([self.store.acquire('a', 2, 60) for _ in range(3)], [True, True, False])
+
+    def test_eviction(self) -> None:
+        for i in range(10):
+            self.store.acquire(str(i), 3, 60)
+
+        self.now += 60
+        self.store.acquire('new', 3, 60)
+        self.assertEqual(len(self.store), 11)
+
+        self.now += 60
+        self.store.acquire('new', 3, 60)
+        self.assertEqual(len(self.store), 1)
+
+
+class TestLoginRateLimiter(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+
+    @parametrize(
+        ('forwarded_for', 'remote_addr', 'trusted_proxies', 'expected'),
+        [
+            (None, '10.0.0.1', 1, '10.0.0.1'),
+            ('1.1.1.1', '10.0.0.1', 0, '10.0.0.1'),
+            ('1.1.1.1', '10.0.0.1', 1, '1.1.1.1'),
+            ('6.6.6.6, 1.1.1.1', '10.0.0.1', 1, '1.1.1.1'),
+            ('6.6.6.6, 1.1.1.1, 2.2.2.2', '10.0.0.1', 2, '1.1.1.1'),
+            ('1.1.1.1', '10.0.0.1', 3, '1.1.1.1'),
+            (None, None, 1, ''),
+        ],
+    )
+    def test_client_ip(self, forwarded_for: str | None, remote_addr: str | None, trusted_proxies: int, expected: str) -> None:
+        self.assertEqual(client_ip(forwarded_for, remote_addr, trusted_proxies), expected)
+
+    @parametrize(
+        ('ip_allowed', 'username_allowed'),
+        [
+            (True, True),
+            (True, False),
+            (False, True),
+        ],
+    )
+    def test_allow(self, ip_allowed: bool, username_allowed: bool) -> None:  # noqa: FBT001
+        store = Mock(RateLimitStore)
+        cast(Mock, store.acquire).side_effect = [ip_allowed, username_allowed]
+        limiter = LoginRateLimiter(store, username_limit=5, ip_limit=20, window=30)
+        username = self.faker.email()
+
+        self.assertEqual(limiter.allow(username.upper(), None, '10.0.0.1'), ip_allowed and username_allowed)
+
+        expected_calls = [(('ip:10.0.0.1', 20, 30),), ((f'user:{username.lower()}', 5, 30),)]
+        self.assertEqual(cast(Mock, store.acquire).call_args_list, expected_calls[: 2 if ip_allowed else 1])
@@ -0,0 +1,181 @@
+import datetime
+import tempfile
+from pathlib import Path
+from typing import cast
+from unittest.mock import Mock
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ec import SECP256R1, generate_private_key
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from faker import Faker
+from unittest_parametrize import ParametrizedTestCase, parametrize
+
+from models import RefreshToken, User
+from repositories import RefreshTokenRepository
+from repositories.errors import RefreshTokenReusedError
+from services import InvalidRefreshTokenError, RefreshTokenIssuer, SigningKeyProvider, TokenIssuer
+from services.tokens import hash_refresh_token, key_id, load_signing_key
+
+
+def private_pem(key: Ed25519PrivateKey) -> bytes:
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+class TestTokens(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.key = Ed25519PrivateKey.generate()
+
+    def test_load_signing_key(self) -> None:
+        signing_key = load_signing_key(private_pem(self.key).decode())
+
+        self.assertEqual(signing_key.kid, key_id(self.key))
+        self.assertEqual(signing_key.kid, load_signing_key(private_pem(self.key)).kid)
+        self.assertNotEqual(signing_key.kid, key_id(Ed25519PrivateKey.generate()))
+
+    def test_load_signing_key_not_ed25519(self) -> None:
+        pem = generate_private_key(SECP256R1()).private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+
+        with self.assertRaises(TypeError):
+            load_signing_key(pem)
+
+    def test_provider_requires_key(self) -> None:
+        with self.assertRaises(ValueError):
+            SigningKeyProvider()
+
+    def test_provider_rotates_from_file(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        key_file = Path(tmp_dir.name) / 'jwt.pem'
+        key_file.write_bytes(private_pem(self.key))
+
+        clock = Mock(return_value=0.0)
+        provider = SigningKeyProvider(private_key_file=str(key_file), reload_interval=60, clock=clock)
+        first = provider.current()
+        self.assertEqual(first.kid, key_id(self.key))
+
+        new_key = Ed25519PrivateKey.generate()
+        key_file.write_bytes(private_pem(new_key))
+        self.assertIs(provider.current(), first)
+
+        clock.return_value = 60.0
+        self.assertEqual(provider.current().kid, key_id(new_key))
+
+        key_file.write_bytes(b'not a key')
+        clock.return_value = 120.0
+        with self.assertLogs('SigningKeyProvider', 'ERROR'):
+            self.assertEqual(provider.current().kid, key_id(new_key))
+
+    def test_issue(self) -> None:
+        issuer = self.faker.uri()
+        token_issuer = TokenIssuer(SigningKeyProvider(private_key=private_pem(self.key)), issuer=issuer)
+        user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+
+        token = token_issuer.issue(user)
+
+        self.assertEqual(jwt.get_unverified_header(token)['kid'], key_id(self.key))
+        claims = jwt.decode(token, self.key.public_key(), algorithms=['EdDSA'], audience='user')
+        self.assertEqual(
+            {k: v for k, v in claims.items() if k not in ('iat', 'exp')},
+            {'iss': issuer, 'sub': user.id, 'cid': user.client_id, 'email': user.email, 'role': 'user', 'aud': 'user'},
+        )
+        self.assertEqual(claims['exp'] - claims['iat'], datetime.timedelta(minutes=60).total_seconds())
+
+
+class TestRefreshTokenIssuer(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.repo = Mock(RefreshTokenRepository)
+        self.issuer = RefreshTokenIssuer(self.repo, lifetime=datetime.timedelta(days=7))
+        self.user = User(
+            id=cast(str, self.faker.uuid4()),
+            client_id=cast(str, self.faker.uuid4()),
+            name=self.faker.name(),
+            email=self.faker.email(),
+            password=self.faker.password(),
+        )
+
+    def test_issue(self) -> None:
+        refresh_token = self.issuer.issue(self.user)
+
+        self.assertEqual(refresh_token.split('.')[:2], [self.user.client_id, self.user.id])
+        token: RefreshToken = cast(Mock, self.repo.create).call_args[0][0]
+        self.assertEqual(token.id, hash_refresh_token(refresh_token))
+        self.assertEqual((token.client_id, token.user_id, token.email), (self.user.client_id, self.user.id, self.user.email))
+        self.assertFalse(token.used)
+        self.assertAlmostEqual(
+            token.expires_at.timestamp(),
+            (datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=7)).timestamp(),
+            delta=5,
+        )
+        self.assertNotEqual(self.issuer.issue(self.user), refresh_token)
+
+    def test_rotate(self) -> None:
+        refresh_token = self.issuer.issue(self.user)
+        new_token = RefreshToken(
+            id=self.faker.pystr(),
+            client_id=self.user.client_id,
+            user_id=self.user.id,
+            family_id=cast(str, self.faker.uuid4()),
+            email=self.user.email,
+            expires_at=datetime.datetime.now(datetime.UTC),
+        )
+        cast(Mock, self.repo.rotate).return_value = new_token
+
+        token, new_refresh_token = self.issuer.rotate(refresh_token)
+
+        self.assertIs(token, new_token)
+        self.assertEqual(new_refresh_token.split('.')[:2], [self.user.client_id, self.user.id])
+        rotate_args = cast(Mock, self.repo.rotate).call_args
+        self.assertEqual(rotate_args[0], (hash_refresh_token(refresh_token),))
+        self.assertEqual(rotate_args[1]['client_id'], self.user.client_id)
+        self.assertEqual(rotate_args[1]['user_id'], self.user.id)
+        self.assertEqual(rotate_args[1]['new_token_id'], hash_refresh_token(new_refresh_token))
+
+    @parametrize(
+        'refresh_token',
+        [
+            ('',),
+            ('no-dots',),
+            ('a/b.c.d',),
+            ('a.b.c.d',),
+        ],
+    )
+    def test_rotate_malformed(self, refresh_token: str) -> None:
+        with self.assertRaises(InvalidRefreshTokenError):
+            self.issuer.rotate(refresh_token)
+
+        cast(Mock, self.repo.rotate).assert_not_called()
+
+    def test_rotate_unknown(self) -> None:
+        cast(Mock, self.repo.rotate).return_value = None
+
+        with self.assertRaises(InvalidRefreshTokenError):
+            self.issuer.rotate(self.issuer.issue(self.user))
+
+        cast(Mock, self.repo.revoke_family).assert_not_called()
+
+    def test_rotate_reused(self) -> None:
+        family_id = cast(str, self.faker.uuid4())
+        cast(Mock, self.repo.rotate).side_effect = RefreshTokenReusedError(family_id)
+        cast(Mock, self.repo.revoke_family).return_value = 3
+
+        with self.assertRaises(InvalidRefreshTokenError), self.assertLogs('RefreshTokenIssuer', 'WARNING'):
+            self.issuer.rotate(self.issuer.issue(self.user))
+
+        cast(Mock, self.repo.revoke_family).assert_called_once_with(self.user.client_id, self.user.id, family_id)
@@ -0,0 +1,97 @@
+from typing import Any, cast
+from unittest.mock import Mock, patch
+
+from faker import Faker
+from flask import Flask
+from gcp_microservice_utils import setup_cloud_trace
+from unittest_parametrize import ParametrizedTestCase
+
+from services import setup_tracing, span, traced
+
+
+def setup_test_trace(app: Flask) -> Mock:
+    # Sets up Cloud Trace with a mocked client, the spans of a request are passed to its batch_write_spans
+    trace_client = Mock()
+    with (
+        patch('gcp_microservice_utils.trace.TraceServiceClient', return_value=trace_client),
+        patch('gcp_microservice_utils.trace.google.auth.default', return_value=(None, 'project')),
+    ):
+        setup_cloud_trace(app)
+
+    return trace_client
+
+
+def exported_spans(trace_client: Mock) -> list[Any]:
+    return [s for c in cast(Mock, trace_client.batch_write_spans).call_args_list for s in c.kwargs['spans']]
+
+
+class TestTracing(ParametrizedTestCase):
+    def setUp(self) -> None:
+        self.faker = Faker()
+        self.addCleanup(setup_tracing)
+
+        @traced('outer')
+        def outer(value: str) -> str:
+            with span('first'):
+                pass
+            with span('second'):
+                return value
+
+        self.outer = outer
+
+    def test_disabled(self) -> None:
+        setup_tracing()
+        value = self.faker.pystr()
+
+        with self.assertNoLogs('Tracing'):
+            self.assertEqual(self.outer(value), value)
+
+    def test_log_timings(self) -> None:
+        setup_tracing(log_timings=True)
+
+        with self.assertLogs('Tracing', 'INFO') as logs:
+            self.outer(self.faker.pystr())
+
+        fields = [cast(Any, record).json_fields for record in logs.records]
+        self.assertEqual([f['span'] for f in fields], ['first', 'second', 'outer'])
+        self.assertTrue(all(f['duration_ms'] >= 0 for f in fields))
+
+    def test_trace_spans(self) -> None:
+        setup_tracing(trace=True)
+        app = Flask(__name__)
+        trace_client = setup_test_trace(app)
+        app.add_url_rule('/', 'index', lambda: self.outer('ok'))
+        trace_id = self.faker.hexify('^' * 32)
+        parent_span_id = self.faker.hexify('^' * 16)
+
+        resp = app.test_client().get('/', headers={'Traceparent': f'00-{trace_id}-{parent_span_id}-01'})
+
+        self.assertEqual(resp.status_code, 200)
+        outer, first, second = exported_spans(trace_client)
+        self.assertEqual(
+            [s.display_name.value for s in (outer, first, second)],
+            ['outer', 'first', 'second'],
+        )
+        self.assertEqual(outer.parent_span_id, parent_span_id)
+        self.assertEqual(first.parent_span_id, outer.span_id)
+        self.assertEqual(second.parent_span_id, outer.span_id)
+        self.assertNotEqual(first.span_id, second.span_id)
+        self.assertTrue(second.name.startswith(f'projects/project/traces/{trace_id}/spans/'))
+        self.assertLessEqual(first.end_time, second.start_time)
+        self.assertLessEqual(second.end_time, outer.end_time)
+
+    def test_trace_not_sampled(self) -> None:
+        setup_tracing(trace=True)
+        app = Flask(__name__)
+        trace_client = setup_test_trace(app)
+        app.add_url_rule('/', 'index', lambda: self.outer('ok'))
+
+        app.test_client().get('/', headers={'Traceparent': f'00-{"0" * 32}-{"0" * 16}-00'})
+
+        self.assertEqual(exported_spans(trace_client), [])
+
+    def test_trace_outside_request(self) -> None:
+        setup_tracing(trace=True)
+        value = self.faker.pystr()
+
+        self.assertEqual(self.outer(value), value)
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+from passlib.hash import pbkdf2_sha256
+
+from hashing_worker import hash_password, verify_password
+from services import create_crypt_context
+
+
+class TestHashingWorker(TestCase):
+    def test_hash_and_verify(self) -> None:
+        config = create_crypt_context(['pbkdf2_sha256']).to_string()
+
+        password_hash = hash_password(config, 'password')
+
+        self.assertTrue(pbkdf2_sha256.identify(password_hash))
+        self.assertTrue(verify_password(config, 'password', password_hash))
+        self.assertFalse(verify_password(config, 'wrong', password_hash))
+
+    def test_imports_only_passlib(self) -> None:
+        # The spawned workers import this module, the application's dependencies would take memory in each of them
+        code = 'import sys, hashing_worker; print(",".join(sorted(m.split(".")[0] for m in sys.modules)))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)  # noqa: S603
+
+        modules = set(result.stdout.strip().split(','))
+        self.assertIn('passlib', modules)
+        for heavy in ('flask', 'google', 'grpc', 'jwt', 'services', 'repositories'):
+            self.assertNotIn(heavy, modules)